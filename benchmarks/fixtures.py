@@ -0,0 +1,95 @@
+"""Synthetic catalogs shaped like the TTC gateway responses."""
+import random
+
+from transit.history import DAY, PassengerHistory
+
+GEORGIAN = "აბგდევზთიკლმნოპჟრსტუფქღყშჩცძწჭხჯჰ"
+WORDS = ["გამზირი", "ქუჩა", "მოედანი", "მეტრო", "სადგური", "ხიდი", "ბაღი", "სკოლა", "საავადმყოფო", "ბაზარი"]
+MODES = ["BUS", "METRO", "MINIBUS", "CABLE", "ROPEWAY"]
+
+
+def word(rng, low=4, high=10):
+    return "".join(rng.choice(GEORGIAN) for _ in range(rng.randint(low, high)))
+
+
+def make_stops(count=3000, seed=1):
+    rng = random.Random(seed)
+    return [
+        {
+            "id": f"1:{1000 + i}",
+            "code": str(1000 + i),
+            "name": f"{word(rng)} {rng.choice(WORDS)}",
+            "lat": 41.65 + rng.random() * 0.15,
+            "lon": 44.70 + rng.random() * 0.20,
+            "vehicleMode": "BUS"
+        }
+        for i in range(count)
+    ]
+
+
+def make_routes(count=150, seed=2):
+    rng = random.Random(seed)
+    return [
+        {
+            "id": f"1:R{i}",
+            "shortName": str(rng.randint(1, 999)),
+            "longName": f"{word(rng)} - {word(rng)}",
+            "mode": "BUS",
+            "color": "00B38B"
+        }
+        for i in range(count)
+    ]
+
+
+def make_route_patterns(stops, routes, seed=6, corridor=0.003, max_stops=40):
+    """`{route_id: stops}` running along a straight corridor between two random stops.
+
+    The reverse direction is the same list backwards.
+    """
+    rng = random.Random(seed)
+    patterns = {}
+    for route in routes:
+        a, b = rng.sample(stops, 2)
+        dx, dy = b["lon"] - a["lon"], b["lat"] - a["lat"]
+        length = (dx * dx + dy * dy) ** 0.5 or 1.0
+        along = []
+        for stop in stops:
+            sx, sy = stop["lon"] - a["lon"], stop["lat"] - a["lat"]
+            t = (sx * dx + sy * dy) / length
+            if 0 <= t <= length and abs(sx * dy - sy * dx) / length <= corridor:
+                along.append((t, stop))
+        along.sort(key=lambda item: item[0])
+        step = max(1, len(along) // max_stops)
+        patterns[route["id"]] = [stop for _, stop in along[::step]][:max_stops]
+    return patterns
+
+
+def make_arrivals(count=30, seed=3):
+    rng = random.Random(seed)
+    return [
+        {
+            "shortName": str(rng.randint(1, 999)),
+            "headsign": word(rng),
+            "vehicleMode": rng.choice(["BUS", "MINIBUS"]),
+            "realtimeArrivalMinutes": rng.randint(0, 40),
+            "scheduledArrivalMinutes": rng.randint(0, 40)
+        }
+        for _ in range(count)
+    ]
+
+
+def make_passenger_stats(seed=4):
+    rng = random.Random(seed)
+    return {mode: rng.randint(0, 400000) for mode in MODES}
+
+
+def make_passenger_history(days=30, interval=300, seed=5):
+    """In-memory PassengerHistory with running daily totals sampled every `interval` seconds."""
+    rng = random.Random(seed)
+    history = PassengerHistory(path="")
+    daily = {mode: rng.randint(1000, 400000) for mode in MODES}
+    end = 1_700_000_000
+    for ts in range(end - days * DAY, end, interval):
+        progress = ((ts + history.utc_offset) % DAY) / DAY
+        history.record(ts, {mode: int(total * progress) for mode, total in daily.items()})
+    return history
@@ -0,0 +1,215 @@
+"""Microbenchmarks for the CPU work done on every interaction.
+
+Usage:
+    python -m benchmarks.run                         # print results
+    python -m benchmarks.run --json results.json     # save results
+    python -m benchmarks.run --compare results.json  # fail on regressions
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import timeit
+import types
+
+from benchmarks import fixtures
+from cogs.buses import Buses
+from cogs.stats import Stats
+from cogs.stop import Stop
+from cogs.stops import Stops
+from transit.geo import GridIndex
+from transit.journeys import JourneyGraph
+from transit.search import SearchIndex
+from ui.paginator import ResultSet
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def decorator(func):
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+
+def setup_context(stop_count, route_count):
+    bot = types.SimpleNamespace(stop_catalog=None, route_catalog=None, arrivals=None, passenger_stats=None, llm_scheduler=None, llm_router=None)
+    stops = fixtures.make_stops(stop_count)
+    routes = fixtures.make_routes(route_count)
+    patterns = []
+    for route_id, pattern in fixtures.make_route_patterns(stops, routes).items():
+        route = {"id": route_id, "shortName": route_id}
+        patterns.extend([(route, "1:01", pattern), (route, "0:01", pattern[::-1])])
+    return types.SimpleNamespace(
+        stops=stops,
+        routes=routes,
+        arrivals=fixtures.make_arrivals(),
+        passenger_stats=fixtures.make_passenger_stats(),
+        passenger_history=fixtures.make_passenger_history(),
+        stop_index=SearchIndex(stops, ('code', 'name')),
+        route_index=SearchIndex(routes, ('shortName', 'longName')),
+        stop_grid=GridIndex(stops),
+        route_patterns=patterns,
+        journey_graph=JourneyGraph.build(patterns),
+        stops_cog=Stops(bot),
+        buses_cog=Buses(bot),
+        stop_cog=Stop(bot),
+        stats_cog=Stats(bot)
+    )
+
+
+@benchmark("stops.search_all_matches")
+def bench_stops_search_all_matches(ctx):
+    return lambda: ctx.stop_index.search_ids("მეტრო", len(ctx.stop_index.items))
+
+
+@benchmark("stops.render_page")
+def bench_stops_render_page(ctx):
+    results = ResultSet(ctx.stop_index.items)
+    return lambda: ctx.stops_cog.create_embed(results.page(75), 75, results.pages).to_dict()
+
+
+@benchmark("stops.render_search_page")
+def bench_stops_render_search_page(ctx):
+    results = ResultSet(ctx.stop_index.items, tuple(ctx.stop_index.search_ids("ბაღი", len(ctx.stop_index.items))))
+    return lambda: ctx.stops_cog.create_embed(results.page(1), 1, results.pages).to_dict()
+
+
+@benchmark("buses.search_all_matches")
+def bench_buses_search_all_matches(ctx):
+    return lambda: ctx.route_index.search_ids("2", len(ctx.route_index.items))
+
+
+@benchmark("stop.format_arrivals")
+def bench_stop_format_arrivals(ctx):
+    def run():
+        arrivals = sorted(ctx.arrivals, key=lambda x: x.get('realtimeArrivalMinutes', 999))
+        return "\n".join(ctx.stop_cog.format_arrival_time(arrival) for arrival in arrivals)
+    return run
+
+
+@benchmark("stats.format_stats")
+def bench_stats_format_stats(ctx):
+    return lambda: ctx.stats_cog.format_stats(ctx.passenger_stats)
+
+
+@benchmark("stats.weekly_trend")
+def bench_stats_weekly_trend(ctx):
+    return lambda: ctx.stats_cog.weekly_embed(ctx.passenger_history).to_dict()
+
+
+@benchmark("stats.day_over_day")
+def bench_stats_day_over_day(ctx):
+    return lambda: ctx.stats_cog.day_over_day_embed(ctx.passenger_history).to_dict()
+
+
+@benchmark("search.stop_prefix")
+def bench_search_stop_prefix(ctx):
+    return lambda: ctx.stop_index.search("ბა")
+
+
+@benchmark("search.stop_transliterated")
+def bench_search_stop_transliterated(ctx):
+    return lambda: ctx.stop_index.search("metro")
+
+
+@benchmark("geo.nearest")
+def bench_geo_nearest(ctx):
+    stop = ctx.stops[len(ctx.stops) // 2]
+    return lambda: ctx.stop_grid.nearest(stop['lat'] + 0.001, stop['lon'] - 0.001, 5)
+
+
+@benchmark("geo.build_grid")
+def bench_geo_build_grid(ctx):
+    return lambda: GridIndex(ctx.stops)
+
+
+@benchmark("journeys.plan")
+def bench_journeys_plan(ctx):
+    graph = ctx.journey_graph
+    origin, target = graph.codes[0], graph.codes[len(graph.codes) // 2]
+    return lambda: graph.plan(origin, target)
+
+
+@benchmark("journeys.build_graph")
+def bench_journeys_build_graph(ctx):
+    return lambda: JourneyGraph.build(ctx.route_patterns)
+
+
+@benchmark("search.build_stop_index")
+def bench_search_build_stop_index(ctx):
+    return lambda: SearchIndex(ctx.stops, ('code', 'name'))
+
+
+def measure(func, repeat, min_time):
+    timer = timeit.Timer(func)
+    number, elapsed = timer.autorange()
+    # autorange aims for 0.2s; scale up to the requested time per round
+    number = max(number, int(number * min_time / max(elapsed, 1e-9)))
+    rounds = [total / number for total in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "number": number,
+        "rounds": repeat,
+        "min_us": min(rounds) * 1e6,
+        "median_us": statistics.median(rounds) * 1e6
+    }
+
+
+def compare(results, baseline_path, threshold):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result["median_us"] / baseline[name]["median_us"]
+        marker = "  REGRESSION" if ratio > threshold else ""
+        print(f"{name:32} {baseline[name]['median_us']:12.2f} -> {result['median_us']:12.2f} us  x{ratio:.2f}{marker}")
+        if ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stops", type=int, default=3000, help="synthetic stop catalog size")
+    parser.add_argument("--routes", type=int, default=150, help="synthetic route catalog size")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per round")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--json", dest="json_path", help="write results to this file")
+    parser.add_argument("--compare", help="baseline results file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="median slowdown ratio counted as a regression")
+    args = parser.parse_args(argv)
+
+    ctx = setup_context(args.stops, args.routes)
+    results = {}
+    for name, factory in BENCHMARKS.items():
+        if args.filter not in name:
+            continue
+        results[name] = measure(factory(ctx), args.repeat, args.min_time)
+        print(f"{name:32} median {results[name]['median_us']:12.2f} us   min {results[name]['min_us']:12.2f} us")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "params": {"stops": args.stops, "routes": args.routes},
+                "results": results
+            }, f, indent=2)
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
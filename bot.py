@@ -1,14 +1,25 @@
 import discord
 from discord.ext import commands
 import config
+import metrics
 import asyncio
 import logging
 import sys
+from transit.client import TTCClient
+from transit.catalog import StopCatalog, RouteCatalog
+from transit.arrivals import ArrivalService
+from transit.snapshot import SnapshotStore
+from transit.passengers import PassengerStats
+from transit.history import PassengerHistory
+from transit.journeys import JourneyPlanner
+from transit import shared
+from llm.scheduler import Scheduler
+from llm.router import ModelRouter
 
 # Simple logging configuration
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s: %(message)s',
+    format='%(asctime)s - ' + (f'[cluster {config.CLUSTER_ID}] ' if config.CLUSTER_ID else '') + '%(name)s: %(message)s',
     datefmt='%H:%M:%S',
     handlers=[
         logging.StreamHandler(sys.stdout),
@@ -21,22 +32,62 @@ intents = discord.Intents.default()
 intents.messages = True
 intents.guilds = True
 
-bot = commands.Bot(
+class ShardedBot(commands.AutoShardedBot):
+    async def before_identify_hook(self, shard_id, *, initial=False):
+        # Clusters share one identify rate limit; take turns through the shared cache
+        if self.shared is None:
+            return await super().before_identify_hook(shard_id, initial=initial)
+        try:
+            await self.shared.identify(shard_id % config.IDENTIFY_CONCURRENCY, config.IDENTIFY_INTERVAL)
+        except shared.SharedCacheError as e:
+            logger.warning(f"Identify queue unavailable: {e}")
+            await super().before_identify_hook(shard_id, initial=initial)
+
+bot_options = dict(
     command_prefix="!",
     intents=intents,
     chunk_guilds_at_startup=False,
     heartbeat_timeout=150.0,
     gateway_queue_size=512
 )
+if config.SHARDED:
+    bot = ShardedBot(shard_count=config.SHARD_COUNT, shard_ids=config.SHARD_IDS, **bot_options)
+else:
+    bot = commands.Bot(**bot_options)
+bot.shared = shared.connect()
+bot.ttc = TTCClient()
+snapshot = SnapshotStore() if config.SNAPSHOT_PATH else None
+bot.stop_catalog = StopCatalog(bot.ttc, snapshot=snapshot, shared=bot.shared)
+bot.route_catalog = RouteCatalog(bot.ttc, snapshot=snapshot, shared=bot.shared)
+bot.arrivals = ArrivalService(bot.ttc, shared=bot.shared)
+bot.journeys = JourneyPlanner(bot.route_catalog, bot.stop_catalog, snapshot=snapshot, shared=bot.shared)
+bot.passenger_stats = PassengerStats(bot.ttc, history=PassengerHistory(), shared=bot.shared)
+bot.llm_scheduler = Scheduler()
+bot.llm_router = ModelRouter()
 
 @bot.event
 async def on_ready():
     logger.info(f'Bot ready: {bot.user} ({bot.user.id})')
+
+@bot.event
+async def on_app_command_completion(interaction, command):
+    latency = (discord.utils.utcnow() - interaction.created_at).total_seconds()
+    metrics.command_latency.observe(latency, command=command.qualified_name)
+
+@bot.tree.error
+async def on_app_command_error(interaction, error):
+    command = interaction.command.qualified_name if interaction.command else "unknown"
+    metrics.command_errors.inc(command=command)
+    # Replaces CommandTree.on_error, which logged the traceback and nothing else
+    logger.error(f"Command error: {command}: {error}", exc_info=error)
     try:
-        synced = await bot.tree.sync()
-        logger.info(f"Synced {len(synced)} commands")
-    except Exception as e:
-        logger.error(f"Sync failed: {e}")
+        if interaction.response.is_done():
+            # Most commands defer first
+            await interaction.followup.send("შეცდომა მოხდა 😔", ephemeral=True)
+        else:
+            await interaction.response.send_message("შეცდომა მოხდა 😔", ephemeral=True)
+    except discord.HTTPException:
+        pass
 
 @bot.event
 async def on_error(event, *args, **kwargs):
@@ -54,6 +105,18 @@ async def on_disconnect():
 async def on_resumed():
     logger.info("Session resumed")
 
+@bot.event
+async def on_shard_ready(shard_id):
+    logger.info(f"Shard {shard_id} ready")
+
+@bot.event
+async def on_shard_disconnect(shard_id):
+    logger.warning(f"Shard {shard_id} disconnected")
+
+@bot.event
+async def on_shard_resumed(shard_id):
+    logger.info(f"Shard {shard_id} resumed")
+
 @bot.event
 async def on_view_timeout(view):
     logger.info("View timeout")
@@ -64,34 +127,52 @@ async def ping(interaction: discord.Interaction):
 
 async def setup():
     bot.remove_command("help")
+    bot.stop_catalog.start()
+    bot.route_catalog.start()
+    bot.passenger_stats.start()
+    bot.journeys.start()
     await bot.load_extension("cogs.stats")
     await bot.load_extension("cogs.stop")
+    await bot.load_extension("cogs.board")
     await bot.load_extension("cogs.buses")
     await bot.load_extension("cogs.bus")
     await bot.load_extension("cogs.stops")
+    await bot.load_extension("cogs.nearby")
+    await bot.load_extension("cogs.journey")
     await bot.load_extension("cogs.help")
     await bot.load_extension("cogs.uptime")
     await bot.load_extension('cogs.ai')
+    await bot.load_extension("cogs.botstats")
+    await bot.load_extension("cogs.sync")
     logger.info("Extensions loaded")
 
 async def main():
     max_retries = 5
     retry_delay = 5
 
-    while True:
-        try:
-            async with bot:
-                await setup()
-                await bot.start(config.TOKEN)
-        except discord.errors.ConnectionClosed:
-            logger.warning("Connection lost, reconnecting...")
-            await asyncio.sleep(retry_delay)
-        except discord.errors.GatewayNotFound:
-            logger.error("Gateway error, retrying...")
-            await asyncio.sleep(retry_delay)
-        except Exception as e:
-            logger.error(f"Fatal: {str(e)}")
-            await asyncio.sleep(retry_delay)
+    try:
+        while True:
+            try:
+                async with bot:
+                    await setup()
+                    await bot.start(config.TOKEN)
+            except discord.errors.ConnectionClosed:
+                logger.warning("Connection lost, reconnecting...")
+                await asyncio.sleep(retry_delay)
+            except discord.errors.GatewayNotFound:
+                logger.error("Gateway error, retrying...")
+                await asyncio.sleep(retry_delay)
+            except Exception as e:
+                logger.error(f"Fatal: {str(e)}")
+                await asyncio.sleep(retry_delay)
+    finally:
+        await bot.stop_catalog.stop()
+        await bot.route_catalog.stop()
+        await bot.passenger_stats.stop()
+        await bot.journeys.stop()
+        await bot.ttc.close()
+        if bot.shared is not None:
+            await bot.shared.close()
 
 if __name__ == '__main__':
     try:
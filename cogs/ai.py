@@ -1,11 +1,19 @@
 import discord
 from discord.ext import commands
 import config
+import metrics
 import aiohttp
 import json
 import asyncio
 import logging
 from datetime import datetime
+from llm.conversations import ConversationStore
+from llm.images import ImagePipeline, ProcessedImage
+from llm.scheduler import INTERACTIVE, RateLimited, parse_retry_after
+from llm.stream import ToolCalls, iter_deltas
+from llm.router import InvalidRequest
+from llm.tools import TransitTools
+from transit.shared import SharedCacheError
 
 # Set up logger for AI cog
 logger = logging.getLogger('ai.cog')
@@ -31,7 +39,9 @@ DEFAULT_SYSTEM_PROMPT = """
   - `/bus bus_id:<ავტობუსის_ნომერი>` - ავტობუსის მარშრუტის გაჩერებები
   - `/buses` - ყველა ავტობუსის მარშრუტი
   - `/stopinfo stop_no:<გაჩერების_ნომერი>` - რეალურ დროში ავტობუსების მოსვლის დრო
-  - `/stops` - ახლომდებარე გაჩერებები და მათი ID-ები
+  - `/stops` - გაჩერებების სია და მათი ID-ები
+  - `/nearby location:<კოორდინატები ან გაჩერება>` - ახლომდებარე გაჩერებები მანძილით და მოსვლის დროით
+  - `/route from:<გაჩერება> to:<გაჩერება>` - მარშრუტის დაგეგმვა გადაჯდომებით
 
 ### სურათების ანალიზი:
 - ყურადღება გაამახვილეთ ტრანსპორტთან დაკავშირებულ დეტალებზე
@@ -46,92 +56,252 @@ DEFAULT_SYSTEM_PROMPT = """
 - მოარგეთ პასუხები თითოეულ მომხმარებელს
 - ჩართეთ ტრანსპორტის ინფორმაცია არასატრანსპორტო კითხვებშიც"""
 
+TOOLS_PROMPT = """
+
+### რეალურ დროში მონაცემები:
+- გაჩერებების, ავტობუსების მოსვლის დროის, მარშრუტების და მგზავრების სტატისტიკის კითხვებზე გამოიყენეთ ხელმისაწვდომი ხელსაწყოები და უპასუხეთ მიღებული მონაცემებით
+- თუ გაჩერების ნომერი უცნობია, ჯერ მოძებნეთ გაჩერება სახელით
+- ბრძანებები შესთავაზეთ მხოლოდ დამატებით, როცა მომხმარებელს მეტი დეტალი სჭირდება"""
+
+EMBED_DESCRIPTION_LIMIT = 4096
+CURSOR = " ▌"
+
+def split_text(text, limit):
+    """Split into chunks of at most `limit` chars, preferring line then word breaks.
+
+    A chunk only depends on the text up to its end, so chunks that were
+    already followed by another one never change as the text grows.
+    """
+    chunks = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut < limit // 2:
+            cut = text.rfind(" ", 0, limit)
+        if cut < limit // 2:
+            cut = limit
+        chunks.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    chunks.append(text)
+    return chunks
+
+class StreamingReply:
+    """Followup messages that fill in as a streamed answer arrives.
+
+    Tokens are buffered and the messages are edited at most once per
+    `interval`, so a fast stream costs a handful of edits instead of one per
+    token. Text past the embed description limit continues in new followups.
+    """
+
+    def __init__(self, interaction, build_embed, interval=None):
+        self.interaction = interaction
+        self.build_embed = build_embed
+        self.interval = interval or config.AI_STREAM_EDIT_INTERVAL
+        self.text = ""
+        self.messages = []
+        self.rendered = []
+        self.changed = asyncio.Event()
+        self.finished = asyncio.Event()
+        # Serializes the first message against queue position notices
+        self.lock = asyncio.Lock()
+        self.queued = False
+
+    async def show_position(self, position):
+        """Show the place in the OpenRouter queue until the answer starts."""
+        async with self.lock:
+            if self.messages:
+                return
+            await self.interaction.edit_original_response(content=f"⏳ რიგში ხართ: #{position}")
+            self.queued = True
+
+    async def run(self, deltas):
+        """Consume the stream and return the full text."""
+        pump = asyncio.create_task(self.pump())
+        try:
+            async for delta in deltas:
+                self.text += delta
+                self.changed.set()
+        finally:
+            self.finished.set()
+            self.changed.set()
+            await pump
+        return self.text
+
+    async def pump(self):
+        while True:
+            await self.changed.wait()
+            self.changed.clear()
+            final = self.finished.is_set()
+            try:
+                await self.render(final)
+            except discord.errors.NotFound:
+                raise
+            except discord.HTTPException as e:
+                # Skipped edits are retried with newer text on the next pass
+                logger.warning(f"Stream edit failed: {e}")
+                if final:
+                    raise
+            if final:
+                return
+            try:
+                await asyncio.wait_for(self.finished.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def render(self, final):
+        chunks = split_text(self.text, EMBED_DESCRIPTION_LIMIT - len(CURSOR))
+        for page, chunk in enumerate(chunks):
+            if not final and page == len(chunks) - 1:
+                chunk += CURSOR
+            if page < len(self.rendered) and self.rendered[page] == chunk:
+                continue
+            embed = self.build_embed(chunk or "…", page)
+            if page < len(self.messages):
+                await self.messages[page].edit(embed=embed)
+                self.rendered[page] = chunk
+            elif page == 0:
+                async with self.lock:
+                    if self.queued:
+                        # The queue notice took the deferred response, answer in its place
+                        message = await self.interaction.edit_original_response(content=None, embed=embed)
+                    else:
+                        message = await self.interaction.followup.send(embed=embed)
+                    self.messages.append(message)
+                self.rendered.append(chunk)
+            else:
+                self.messages.append(await self.interaction.followup.send(embed=embed))
+                self.rendered.append(chunk)
+
 class AI(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.chat_histories = {}
+        self.chat_histories = ConversationStore(shared=bot.shared)
+        self.images = ImagePipeline()
+        self.tools = TransitTools(bot)
+        self.scheduler = bot.llm_scheduler
+        self.router = bot.llm_router
         self.locks = {}
         self.session = None
 
     async def cog_load(self):
-        self.session = aiohttp.ClientSession()
+        self.session = aiohttp.ClientSession(trace_configs=[metrics.trace_config()])
+        self.chat_histories.start()
 
     async def cog_unload(self):
+        await self.chat_histories.close()
+        self.images.close()
         if self.session:
             await self.session.close()
 
-    async def get_ai_response(self, query: str, history: list = None, image: discord.Attachment = None) -> str:
-        try:
-            messages = []
+    async def prepare_image(self, image: discord.Attachment) -> ProcessedImage:
+        allowed_types = ['image/jpeg', 'image/png', 'image/gif', 'image/webp']
+        if image.content_type not in allowed_types:
+            logger.warning(f"Invalid image type: {image.content_type}")
+            raise ValueError(f"არასწორი სურათის ფორმატი. გთხოვთ ატვირთოთ JPEG, PNG, GIF, ან WEBP ფორმატის სურათი.")
+
+        if image.size > 10 * 1024 * 1024:
+            logger.warning("Image exceeds 10MB limit")
+            raise ValueError("სურათის ზომა ძალიან დიდია. მაქსიმალური ზომაა 10MB.")
+
+        logger.info(f"Processing image: {image.filename}")
+        return await self.images.process(await image.read())
+
+    def expand_history(self, history: list) -> list:
+        """Inline the newest image of the history; older ones stay a text note."""
+        expanded = []
+        image_sent = False
+        for message in reversed(history):
+            content = message["content"]
+            if isinstance(content, list):
+                text = next((part["text"] for part in content if part.get("type") == "text"), "")
+                url = next((part["image_url"]["url"] for part in content if part.get("type") == "image_url"), None)
+                url = self.images.resolve(url) if url and not image_sent else None
+                if url:
+                    image_sent = True
+                    message = {"role": message["role"], "content": [
+                        {"type": "text", "text": text},
+                        {"type": "image_url", "image_url": {"url": url}}
+                    ]}
+                else:
+                    message = {"role": message["role"], "content": f"{text}\n[სურათი]"}
+            expanded.append(message)
+        expanded.reverse()
+        return expanded
+
+    def build_messages(self, query: str, history: list = None, image: ProcessedImage = None) -> list:
+        messages = []
+        messages.append({
+            "role": "system",
+            "content": DEFAULT_SYSTEM_PROMPT + TOOLS_PROMPT if config.AI_TOOLS else DEFAULT_SYSTEM_PROMPT
+        })
+        
+        if history:
+            messages.extend(self.expand_history(history[-5:]))
+        
+        if image:
+            multimodal_content = [
+                {
+                    "type": "text",
+                    "text": query if query else "რა არის გამოსახული ამ სურათზე?"
+                },
+                {
+                    "type": "image_url",
+                    "image_url": {"url": image.data_url}
+                }
+            ]
+
             messages.append({
-                "role": "system",
-                "content": DEFAULT_SYSTEM_PROMPT
+                "role": "user",
+                "content": multimodal_content
             })
-            
-            if history:
-                messages.extend(history[-5:])
-            
-            if image:
-                allowed_types = ['image/jpeg', 'image/png', 'image/gif', 'image/webp']
-                if image.content_type not in allowed_types:
-                    logger.warning(f"Invalid image type: {image.content_type}")
-                    raise ValueError(f"არასწორი სურათის ფორმატი. გთხოვთ ატვირთოთ JPEG, PNG, GIF, ან WEBP ფორმატის სურათი.")
-
-                if image.size > 10 * 1024 * 1024:
-                    logger.warning("Image exceeds 10MB limit")
-                    raise ValueError("სურათის ზომა ძალიან დიდია. მაქსიმალური ზომაა 10MB.")
-
-                logger.info(f"Processing image: {image.filename}")
-
-                multimodal_content = [
-                    {
-                        "type": "text",
-                        "text": query if query else "რა არის გამოსახული ამ სურათზე?"
-                    },
-                    {
-                        "type": "image_url",
-                        "image_url": {"url": image.url}
-                    }
-                ]
-
-                messages.append({
-                    "role": "user",
-                    "content": multimodal_content
-                })
-            else:
-                messages.append({
-                    "role": "user",
-                    "content": query
-                })
-
-            logger.info(f"Sending request to OpenRouter")
-            request_body = {
-                "model": config.DEFAULT_MODEL,
-                "messages": messages,
-                "timeout": config.REQUEST_TIMEOUT
-            }
-
-            async with self.session.post(
-                url=f"{config.OPENROUTER_BASE_URL}/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {config.OPENROUTER_API_KEY}",
-                    "HTTP-Referer": config.SITE_URL,
-                    "X-Title": config.SITE_NAME,
-                    "Content-Type": "application/json"
-                },
-                json=request_body,
-                timeout=aiohttp.ClientTimeout(total=config.REQUEST_TIMEOUT)
-            ) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    logger.error(f"API error: {response.status}")
-                    raise Exception(f"API Error {response.status}")
-                
-                result = await response.json()
-                response_content = result['choices'][0]['message']['content']
-                logger.info(f"Response received ({len(response_content)} chars)")
-                
-                return response_content
+        else:
+            messages.append({
+                "role": "user",
+                "content": query
+            })
+        return messages
+
+    def model_class(self, messages: list) -> str:
+        has_image = any(
+            isinstance(message["content"], list) and any(part.get("type") == "image_url" for part in message["content"])
+            for message in messages
+        )
+        return "vision" if has_image else "chat"
+
+    def tool_choice(self, turn: int):
+        """`tool_choice` for a turn of the tool loop; the last turn has to answer."""
+        if not config.AI_TOOLS:
+            return None
+        return "none" if turn == config.AI_TOOL_ROUNDS else "auto"
+
+    def request_kwargs(self, model: str, messages: list, stream: bool = False, tool_choice: str = None) -> dict:
+        request_body = {
+            "model": model,
+            "messages": messages,
+            "timeout": config.REQUEST_TIMEOUT
+        }
+        if stream:
+            request_body["stream"] = True
+        if tool_choice:
+            request_body["tools"] = self.tools.schemas
+            request_body["tool_choice"] = tool_choice
+        return {
+            "url": f"{config.OPENROUTER_BASE_URL}/chat/completions",
+            "headers": {
+                "Authorization": f"Bearer {config.OPENROUTER_API_KEY}",
+                "HTTP-Referer": config.SITE_URL,
+                "X-Title": config.SITE_NAME,
+                "Content-Type": "application/json"
+            },
+            "json": request_body,
+            "timeout": aiohttp.ClientTimeout(total=config.REQUEST_TIMEOUT)
+        }
+
+    async def get_ai_response(self, query: str, history: list = None, image: ProcessedImage = None,
+                              guild_id=None, user_id=None, on_position=None) -> str:
+        """The whole answer at once, after any tool calls."""
+        try:
+            chunks = self.stream_ai_response(query, history, image, guild_id, user_id, on_position, streaming=False)
+            return "".join([chunk async for chunk in chunks])
 
         except ValueError as ve:
             logger.warning(str(ve))
@@ -140,6 +310,132 @@ class AI(commands.Cog):
             logger.error(str(e))
             raise
 
+    async def request_ai_response(self, model: str, messages: list, tool_choice: str = None) -> dict:
+        logger.info(f"Sending request to OpenRouter ({model})")
+        async with self.session.post(**self.request_kwargs(model, messages, tool_choice=tool_choice)) as response:
+            if response.status == 429:
+                raise RateLimited(parse_retry_after(response.headers))
+            if response.status == 413:
+                raise InvalidRequest("Request too large")
+            if response.status != 200:
+                error_text = await response.text()
+                logger.error(f"API error: {response.status}")
+                raise Exception(f"API Error {response.status}")
+            
+            result = await response.json()
+            message = result['choices'][0]['message']
+            logger.info(f"Response received ({len(message.get('content') or '')} chars, {len(message.get('tool_calls') or [])} tool calls)")
+            
+            return message
+
+    async def open_stream(self, model: str, messages: list, tool_choice: str = None):
+        """Chunks of one streamed completion from `model`."""
+        logger.info(f"Streaming request to OpenRouter ({model})")
+        async with self.session.post(**self.request_kwargs(model, messages, stream=True, tool_choice=tool_choice)) as response:
+            if response.status == 429:
+                raise RateLimited(parse_retry_after(response.headers))
+            if response.status == 413:
+                raise InvalidRequest("Request too large")
+            if response.status != 200:
+                logger.error(f"API error: {response.status}")
+                raise Exception(f"API Error {response.status}")
+            async for delta in iter_deltas(response):
+                yield delta
+
+    async def complete(self, messages: list, tool_choice=None, guild_id=None, user_id=None, on_position=None, streaming=True):
+        """Yield one model turn: text pieces, then a `ToolCalls` if the model called tools."""
+        request_class = self.model_class(messages)
+        if not streaming:
+            message = await self.scheduler.run(
+                lambda: self.router.run(
+                    request_class,
+                    lambda model: self.request_ai_response(model, messages, tool_choice),
+                    prefer=config.DEFAULT_MODEL,
+                    try_hedge=lambda: self.scheduler.try_acquire(guild_id)
+                ),
+                INTERACTIVE, guild_id, user_id, on_position
+            )
+            if message.get('content'):
+                yield message['content']
+            if message.get('tool_calls'):
+                yield ToolCalls(message['tool_calls'])
+            return
+
+        for attempt in range(config.LLM_MAX_ATTEMPTS):
+            async with self.scheduler.slot(INTERACTIVE, guild_id, user_id, on_position):
+                try:
+                    chunks = await self.router.stream(
+                        request_class,
+                        lambda model: self.open_stream(model, messages, tool_choice),
+                        prefer=config.DEFAULT_MODEL,
+                        try_hedge=lambda: self.scheduler.try_acquire(guild_id)
+                    )
+                except RateLimited as e:
+                    self.scheduler.rate_limited(e.retry_after, attempt)
+                    if attempt == config.LLM_MAX_ATTEMPTS - 1:
+                        raise
+                    continue
+                async for delta in chunks:
+                    yield delta
+                return
+
+    async def stream_ai_response(self, query: str, history: list = None, image: ProcessedImage = None,
+                                 guild_id=None, user_id=None, on_position=None, streaming=None):
+        """Yield the answer in pieces as OpenRouter streams it.
+
+        When the model calls tools, they all run concurrently and their
+        results go back in the next round, up to AI_TOOL_ROUNDS times; only
+        the text reaches the caller. Without AI_STREAMING every round comes
+        as a single piece.
+        """
+        streaming = config.AI_STREAMING if streaming is None else streaming
+        messages = self.build_messages(query, history, image)
+        for turn in range(config.AI_TOOL_ROUNDS + 1):
+            text, calls = "", None
+            async for delta in self.complete(messages, self.tool_choice(turn), guild_id, user_id, on_position, streaming):
+                if isinstance(delta, ToolCalls):
+                    calls = delta
+                else:
+                    text += delta
+                    yield delta
+            if not calls:
+                return
+
+            logger.info(f"Tool calls: {', '.join(call['function']['name'] for call in calls)}")
+            if text:
+                yield "\n\n"
+            messages.append({"role": "assistant", "content": text, "tool_calls": list(calls)})
+            messages.extend(await self.tools.run(calls))
+
+    def build_answer_embed(self, interaction, question, image, text, page=0):
+        if page:
+            return discord.Embed(
+                title="💬 TTC-ის პასუხი (გაგრძელება)",
+                description=text,
+                color=discord.Color.blue()
+            )
+
+        embed = discord.Embed(
+            title="💬 TTC-ის პასუხი",
+            description=text,
+            color=discord.Color.blue()
+        )
+        
+        embed.add_field(
+            name="🤔 შეკითხვა",
+            value=question,
+            inline=False
+        )
+
+        if image:
+            embed.set_image(url=image.url)
+
+        embed.set_footer(
+            text=f"Asked by {interaction.user.name}",
+            icon_url=interaction.user.avatar.url if interaction.user.avatar else None
+        )
+        return embed
+
     @discord.app_commands.command(name="ask", description="დაუსვი შეკითხვა TTC-ის")
     @discord.app_commands.describe(
         question="თქვენი შეკითხვა",
@@ -152,6 +448,7 @@ class AI(commands.Cog):
         image: discord.Attachment = None
     ):
         user_id = str(interaction.user.id)
+        acquired = claimed = False
         
         try:
             if user_id in self.locks:
@@ -163,9 +460,9 @@ class AI(commands.Cog):
                 except discord.errors.NotFound:
                     logger.info(f"Interaction expired: {user_id}")
                 return
-
             self.locks[user_id] = datetime.now()
-            
+            acquired = True
+
             try:
                 await interaction.response.defer(thinking=True)
             except discord.errors.NotFound:
@@ -175,67 +472,54 @@ class AI(commands.Cog):
                 logger.error(f"Defer error: {str(e)}")
                 return
 
-            if user_id not in self.chat_histories:
-                self.chat_histories[user_id] = []
+            # Only after the defer: the shared cache may take a while to answer
+            claimed = await self.claim(user_id)
+            if not claimed:
+                try:
+                    await interaction.followup.send("⚠️ გთხოვთ დაელოდოთ წინა მოთხოვნის დასრულებას!", ephemeral=True)
+                except discord.errors.NotFound:
+                    logger.info(f"Interaction expired: {user_id}")
+                return
 
             try:
+                history = await self.chat_histories.get(user_id)
                 logger.info(f"Processing: {user_id} - Image: {bool(image)}")
+                processed = await self.prepare_image(image) if image else None
+                reply = StreamingReply(
+                    interaction,
+                    lambda text, page: self.build_answer_embed(interaction, question, image, text, page)
+                )
                 response_text = await asyncio.wait_for(
-                    self.get_ai_response(
+                    reply.run(self.stream_ai_response(
                         question,
-                        self.chat_histories[user_id],
-                        image=image
-                    ),
+                        history,
+                        image=processed,
+                        guild_id=interaction.guild_id,
+                        user_id=user_id,
+                        on_position=reply.show_position
+                    )),
                     timeout=config.REQUEST_TIMEOUT
                 )
 
-                embed = discord.Embed(
-                    title="💬 TTC-ის პასუხი",
-                    description=response_text,
-                    color=discord.Color.blue()
-                )
-                
-                embed.add_field(
-                    name="🤔 შეკითხვა",
-                    value=question,
-                    inline=False
-                )
-
-                if image:
-                    embed.set_image(url=image.url)
-
-                embed.set_footer(
-                    text=f"Asked by {interaction.user.name}",
-                    icon_url=interaction.user.avatar.url if interaction.user.avatar else None
-                )
-
                 # Update chat history
                 if image:
                     user_message = {
                         "role": "user",
                         "content": [
                             {"type": "text", "text": question},
-                            {"type": "image_url", "image_url": {"url": image.url}}
+                            {"type": "image_url", "image_url": {"url": processed.reference}}
                         ]
                     }
                 else:
                     user_message = {"role": "user", "content": question}
 
-                self.chat_histories[user_id].extend([
+                await self.chat_histories.append(
+                    user_id,
                     user_message,
                     {"role": "assistant", "content": response_text}
-                ])
+                )
 
-                if len(self.chat_histories[user_id]) > 10:
-                    self.chat_histories[user_id] = self.chat_histories[user_id][-10:]
-
-                try:
-                    await interaction.followup.send(embed=embed)
-                    logger.info(f"Response sent: {user_id}")
-                except discord.errors.NotFound:
-                    logger.info(f"Could not send response: {user_id}")
-                except Exception as e:
-                    logger.error(f"Send error: {str(e)}")
+                logger.info(f"Response sent: {user_id}")
 
             except asyncio.TimeoutError:
                 logger.error(f"Timeout: {user_id}")
@@ -257,8 +541,30 @@ class AI(commands.Cog):
         except Exception as e:
             logger.error(f"Critical error: {str(e)}")
         finally:
-            self.locks.pop(user_id, None)
-            logger.info(f"Lock released: {user_id}")
+            if acquired:
+                await self.release(user_id, claimed)
+                logger.info(f"Lock released: {user_id}")
+
+    async def claim(self, user_id: str) -> bool:
+        """Take the user's /ask slot across all clusters; True without a shared cache or when it is down."""
+        shared = self.bot.shared
+        if shared is None:
+            return True
+        try:
+            # Expires on its own if this cluster dies mid-request
+            return await shared.claim(f"ask:{user_id}", config.REQUEST_TIMEOUT + 30)
+        except SharedCacheError as e:
+            shared.failed(e)
+            return True
+
+    async def release(self, user_id: str, claimed: bool):
+        self.locks.pop(user_id, None)
+        if self.bot.shared is None or not claimed:
+            return
+        try:
+            await self.bot.shared.release(f"ask:{user_id}")
+        except SharedCacheError as e:
+            self.bot.shared.failed(e)
 
 async def setup(bot):
     await bot.add_cog(AI(bot))
\ No newline at end of file
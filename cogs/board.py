@@ -0,0 +1,168 @@
+import discord
+from discord.ext import commands, tasks
+import config
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime, timezone
+from ui.labels import updated_label
+
+logger = logging.getLogger(__name__)
+
+
+class LiveBoard:
+    __slots__ = ('message', 'stop_code', 'channel_id', 'expires_at', 'last_content')
+
+    def __init__(self, message, stop_code, channel_id, expires_at, last_content):
+        self.message = message
+        self.stop_code = stop_code
+        self.channel_id = channel_id
+        self.expires_at = expires_at
+        self.last_content = last_content
+
+
+class Board(commands.Cog):
+    """Departure boards that keep editing themselves.
+
+    A single loop drives every board: each tick fetches every watched stop
+    once, however many boards show it, and only edits messages whose
+    arrivals actually changed.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.stop_catalog = bot.stop_catalog
+        self.arrivals = bot.arrivals
+        self.boards = []
+        self.channel_edits = {}
+
+    async def cog_load(self):
+        self.poll.change_interval(seconds=config.BOARD_POLL_INTERVAL)
+        self.poll.start()
+
+    async def cog_unload(self):
+        self.poll.cancel()
+
+    @discord.app_commands.command(name="board", description="ცოცხალი დაფა: გაჩერების ავტომატურად განახლებადი ინფორმაცია")
+    @discord.app_commands.describe(stop_no="გაჩერების ნომერი ან სახელი", minutes="რამდენი წუთი განახლდეს")
+    async def board(
+        self,
+        interaction: discord.Interaction,
+        stop_no: str,
+        minutes: discord.app_commands.Range[int, 1, config.BOARD_MAX_MINUTES] = config.BOARD_DEFAULT_MINUTES
+    ):
+        await interaction.response.defer()
+        try:
+            if len(self.boards) >= config.BOARD_MAX_ACTIVE:
+                await interaction.followup.send("⚠️ ახლა ძალიან ბევრი დაფაა აქტიური, სცადეთ მოგვიანებით.")
+                return
+
+            await self.stop_catalog.ensure_loaded()
+            stop = self.stop_catalog.find(stop_no)
+            if not stop:
+                await interaction.followup.send("გაჩერება ვერ მოიძებნა ან ინფორმაცია არ არის ხელმისაწვდომი **(ან ავტობუსები აღარ დადიან)**.")
+                return
+
+            expires_at = time.time() + minutes * 60
+            snapshot = await self.arrivals.get(stop['code'])
+            embed, content = self.render(stop['code'], snapshot, expires_at)
+            message = await interaction.followup.send(embed=embed, wait=True)
+
+            self.boards.append(LiveBoard(message, stop['code'], interaction.channel_id, expires_at, content))
+
+        except discord.errors.NotFound:
+            if config.DEBUG:
+                print("Interaction not found or timed out.")
+        except Exception as e:
+            if config.DEBUG:
+                print(f"Unexpected error: {e}")
+            await interaction.followup.send("შეცდომა მოხდა 😔")
+
+    @board.autocomplete("stop_no")
+    async def stop_no_autocomplete(self, interaction: discord.Interaction, current: str):
+        return await self.bot.get_cog("Stop").stop_no_autocomplete(interaction, current)
+
+    def render(self, stop_code, snapshot, expires_at, finished=False):
+        """Return the board embed and the part of it that decides whether to edit."""
+        stop_cog = self.bot.get_cog("Stop")
+        arrivals = sorted(snapshot.arrivals or [], key=lambda x: x.get('realtimeArrivalMinutes', 999))
+        content = "\n".join(stop_cog.format_arrival_time(arrival) for arrival in arrivals) or "ამ გაჩერებაზე ავტობუსები აღარ დადიან."
+
+        name = (snapshot.stop or {}).get('name', 'Unknown')
+        embed = discord.Embed(title=f"🏁 გაჩერება #{stop_code} - {name}", color=discord.Color.dark_grey() if finished else discord.Color.green())
+        embed.add_field(name="მომსვლელი ავტობუსები", value=content[:1024], inline=False)
+        embed.timestamp = datetime.fromtimestamp(snapshot.fetched_at, timezone.utc)
+        if finished:
+            embed.set_footer(text="⏹️ დაფის განახლება დასრულდა")
+        elif snapshot.stale:
+            embed.set_footer(text=updated_label([snapshot]))
+        else:
+            embed.set_footer(text=f"🔴 ცოცხალი დაფა · განახლდება {int((expires_at - time.time()) // 60) + 1} წუთის განმავლობაში")
+        return embed, content
+
+    def can_edit(self, channel_id, now):
+        """Stay inside Discord's per-channel message edit rate limit."""
+        edits = self.channel_edits.setdefault(channel_id, deque())
+        while edits and edits[0] <= now - config.BOARD_CHANNEL_EDIT_WINDOW:
+            edits.popleft()
+        if len(edits) >= config.BOARD_CHANNEL_EDIT_LIMIT:
+            return False
+        edits.append(now)
+        return True
+
+    async def update(self, board, snapshot, now):
+        finished = board.expires_at <= now
+        embed, content = self.render(board.stop_code, snapshot, board.expires_at, finished)
+        if not finished and content == board.last_content:
+            return True
+        if not self.can_edit(board.channel_id, now):
+            # Keep last_content so the change is retried next tick
+            return True
+
+        try:
+            await board.message.edit(embed=embed)
+        except discord.errors.NotFound:
+            return False
+        except discord.errors.HTTPException as e:
+            logger.warning(f"Board edit failed: {e}")
+            # last_content is left as it was so the edit is retried next tick
+            return not finished
+        board.last_content = content
+        return not finished
+
+    @tasks.loop(seconds=30)
+    async def poll(self):
+        try:
+            await self.tick()
+        except Exception as e:
+            # An exception escaping a tasks.loop would stop every board
+            logger.error(f"Board poll failed: {e}")
+
+    async def tick(self):
+        now = time.time()
+        # Channels without edits in the current window have nothing left to limit
+        cutoff = now - config.BOARD_CHANNEL_EDIT_WINDOW
+        for channel_id in [channel_id for channel_id, edits in self.channel_edits.items() if not edits or edits[-1] <= cutoff]:
+            del self.channel_edits[channel_id]
+        if not self.boards:
+            return
+
+        stop_codes = list({board.stop_code for board in self.boards})
+        results = await asyncio.gather(*(self.arrivals.get(code) for code in stop_codes), return_exceptions=True)
+        snapshots = {code: result for code, result in zip(stop_codes, results) if not isinstance(result, Exception)}
+
+        boards = [board for board in self.boards if board.stop_code in snapshots]
+        keep = await asyncio.gather(*(self.update(board, snapshots[board.stop_code], now) for board in boards), return_exceptions=True)
+        finished = {id(board) for board, alive in zip(boards, keep) if alive is False}
+
+        # Boards whose stop failed this tick stay until they expire. Boards
+        # added while this tick was awaiting are left untouched.
+        self.boards = [
+            board for board in self.boards
+            if id(board) not in finished and (board.stop_code in snapshots or board.expires_at > now)
+        ]
+
+
+async def setup(bot):
+    await bot.add_cog(Board(bot))
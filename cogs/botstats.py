@@ -0,0 +1,76 @@
+import discord
+from discord.ext import commands
+import config
+import metrics
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class BotStats(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.lag_task = None
+        self.runner = None
+
+    async def cog_load(self):
+        self.lag_task = asyncio.create_task(metrics.monitor_loop_lag())
+        if config.METRICS_PORT:
+            try:
+                self.runner = await metrics.start_http_server(config.METRICS_HOST, config.METRICS_PORT)
+            except OSError as e:
+                logger.error(f"Metrics endpoint failed to start: {e}")
+
+    async def cog_unload(self):
+        if self.lag_task:
+            self.lag_task.cancel()
+        if self.runner:
+            await self.runner.cleanup()
+
+    @discord.app_commands.command(name="botstats", description="ბოტის წარმადობის სტატისტიკა (მხოლოდ მფლობელისთვის)")
+    async def botstats(self, interaction: discord.Interaction):
+        if not await self.bot.is_owner(interaction.user):
+            await interaction.response.send_message("⚠️ ეს ბრძანება მხოლოდ ბოტის მფლობელისთვისაა.", ephemeral=True)
+            return
+
+        embed = discord.Embed(title="📈 ბოტის სტატისტიკა", color=discord.Color.blue())
+        embed.add_field(name="ბრძანებები (p50 / p95)", value=self.format_histogram(metrics.command_latency), inline=False)
+        embed.add_field(name="Upstream (p50 / p95)", value=self.format_histogram(metrics.upstream_latency), inline=False)
+        embed.add_field(name="ქეში", value=self.format_cache(), inline=False)
+        router = getattr(self.bot, "llm_router", None)
+        if router and router.summary():
+            embed.add_field(name="AI მოდელები (p50 / შეცდომები)", value=self.format_models(router), inline=False)
+
+        lag = metrics.loop_lag
+        if lag.series:
+            embed.add_field(name="Event loop lag", value=f"p50 {lag.quantile((), 0.5) * 1000:.1f}ms · p99 {lag.quantile((), 0.99) * 1000:.1f}ms", inline=False)
+        embed.set_footer(text=f"Gateway latency: {self.bot.latency * 1000:.0f}ms")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    def format_histogram(self, histogram, limit=15):
+        rows = sorted(histogram.series, key=histogram.count, reverse=True)[:limit]
+        lines = [
+            f"`{' '.join(key)}` ×{histogram.count(key)}: {histogram.quantile(key, 0.5):.2f}s / {histogram.quantile(key, 0.95):.2f}s"
+            for key in rows
+        ]
+        return "\n".join(lines)[:1024] or "მონაცემები ჯერ არ არის"
+
+    def format_cache(self):
+        totals = {}
+        for (cache, result), count in metrics.cache_requests.values.items():
+            totals.setdefault(cache, {"hit": 0, "miss": 0})[result] += count
+        lines = [
+            f"`{cache}`: {counts['hit'] / (counts['hit'] + counts['miss']) * 100:.0f}% ({counts['hit']}/{counts['hit'] + counts['miss']})"
+            for cache, counts in sorted(totals.items())
+        ]
+        return "\n".join(lines)[:1024] or "მონაცემები ჯერ არ არის"
+
+    def format_models(self, router):
+        lines = [
+            f"`{request_class}` {model}: {p50 or 0:.1f}s / {error_rate * 100:.0f}% ×{samples}"
+            for request_class, model, p50, error_rate, samples in router.summary()
+        ]
+        return "\n".join(lines)[:1024]
+
+async def setup(bot):
+    await bot.add_cog(BotStats(bot))
@@ -1,112 +1,81 @@
 import discord
 from discord.ext import commands
-import requests
 import config
+from transit.client import TTCError
+from ui.paginator import Paginator, ResultSet
 
 class Bus(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.api_key = config.API_KEY
+        self.route_catalog = bot.route_catalog
 
     @discord.app_commands.command(name="bus", description="ავტობუსის გაჩერებები")
     @discord.app_commands.describe(bus_id="ავტობუსის ID")
     async def Bus(self, interaction: discord.Interaction, bus_id: str):
         await interaction.response.defer()
         try:
-            # ნაგულისხმევი patternSuffix to 1:01
-            pattern_suffix = "1:01"
-            stops_url = f"https://transit.ttc.com.ge/pis-gateway/api/v3/routes/{bus_id}/stops?patternSuffix={pattern_suffix}&locale=ka"
-            headers = {"X-Api-Key": self.api_key}
-            stops_response = requests.get(stops_url, headers=headers)
-            
-            if stops_response.status_code != 200:
-                await interaction.followup.send(f"შერჩეული მარშრუტისთვის გაჩერებების მიღება ვერ მოხერხდა. სტატუს კოდი: {stops_response.status_code}")
-                if config.DEBUG:
-                    print(f"Request URL: {stops_url}")
-                    print(f"Request Headers: {headers}")
-                    print(f"Response Status Code: {stops_response.status_code}")
-                    print(f"Response Content: {stops_response.content}")
-                return
-            
-            stops_data = stops_response.json()
+            patterns = await self.route_catalog.get_patterns(bus_id)
+            stops = await self.route_catalog.get_stops(bus_id, patterns[0])
 
-            if not stops_data:
+            if not stops:
                 await interaction.followup.send("შერჩეული მარშუტისთვის გაჩერებების მიღება ვერ მოხერხდა 😔")
                 return
 
-            stop_list = [f"🛑 {stop['code']} - {stop['name']}" for stop in stops_data]
-            pages = [stop_list[i:i+20] for i in range(0, len(stop_list), 20)]  # 20 stops per page
-
-            embed = self.create_embed(pages[0], 1, len(pages))
-            view = self.PaginationView(self, pages, 1, len(pages))
-            message = await interaction.followup.send(embed=embed, view=view)
+            view = self.RouteStopsView(self, stops, bus_id, patterns)
+            message = await interaction.followup.send(embed=view.embed(), view=view)
             view.message = message
 
+        except TTCError as e:
+            if config.DEBUG:
+                print(f"Request error: {e}")
+            await interaction.followup.send(f"შერჩეული მარშრუტისთვის გაჩერებების მიღება ვერ მოხერხდა. სტატუს კოდი: {e.status}")
         except Exception as e:
             if config.DEBUG:
                 print(f"Error: {e}")
-                print(f"Response content: {stops_response.content}")
             await interaction.followup.send("შეცდომა მოხდა 😔")
 
     @Bus.autocomplete("bus_id")
     async def bus_id_autocomplete(self, interaction: discord.Interaction, current: str):
-        url = "https://transit.ttc.com.ge/pis-gateway/api/v3/routes?modes=BUS&locale=ka"
-        headers = {"X-Api-Key": self.api_key}
-        response = requests.get(url, headers=headers)
-        data = response.json()
-
-        routes = [route for route in data if current.lower() in route['shortName'].lower() or current.lower() in route['longName'].lower()]
-        return [discord.app_commands.Choice(name=f"{route['shortName']} - {route['longName']}", value=route['id']) for route in routes[:25]]
-
-    def create_embed(self, item_list, current_page, total_pages):
-        embed = discord.Embed(title="ავტობუსების გაჩერებები 🚌", description="\n".join(item_list), color=discord.Color.blue())
+        if not self.route_catalog.loaded:
+            return []
+
+        routes = self.route_catalog.search(current)
+        return [discord.app_commands.Choice(name=f"{route['shortName']} - {route['longName']}", value=route['id']) for route in routes]
+
+    def create_embed(self, stops, current_page, total_pages):
+        embed = discord.Embed(
+            title="ავტობუსების გაჩერებები 🚌",
+            description="\n".join(f"🛑 {stop['code']} - {stop['name']}" for stop in stops),
+            color=discord.Color.blue()
+        )
         embed.set_footer(text=f"გვერდი {current_page} - {total_pages}-დან")
         return embed
 
-    class PaginationView(discord.ui.View):
-        def __init__(self, cog, pages, current_page, total_pages):
-            super().__init__(timeout=30)
+    class RouteStopsView(Paginator):
+        def __init__(self, cog, stops, bus_id, patterns):
+            super().__init__(ResultSet(stops), cog.create_embed, timeout=30)
             self.cog = cog
-            self.pages = pages
-            self.current_page = current_page
-            self.total_pages = total_pages
-            self.message = None
-
-            self.update_buttons()
+            self.bus_id = bus_id
+            self.patterns = patterns
+            self.pattern_index = 0
+            self.direction.disabled = len(patterns) < 2
 
-        def update_buttons(self):
-            self.children[0].disabled = self.current_page <= 1
-            self.children[1].disabled = self.current_page >= self.total_pages
-
-        @discord.ui.button(label="წინა", style=discord.ButtonStyle.primary)
-        async def previous(self, interaction: discord.Interaction, button: discord.ui.Button):
+        @discord.ui.button(label="მიმართულება", emoji="🔄", style=discord.ButtonStyle.secondary, row=1)
+        async def direction(self, interaction: discord.Interaction, button: discord.ui.Button):
             try:
-                if self.current_page > 1:
-                    self.current_page -= 1
-                    embed = self.cog.create_embed(self.pages[self.current_page - 1], self.current_page, self.total_pages)
-                    self.update_buttons()
-                    await interaction.response.edit_message(embed=embed, view=self)
+                pattern_index = (self.pattern_index + 1) % len(self.patterns)
+                stops = await self.cog.route_catalog.get_stops(self.bus_id, self.patterns[pattern_index])
+                if not stops:
+                    await interaction.response.send_message("ამ მიმართულებისთვის გაჩერებები ვერ მოიძებნა 🔍", ephemeral=True)
+                    return
+
+                self.pattern_index = pattern_index
+                self.base = ResultSet(stops)
             except Exception as e:
-                print(f"Error in previous button handler: {e}")
+                print(f"Error in direction button handler: {e}")
                 await interaction.response.send_message("შეცდომა მოხდა", ephemeral=True)
-
-        @discord.ui.button(label="შემდეგი", style=discord.ButtonStyle.primary)
-        async def next(self, interaction: discord.Interaction, button: discord.ui.Button):
-            try:
-                if self.current_page < self.total_pages:
-                    self.current_page += 1
-                    embed = self.cog.create_embed(self.pages[self.current_page - 1], self.current_page, self.total_pages)
-                    self.update_buttons()
-                    await interaction.response.edit_message(embed=embed, view=self)
-            except Exception as e:
-                print(f"Error in next button handler: {e}")
-                await interaction.response.send_message("შეცდომა მოხდა.", ephemeral=True)
-
-        async def on_timeout(self):
-            for child in self.children:
-                child.disabled = True
-            if self.message:
-                await self.message.edit(view=self)
+                return
+            await self.show(interaction, results=self.base, page=1)
 
 async def setup(bot):
     await bot.add_cog(Bus(bot))
\ No newline at end of file
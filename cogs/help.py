@@ -104,9 +104,9 @@ class Help(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.categories = {
-            "🚌 ტრანსპორტი": ["bus", "buses", "stops", "stop", "stopinfo"],
+            "🚌 ტრანსპორტი": ["bus", "buses", "stops", "nearby", "route", "stop", "stopinfo", "board"],
             "🤖 AI": ["ask", "history", "clear_history"],
-            "ℹ️ სისტემური": ["help", "ping", "uptime"],
+            "ℹ️ სისტემური": ["help", "ping", "uptime", "botstats", "sync"],
             "📊 სტატისტიკა": ["stats"]
         }
 
@@ -0,0 +1,100 @@
+import discord
+from discord.ext import commands
+import config
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Journey(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.journeys = bot.journeys
+        self.stop_catalog = bot.stop_catalog
+
+    @discord.app_commands.command(name="route", description="მარშრუტის დაგეგმვა ორ გაჩერებას შორის")
+    @discord.app_commands.rename(origin="from", destination="to")
+    @discord.app_commands.describe(
+        origin="საწყისი გაჩერების ნომერი ან სახელი",
+        destination="დანიშნულების გაჩერების ნომერი ან სახელი"
+    )
+    async def route(self, interaction: discord.Interaction, origin: str, destination: str):
+        await interaction.response.defer()
+        try:
+            if not self.journeys.loaded:
+                await interaction.followup.send("⏳ მარშრუტების ქსელი ჯერ მზადდება, სცადეთ რამდენიმე წუთში.")
+                return
+
+            await self.stop_catalog.ensure_loaded()
+            start, end = self.resolve_stop(origin), self.resolve_stop(destination)
+            if not start or not end:
+                await interaction.followup.send("გაჩერება ვერ მოიძებნა 🔍")
+                return
+            if start['code'] == end['code']:
+                await interaction.followup.send("საწყისი და დანიშნულების გაჩერება ერთი და იგივეა 🙂")
+                return
+
+            journeys = await self.journeys.plan(start['code'], end['code'])
+            if not journeys:
+                await interaction.followup.send(
+                    f"მარშრუტი ვერ მოიძებნა {config.JOURNEY_MAX_TRANSFERS} გადაჯდომით 😔"
+                )
+                return
+
+            await interaction.followup.send(embed=self.create_embed(start, end, journeys))
+
+        except discord.errors.NotFound:
+            if config.DEBUG:
+                print("Interaction not found or timed out.")
+        except Exception as e:
+            logger.error(f"Route planning error: {e}")
+            await interaction.followup.send("შეცდომა მოხდა 😔")
+
+    @route.autocomplete("origin")
+    @route.autocomplete("destination")
+    async def stop_autocomplete(self, interaction: discord.Interaction, current: str):
+        if not self.stop_catalog.loaded:
+            return []
+
+        stops = self.stop_catalog.search(current)
+        return [discord.app_commands.Choice(name=f"{stop['code']} - {stop['name']}"[:100], value=stop['code']) for stop in stops]
+
+    def resolve_stop(self, text):
+        stop = self.stop_catalog.find(text.strip())
+        if stop is None:
+            matches = self.stop_catalog.search(text, 1)
+            stop = matches[0] if matches else None
+        return stop
+
+    def create_embed(self, start, end, journeys):
+        embed = discord.Embed(
+            title="🗺️ მარშრუტი",
+            description=f"🛑 {start['code']} - {start['name']}\n⬇️\n🏁 {end['code']} - {end['name']}",
+            color=discord.Color.blue()
+        )
+        # Fastest first; each journey with more transfers is only listed because it is faster
+        options = list(reversed(journeys))[:config.JOURNEY_MAX_OPTIONS]
+        for number, journey in enumerate(options, 1):
+            transfers = "პირდაპირ" if journey.transfers == 0 else f"{journey.transfers} გადაჯდომა"
+            if not journey.rides:
+                transfers = "ფეხით"
+            embed.add_field(
+                name=f"ვარიანტი {number} · ~{self.minutes(journey.seconds)} წთ · {transfers}",
+                value="\n".join(self.format_leg(leg) for leg in journey.legs)[:1024],
+                inline=False
+            )
+        embed.set_footer(text="⏱️ დრო სავარაუდოა: გამოთვლილია მანძილით და საშუალო ლოდინით")
+        return embed
+
+    def format_leg(self, leg):
+        if leg.mode == 'walk':
+            return f"🚶 {leg.meters} მ (~{self.minutes(leg.seconds)} წთ) → 🛑 {leg.destination[0]} - {leg.destination[1]}"
+        return (
+            f"🚌 **__{leg.route}__** ({leg.headsign}) 🛑 {leg.origin[0]} → 🛑 {leg.destination[0]} - {leg.destination[1]}"
+            f" · {leg.stops} გაჩ. · ~{self.minutes(leg.seconds)} წთ"
+        )
+
+    def minutes(self, seconds):
+        return max(1, round(seconds / 60))
+
+async def setup(bot):
+    await bot.add_cog(Journey(bot))
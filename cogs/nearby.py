@@ -0,0 +1,113 @@
+import discord
+from discord.ext import commands
+import config
+import asyncio
+import logging
+from transit.geo import parse_coordinates, walking_minutes
+from ui.labels import updated_label
+
+logger = logging.getLogger(__name__)
+
+class Nearby(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.arrivals = bot.arrivals
+        self.stop_catalog = bot.stop_catalog
+
+    @discord.app_commands.command(name="nearby", description="ახლომდებარე გაჩერებები")
+    @discord.app_commands.describe(
+        location="კოორდინატები (41.7151, 44.8271), რუკის ბმული ან გაჩერების ნომერი/სახელი",
+        count="რამდენი გაჩერება აჩვენოს",
+        arrivals="დაემატოს თუ არა უახლოეს გაჩერებებზე ავტობუსების მოსვლის დრო"
+    )
+    async def nearby(
+        self,
+        interaction: discord.Interaction,
+        location: str,
+        count: discord.app_commands.Range[int, 1, 10] = config.NEARBY_DEFAULT_COUNT,
+        arrivals: bool = True
+    ):
+        await interaction.response.defer()
+        try:
+            await self.stop_catalog.ensure_loaded()
+            origin = self.resolve_location(location)
+            if origin is None:
+                await interaction.followup.send("ადგილმდებარეობა ვერ განისაზღვრა 🔍 მიუთითეთ კოორდინატები, რუკის ბმული ან გაჩერება.")
+                return
+
+            lat, lon, label = origin
+            results = self.stop_catalog.nearest(lat, lon, count)
+            if not results:
+                await interaction.followup.send(f"{config.NEARBY_MAX_DISTANCE} მეტრის რადიუსში გაჩერებები ვერ მოიძებნა 🔍")
+                return
+
+            snapshots = {}
+            if arrivals:
+                snapshots = await self.fetch_arrivals([stop['code'] for _, stop in results[:config.NEARBY_ARRIVAL_STOPS]])
+
+            await interaction.followup.send(embed=self.create_embed(label, results, snapshots))
+
+        except discord.errors.NotFound:
+            if config.DEBUG:
+                print("Interaction not found or timed out.")
+        except Exception as e:
+            logger.error(f"Nearby error: {e}")
+            await interaction.followup.send("შეცდომა მოხდა 😔")
+
+    @nearby.autocomplete("location")
+    async def location_autocomplete(self, interaction: discord.Interaction, current: str):
+        if not self.stop_catalog.loaded or not current or parse_coordinates(current):
+            return []
+
+        stops = self.stop_catalog.search(current)
+        return [discord.app_commands.Choice(name=f"{stop['code']} - {stop['name']}"[:100], value=stop['code']) for stop in stops]
+
+    def resolve_location(self, location):
+        """`(lat, lon, label)` for coordinates, a map link or a landmark stop."""
+        coordinates = parse_coordinates(location)
+        if coordinates:
+            lat, lon = coordinates
+            return lat, lon, f"{lat:.5f}, {lon:.5f}"
+
+        stop = self.stop_catalog.find(location.strip())
+        if stop is None:
+            matches = self.stop_catalog.search(location, 1)
+            stop = matches[0] if matches else None
+        if stop is None or stop.get('lat') is None or stop.get('lon') is None:
+            return None
+        return stop['lat'], stop['lon'], f"🛑 {stop['code']} - {stop['name']}"
+
+    async def fetch_arrivals(self, stop_codes):
+        """Arrival snapshots of several stops at once; stops that fail are left out."""
+        snapshots = await asyncio.gather(*(self.arrivals.get(code) for code in stop_codes), return_exceptions=True)
+        results = {}
+        for code, snapshot in zip(stop_codes, snapshots):
+            if isinstance(snapshot, Exception):
+                logger.warning(f"Arrivals for {code} failed: {snapshot}")
+            else:
+                results[code] = snapshot
+        return results
+
+    def create_embed(self, label, results, snapshots):
+        embed = discord.Embed(
+            title="📍 ახლომდებარე გაჩერებები",
+            description=f"საწყისი წერტილი: **{label}**",
+            color=discord.Color.blue()
+        )
+        stop_cog = self.bot.get_cog("Stop")
+        for distance, stop in results:
+            lines = [f"📏 {int(round(distance))} მ · 🚶 ~{max(1, round(walking_minutes(distance)))} წთ"]
+            snapshot = snapshots.get(stop['code'])
+            if snapshot is not None:
+                arrivals = sorted(snapshot.arrivals or [], key=lambda x: x.get('realtimeArrivalMinutes', 999))
+                lines.extend(stop_cog.format_arrival_time(arrival) for arrival in arrivals[:config.NEARBY_ARRIVALS_PER_STOP])
+                if not arrivals:
+                    lines.append("ავტობუსები ამჟამად არ დადიან")
+            embed.add_field(name=f"🛑 {stop['code']} - {stop['name']}"[:256], value="\n".join(lines)[:1024], inline=False)
+
+        if snapshots:
+            embed.set_footer(text=updated_label(snapshots.values()))
+        return embed
+
+async def setup(bot):
+    await bot.add_cog(Nearby(bot))
@@ -2,92 +2,195 @@ import os
 import discord
 from discord.ext import commands
 import config
+import metrics
 import aiohttp
+import asyncio
 import json
 import logging
+import time
+from typing import Optional
+from llm.cache import CompletionCache
+from llm.scheduler import BACKGROUND, STANDARD, RateLimited, parse_retry_after
+from transit.history import DAY
+from ui.labels import age_text
 
 logger = logging.getLogger('ai.cog')
 
+ANALYSIS_MODEL = "deepseek/deepseek-r1:free"
+FUN_FACT_MODEL = "google/gemini-2.0-flash-thinking-exp:free"
+
+BAR_WIDTH = 12
+
 class Stats(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.api_key = config.API_KEY
+        self.passenger_stats = bot.passenger_stats
+        self.llm_cache = CompletionCache(config.LLM_CACHE_TTL)
+        self.scheduler = bot.llm_scheduler
+        self.router = bot.llm_router
         self.session = None
+        self.last_requested = float('-inf')
+        self.last_precompute = float('-inf')
+        # kind -> (text, what it was generated from, generated_at) of the newest AI text
+        self.latest = {}
 
     async def cog_load(self):
-        self.session = aiohttp.ClientSession()
+        self.session = aiohttp.ClientSession(trace_configs=[metrics.trace_config()])
+        self.passenger_stats.listeners.append(self.precompute)
 
     async def cog_unload(self):
+        if self.precompute in self.passenger_stats.listeners:
+            self.passenger_stats.listeners.remove(self.precompute)
         if self.session:
             await self.session.close()
 
-    async def get_ai_analysis(self, stats_text: str) -> str:
+    async def complete(self, model: str, messages: list, priority=STANDARD, guild_id=None, user_id=None, on_position=None) -> str:
+        """Chat completion, answered from the cache when the prompt was seen before.
+
+        `model` is only the preferred one; the router may pick another
+        thinking model if it is faster or the preferred one is failing.
+        """
+        return await self.llm_cache.get_or_create("thinking", messages, lambda: self.scheduler.run(
+            lambda: self.router.run(
+                "thinking",
+                lambda candidate: self.request_completion(candidate, messages),
+                prefer=model,
+                try_hedge=None if priority == BACKGROUND else lambda: self.scheduler.try_acquire(guild_id)
+            ),
+            priority, guild_id, user_id, on_position
+        ), flight=priority == BACKGROUND)
+
+    async def request_completion(self, model: str, messages: list) -> str:
+        async with self.session.post(
+            url=f"{config.OPENROUTER_BASE_URL}/chat/completions",
+            headers={
+                "Authorization": f"Bearer {config.OPENROUTER_API_KEY}",
+                "HTTP-Referer": config.SITE_URL,
+                "X-Title": config.SITE_NAME,
+                "Content-Type": "application/json"
+            },
+            json={
+                "model": model,
+                "messages": messages
+            }
+        ) as response:
+            if response.status == 429:
+                raise RateLimited(parse_retry_after(response.headers))
+            if response.status != 200:
+                logger.error(f"Completion API error: {response.status}")
+                raise Exception(f"API Error {response.status}")
+
+            result = await response.json()
+            return result['choices'][0]['message']['content']
+
+    async def get_ai_analysis(self, stats_text: str, **schedule) -> str:
         try:
             prompt = f"""
             მოცემულია სატრანსპორტო მონაცემები. უშუალოდ, როგორც ანალიტიკოსმა, ქართულად წარმოადგინე 3 ძირითადი დასკვნა, რომლებიც გამომდინარეობს ამ მონაცემებიდან. არ გამოიყენო წინასიტყვაობა.
             {stats_text}
             """
 
-            async with self.session.post(
-                url=f"{config.OPENROUTER_BASE_URL}/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {config.OPENROUTER_API_KEY}",
-                    "HTTP-Referer": config.SITE_URL,
-                    "X-Title": config.SITE_NAME,
-                    "Content-Type": "application/json"
+            analysis = await self.complete(ANALYSIS_MODEL, [
+                {
+                    "role": "system",
+                    "content": "You are a transportation data analyst specializing in public transport statistics."
                 },
-                json={
-                    "model": "deepseek/deepseek-r1:free",
-                    "messages": [
-                        {
-                            "role": "system",
-                            "content": "You are a transportation data analyst specializing in public transport statistics."
-                        },
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ]
+                {
+                    "role": "user",
+                    "content": prompt
                 }
-            ) as response:
-                if response.status != 200:
-                    logger.error(f"Analysis API error: {response.status}")
-                    raise Exception(f"API Error {response.status}")
-                
-                result = await response.json()
-                return result['choices'][0]['message']['content']
+            ], **schedule)
+            self.latest["analysis"] = (analysis, stats_text, time.time())
+            return analysis
 
         except Exception as e:
             logger.error(f"Analysis error: {str(e)}")
             raise
+
+    async def get_fun_fact(self, total_passengers: int, **schedule) -> str:
+        prompt = f"გაგვიზიარე ერთი საინტერესო ფაქტი საზოგადოებრივ ტრანსპორტზე. გაითვალისწინე რომ დღეს {total_passengers:,} ადამიანმა გამოიყენა ტრანსპორტი. პასუხი უნდა იყოს მოკლე, საინტერესო და მგზავრებთან დაკავშირებული. არ გამოიყენო წინასიტყვაობა"
+        fun_fact = await self.complete(FUN_FACT_MODEL, [
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ], **schedule)
+        self.latest["fun_fact"] = (fun_fact, total_passengers, time.time())
+        return fun_fact
+
+    def latest_text(self, kind):
+        """Newest `(text, source, generated_at)` of a kind, None if there is none younger than STATS_AI_MAX_AGE.
+
+        The totals in the prompts change on every refresh, so the commands
+        answer with the last generated text instead of a new completion.
+        """
+        entry = self.latest.get(kind)
+        if entry is None or time.time() - entry[2] > config.STATS_AI_MAX_AGE:
+            return None
+        return entry
+
+    def format_analysis_stats(self, stats_data):
+        total_passengers = sum(count for count in stats_data.values())
+        top_transport = sorted(stats_data.items(), key=lambda x: x[1], reverse=True)[:3]
+        return (
+            f"მგზავრების რაოდენობა: **{total_passengers}**\n"
+            f"Top 3 ტრანსპორტები:\n" +
+            "\n".join(f"- {mode}: **__{count}__**" for mode, count in top_transport)
+        )
+
+    async def precompute(self, stats_data):
+        """Generate the AI text for a new snapshot before anyone asks for it.
+
+        The totals change on nearly every refresh, so this runs at most every
+        STATS_PRECOMPUTE_INTERVAL and only while people are using the commands;
+        they serve the newest text in between.
+        """
+        now = time.monotonic()
+        if now - self.last_requested > config.STATS_PRECOMPUTE_IDLE or now - self.last_precompute < config.STATS_PRECOMPUTE_INTERVAL:
+            return
+        self.last_precompute = now
+        results = await asyncio.gather(
+            self.get_ai_analysis(self.format_analysis_stats(stats_data), priority=BACKGROUND),
+            self.get_fun_fact(sum(stats_data.values()), priority=BACKGROUND),
+            return_exceptions=True
+        )
+        failed = [result for result in results if isinstance(result, Exception)]
+        if failed:
+            logger.warning(f"Stats precompute failed: {failed[0]}")
+        else:
+            logger.info("Stats AI text precomputed")
         
     @discord.app_commands.command(
         name="analyze",
         description="ტრანსპორტის ანალიტიკა"
     )
     async def analyze_transport(self, interaction: discord.Interaction):
+        self.last_requested = time.monotonic()
         await interaction.response.defer()
     
         try:
             logger.info(f"Starting analysis: {interaction.user.id}")
-            async with self.session.get(
-                'https://ttc.com.ge/api/passengers',
-                headers={'X-Api-Key': self.api_key}
-            ) as response:
-                if response.status != 200:
-                    raise Exception(f"API Error {response.status}")
-                data = await response.json()
-                stats_data = data['transactionsByTransportTypes']
-            
-            total_passengers = sum(count for count in stats_data.values())
-            top_transport = sorted(stats_data.items(), key=lambda x: x[1], reverse=True)[:3]
-            stats_text = (
-                f"მგზავრების რაოდენობა: **{total_passengers}**\n"
-                f"Top 3 ტრანსპორტები:\n" +
-                "\n".join(f"- {mode}: **__{count}__**" for mode, count in top_transport)
-            )
-        
-            analysis = await self.get_ai_analysis(stats_text)
+            queued = answered = False
+            # A position edit still in flight must not land on top of the answer
+            edit_lock = asyncio.Lock()
+
+            async def show_position(position):
+                nonlocal queued
+                async with edit_lock:
+                    if answered:
+                        return
+                    queued = True
+                    await interaction.edit_original_response(content=f"⏳ რიგში ხართ: #{position}")
+
+            latest = self.latest_text("analysis")
+            if latest is not None:
+                analysis, stats_text, generated_at = latest
+            else:
+                stats_text = self.format_analysis_stats(await self.passenger_stats.get())
+                analysis = await self.get_ai_analysis(
+                    stats_text, guild_id=interaction.guild_id, user_id=interaction.user.id, on_position=show_position
+                )
+                generated_at = time.time()
             logger.info(f"Analysis complete: {interaction.user.id}")
             
             embed = discord.Embed(
@@ -100,9 +203,14 @@ class Stats(commands.Cog):
                 value=stats_text,
                 inline=False
             )
-            embed.set_footer(text="⚠️ ანალიზი შექმნილია ხელოვნური ინტელექტის გამოყენებით")
+            embed.set_footer(text=f"⚠️ ანალიზი შექმნილია ხელოვნური ინტელექტის გამოყენებით · 🕒 {age_text(time.time() - generated_at)} წინ")
             
-            await interaction.followup.send(embed=embed)
+            async with edit_lock:
+                answered = True
+                if queued:
+                    await interaction.edit_original_response(content=None, embed=embed)
+                else:
+                    await interaction.followup.send(embed=embed)
             
         except Exception as e:
             logger.error(f"Analysis command error: {str(e)}")
@@ -112,25 +220,31 @@ class Stats(commands.Cog):
         name="stats",
         description="მგზავრების სტატისტიკა"
     )
-    async def stats(self, interaction: discord.Interaction):
+    @discord.app_commands.describe(view="რა ვაჩვენოთ", mode="ტრანსპორტის ტიპი ტრენდისთვის")
+    @discord.app_commands.choices(view=[
+        discord.app_commands.Choice(name="მიმდინარე", value="now"),
+        discord.app_commands.Choice(name="გუშინდელთან შედარება", value="day"),
+        discord.app_commands.Choice(name="კვირის ტრენდი", value="week"),
+        discord.app_commands.Choice(name="ტრანსპორტის ტიპის ტრენდი", value="mode")
+    ])
+    async def stats(self, interaction: discord.Interaction, view: Optional[str] = "now", mode: Optional[str] = None):
+        if view and view != "now":
+            await self.send_trend(interaction, view, mode)
+            return
+
+        self.last_requested = time.monotonic()
         await interaction.response.defer()
         
         try:
             logger.info(f"Getting stats: {interaction.user.id}")
-            async with self.session.get(
-                'https://ttc.com.ge/api/passengers',
-                headers={'X-Api-Key': self.api_key}
-            ) as response:
-                if response.status != 200:
-                    raise Exception(f"API Error {response.status}")
-                data = await response.json()
-
-            if not data or 'transactionsByTransportTypes' not in data:
+            stats_data = await self.passenger_stats.get()
+
+            if not stats_data:
                 await interaction.followup.send("სტატისტიკის მიღება ვერ მოხდა 😔")
                 return
 
-            stats, total_passengers = self.format_stats(data['transactionsByTransportTypes'])
-            embed = await self.create_stats_embed(stats, total_passengers)
+            stats, total_passengers = self.format_stats(stats_data)
+            embed = await self.create_stats_embed(stats, total_passengers, interaction)
             await interaction.followup.send(embed=embed)
             logger.info(f"Stats sent: {interaction.user.id}")
 
@@ -138,6 +252,129 @@ class Stats(commands.Cog):
             logger.error(f"Stats command error: {str(e)}")
             await interaction.followup.send("შეცდომა მოხდა 😔")
 
+    @stats.autocomplete("mode")
+    async def mode_autocomplete(self, interaction: discord.Interaction, current: str):
+        history = self.passenger_stats.history
+        modes = history.modes if history is not None else list(self.passenger_stats.stats)
+        return [discord.app_commands.Choice(name=m, value=m) for m in modes if current.lower() in m.lower()][:25]
+
+    async def send_trend(self, interaction, view, mode=None):
+        """Trend views are answered from the local history only."""
+        history = self.passenger_stats.history
+        embed = None
+        if history is not None and history.latest():
+            if view == "day":
+                embed = self.day_over_day_embed(history)
+            elif view == "week":
+                embed = self.weekly_embed(history)
+            elif view == "mode":
+                embed = self.mode_embed(history, mode)
+
+        if embed is None:
+            await interaction.response.send_message("ტრენდისთვის საკმარისი ისტორია ჯერ არ არის 😔", ephemeral=True)
+            return
+        embed.set_author(name="Tbilisi Transport Company", icon_url=self.bot.user.avatar.url)
+        await interaction.response.send_message(embed=embed)
+
+    def format_date(self, ts, history):
+        return time.strftime("%m-%d", time.gmtime(ts + history.utc_offset))
+
+    def format_change(self, current, previous):
+        if not previous:
+            return "—"
+        change = (current - previous) / previous * 100
+        return f"{'📈' if change >= 0 else '📉'} {change:+.1f}%"
+
+    def format_bars(self, rows):
+        """Monospace bar chart of `(label, value)` rows."""
+        peak = max((value for _, value in rows), default=0) or 1
+        lines = [f"{label} {'█' * round(value / peak * BAR_WIDTH):<{BAR_WIDTH}} {value:,}" for label, value in rows]
+        return "```\n" + "\n".join(lines) + "\n```"
+
+    def day_over_day_embed(self, history):
+        now, today = history.latest()
+        previous = history.same_time(now)
+        if previous is None:
+            return None
+        _, yesterday = previous
+
+        lines = [
+            f"🔸 {transport}: {count:,} ({self.format_change(count, yesterday.get(transport, 0))})"
+            for transport, count in sorted(today.items(), key=lambda x: x[1], reverse=True)
+            if count or yesterday.get(transport)
+        ]
+        total, yesterday_total = sum(today.values()), sum(yesterday.values())
+        embed = discord.Embed(
+            title="📊 დღეს vs გუშინ ამავე დროს",
+            description="\n".join(lines),
+            color=discord.Color.blue()
+        )
+        embed.add_field(name="სულ", value=f"{total:,} ({self.format_change(total, yesterday_total)})", inline=False)
+        full_day = history.days(1, before=history.bucket(now, DAY))
+        if full_day:
+            embed.set_footer(text=f"👥 გუშინ სულ: {sum(full_day[0][1].values()):,}")
+        return embed
+
+    def weekly_embed(self, history):
+        now, _ = history.latest()
+        days = history.days(14, before=history.bucket(now, DAY))
+        if not days:
+            return None
+        this_week, last_week = days[-7:], days[:-7]
+
+        totals = [(self.format_date(ts, history), sum(counts.values())) for ts, counts in this_week]
+        this_total = sum(value for _, value in totals)
+        last_total = sum(sum(counts.values()) for _, counts in last_week)
+        embed = discord.Embed(
+            title="📊 ბოლო 7 დღე",
+            description=self.format_bars(totals),
+            color=discord.Color.blue()
+        )
+        embed.add_field(
+            name="სულ",
+            value=f"{this_total:,} ({self.format_change(this_total, last_total) if len(last_week) == 7 else '—'})",
+            inline=False
+        )
+        if len(last_week) == 7:
+            modes = sorted({mode for _, counts in days for mode in counts})
+            lines = []
+            for transport in modes:
+                current = sum(counts.get(transport, 0) for _, counts in this_week)
+                previous = sum(counts.get(transport, 0) for _, counts in last_week)
+                if current or previous:
+                    lines.append(f"🔸 {transport}: {current:,} ({self.format_change(current, previous)})")
+            embed.add_field(name="წინა კვირასთან", value="\n".join(lines)[:1024] or "—", inline=False)
+        embed.set_footer(text=f"📅 დღიური ჯამები, {len(this_week)} დღე")
+        return embed
+
+    def mode_embed(self, history, mode=None):
+        now, today = history.latest()
+        if not mode:
+            mode = max(today, key=today.get)
+        if mode not in history.daily.columns:
+            return None
+        days = history.days(14, before=history.bucket(now, DAY))
+        rows = [(self.format_date(ts, history), counts.get(mode, 0)) for ts, counts in days]
+        if not rows:
+            return None
+
+        average = sum(value for _, value in rows) / len(rows)
+        embed = discord.Embed(
+            title=f"📊 {mode} — ბოლო {len(rows)} დღე",
+            description=self.format_bars(rows),
+            color=discord.Color.blue()
+        )
+        embed.add_field(name="საშუალო დღეში", value=f"{average:,.0f}", inline=True)
+        embed.add_field(name="დღეს ამ დრომდე", value=f"{today.get(mode, 0):,}", inline=True)
+        previous = history.same_time(now, days_back=7)
+        if previous is not None:
+            embed.add_field(
+                name="წინა კვირასთან",
+                value=self.format_change(today.get(mode, 0), previous[1].get(mode, 0)),
+                inline=True
+            )
+        return embed
+
     def format_stats(self, stats):
         total = sum(stats.values())
         sorted_stats = sorted(stats.items(), key=lambda x: x[1], reverse=True)
@@ -150,7 +387,7 @@ class Stats(commands.Cog):
         
         return "\n".join(response), total
 
-    async def create_stats_embed(self, stats, total_passengers):
+    async def create_stats_embed(self, stats, total_passengers, interaction=None):
         embed = discord.Embed(
             title="📊 მგზავრების სტატისტიკა",
             description=stats,
@@ -160,30 +397,16 @@ class Stats(commands.Cog):
         embed.set_author(name="Tbilisi Transport Company", icon_url=self.bot.user.avatar.url)
         
         try:
-            prompt = f"გაგვიზიარე ერთი საინტერესო ფაქტი საზოგადოებრივ ტრანსპორტზე. გაითვალისწინე რომ დღეს {total_passengers:,} ადამიანმა გამოიყენა ტრანსპორტი. პასუხი უნდა იყოს მოკლე, საინტერესო და მგზავრებთან დაკავშირებული. არ გამოიყენო წინასიტყვაობა"
-            
-            async with self.session.post(
-                url=f"{config.OPENROUTER_BASE_URL}/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {config.OPENROUTER_API_KEY}",
-                    "HTTP-Referer": config.SITE_URL,
-                    "X-Title": config.SITE_NAME,
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": "google/gemini-2.0-flash-thinking-exp:free",
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ]
-                }
-            ) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    fun_fact = result['choices'][0]['message']['content']
-                    embed.add_field(name="⭐ Fun Fact", value=fun_fact, inline=False)
+            latest = self.latest_text("fun_fact")
+            if latest is not None:
+                fun_fact = latest[0]
+            else:
+                fun_fact = await self.get_fun_fact(
+                    total_passengers,
+                    guild_id=interaction.guild_id if interaction else None,
+                    user_id=interaction.user.id if interaction else None
+                )
+            embed.add_field(name="⭐ Fun Fact", value=fun_fact, inline=False)
         except Exception as e:
             if config.DEBUG:
                 print(f"Error generating fun fact: {e}")
@@ -0,0 +1,132 @@
+import discord
+from discord.ext import commands
+from discord import app_commands
+import config
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from typing import Literal
+
+logger = logging.getLogger(__name__)
+
+GLOBAL = "global"
+
+
+def command_payload(tree, command):
+    try:
+        # discord.py 2.4+ takes the tree, for translations
+        return command.to_dict(tree)
+    except TypeError:
+        return command.to_dict()
+
+
+def tree_hash(tree, guild=None):
+    """Stable hash of what `tree.sync(guild=guild)` would upload."""
+    payload = sorted(
+        (command_payload(tree, command) for command in tree.get_commands(guild=guild)),
+        key=lambda command: (command.get('type', 1), command['name'])
+    )
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class CommandSync(commands.Cog):
+    """Syncs the app-command tree only when it differs from the last sync.
+
+    `on_ready` fires again after every reconnect and Discord rate limits
+    syncs hard, so the hash of each synced scope (the global tree and
+    every guild in COMMAND_SYNC_GUILDS) is kept in COMMAND_SYNC_PATH,
+    per application. /sync forces a sync after changes made outside
+    the bot, e.g. commands deleted in the developer portal.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.path = config.COMMAND_SYNC_PATH
+        self.state = {}
+        self.lock = asyncio.Lock()
+
+    async def cog_load(self):
+        if self.path:
+            self.state = await asyncio.to_thread(self.read_state)
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # Every cluster registers the same tree, one of them syncing is enough
+        if config.CLUSTER_ID not in (None, '0'):
+            return
+        scopes = [(GLOBAL, None)] + [(str(guild), discord.Object(id=guild)) for guild in config.COMMAND_SYNC_GUILDS]
+        try:
+            results = await self.sync_commands(scopes)
+        except Exception as e:
+            logger.error(f"Sync failed: {e}")
+            return
+        for scope, count in results:
+            if count is None:
+                logger.info(f"Commands unchanged ({scope}), sync skipped")
+            else:
+                logger.info(f"Synced {count} commands ({scope})")
+
+    @app_commands.command(name="sync", description="ბრძანებების სინქრონიზაცია Discord-თან (მხოლოდ მფლობელისთვის)")
+    @app_commands.describe(scope="global - ყველა სერვერი, guild - მხოლოდ ეს სერვერი")
+    async def force_sync(self, interaction: discord.Interaction, scope: Literal["global", "guild"] = "global"):
+        if not await self.bot.is_owner(interaction.user):
+            await interaction.response.send_message("⚠️ ეს ბრძანება მხოლოდ ბოტის მფლობელისთვისაა.", ephemeral=True)
+            return
+        if scope == "guild" and interaction.guild is None:
+            await interaction.response.send_message("⚠️ ეს მხოლოდ სერვერზე მუშაობს.", ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True)
+        if scope == "guild":
+            scopes = [(str(interaction.guild.id), interaction.guild)]
+        else:
+            scopes = [(GLOBAL, None)]
+        try:
+            (_, count), = await self.sync_commands(scopes, force=True)
+        except discord.HTTPException as e:
+            logger.error(f"Forced sync failed: {e}")
+            await interaction.followup.send(f"⚠️ სინქრონიზაცია ვერ მოხერხდა: {e}", ephemeral=True)
+            return
+        await interaction.followup.send(f"✅ სინქრონიზებულია {count} ბრძანება ({scope})", ephemeral=True)
+
+    async def sync_commands(self, scopes, force=False):
+        """Sync each `(scope, guild)` whose tree changed; `(scope, commands synced)` pairs, None when skipped."""
+        async with self.lock:
+            synced = self.state.setdefault(str(self.bot.application_id), {})
+            results = []
+            for scope, guild in scopes:
+                digest = tree_hash(self.bot.tree, guild)
+                if not force and synced.get(scope) == digest:
+                    results.append((scope, None))
+                    continue
+                commands = await self.bot.tree.sync(guild=guild)
+                synced[scope] = digest
+                results.append((scope, len(commands)))
+                if self.path:
+                    await asyncio.to_thread(self.write_state, json.dumps(self.state, indent=2, sort_keys=True))
+            return results
+
+    def read_state(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable command sync state {self.path}: {e}")
+            return {}
+
+    def write_state(self, data):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp = f"{self.path}.tmp"
+        with open(temp, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(temp, self.path)
+
+async def setup(bot):
+    await bot.add_cog(CommandSync(bot))
@@ -62,14 +62,149 @@ OPENROUTER_API_KEY = os.getenv('OPENROUTER_API_KEY')
 LANG = 'ka'
 DEBUG = True
 
+# TTC Gateway Configuration
+TTC_BASE_URL = "https://transit.ttc.com.ge/pis-gateway/api"
+TTC_TIMEOUT = 10  # Total request timeout (in seconds)
+TTC_CONNECT_TIMEOUT = 5
+TTC_RETRIES = 2
+TTC_RETRY_BACKOFF = 0.5  # Base backoff, doubled per retry with full jitter
+TTC_MAX_CONNECTIONS = 50
+TTC_MAX_CONNECTIONS_PER_HOST = 20
+TTC_BREAKER_FAILURES = 5  # Failed attempts in a row that open an endpoint's circuit
+TTC_BREAKER_COOLDOWN = 10  # Seconds before an open circuit is first probed
+TTC_BREAKER_MAX_COOLDOWN = 2 * 60  # Failed probes double the wait up to this
+TTC_PROBE_TIMEOUT = 5
+
+PASSENGERS_URL = "https://ttc.com.ge/api/passengers"
+
+# Transit Catalogs (in seconds)
+STOP_CATALOG_REFRESH = 60 * 60
+ROUTE_CATALOG_REFRESH = 6 * 60 * 60
+CATALOG_RETRY_INTERVAL = 30  # Delay after a failed refresh, doubled per failure in a row up to the refresh interval
+ROUTE_STOPS_TTL = 24 * 60 * 60  # Revalidated with ETag/If-Modified-Since once expired
+DEFAULT_PATTERN_SUFFIX = "1:01"
+ROUTE_PATTERNS_RETRY = 60  # A route whose directions failed to load gets only the default one for this long
+SNAPSHOT_PATH = os.getenv('SNAPSHOT_PATH', 'data/transit.sqlite')  # Empty disables the on-disk snapshot
+
+# Arrival Times (in seconds)
+ARRIVALS_CACHE_TTL = 10  # Micro-cache window shared by everyone asking for a stop
+STOP_DETAIL_TTL = 60 * 60
+ARRIVALS_REVALIDATE_WAIT = 2  # Wait this long for fresh arrivals before falling back to the last good ones
+ARRIVALS_STALE_TTL = 15 * 60  # How long the last good arrivals may stand in while the gateway is down
+STOP_DETAIL_STALE_TTL = 24 * 60 * 60
+
+# Nearby Stops
+NEARBY_GRID_CELL = 250  # Meters per spatial index cell
+NEARBY_MAX_DISTANCE = 2000  # Meters, stops further away are not offered
+NEARBY_DEFAULT_COUNT = 5
+NEARBY_ARRIVAL_STOPS = 3  # Closest stops that get live arrivals attached
+NEARBY_ARRIVALS_PER_STOP = 3
+WALKING_SPEED = 1.3  # Meters per second
+WALKING_DETOUR = 1.3  # Street distance per straight-line meter
+
+# Journey Planner
+JOURNEY_GRAPH_REFRESH = 24 * 60 * 60  # Seconds between graph rebuilds, route stops revalidate with ETags
+JOURNEY_BUILD_CONCURRENCY = 4  # Routes fetched at once while building
+JOURNEY_MAX_FAILED = 0.02  # Share of routes or patterns that may fail to load before a build is abandoned
+JOURNEY_MAX_TRANSFERS = 2
+JOURNEY_WALK_RADIUS = 400  # Meters between stops that count as a walking transfer
+JOURNEY_BUS_SPEED = 5.0  # Meters per second between stops, about 18 km/h
+JOURNEY_DWELL = 20  # Seconds per stop
+JOURNEY_DEFAULT_HOP = 90  # Seconds between stops without coordinates
+JOURNEY_WAIT = 5 * 60  # Average wait per boarding, there are no timetables to do better
+JOURNEY_TRANSFER_PENALTY = 2 * 60  # Extra cost per transfer so close calls prefer fewer changes
+JOURNEY_MAX_OPTIONS = 3
+
+# Passenger Statistics (in seconds)
+PASSENGER_STATS_REFRESH = 5 * 60
+LLM_CACHE_TTL = 12 * 60 * 60  # Keys include the stats snapshot, so new data never hits an old entry
+STATS_PRECOMPUTE_INTERVAL = 30 * 60  # At most one background AI precompute per this many seconds
+STATS_PRECOMPUTE_IDLE = 60 * 60  # Precompute only while /stats or /analyze was used this recently
+STATS_AI_MAX_AGE = 3 * 60 * 60  # /stats and /analyze serve the newest AI text until it is this old
+PASSENGER_HISTORY_PATH = os.getenv('PASSENGER_HISTORY_PATH', 'data/passengers.sqlite')  # Empty keeps history in memory only
+PASSENGER_RAW_RETENTION = 8 * 24 * 60 * 60  # Enough for same-time-last-week comparisons
+PASSENGER_HOURLY_RETENTION = 90 * 24 * 60 * 60  # Daily rollups are kept forever
+STATS_UTC_OFFSET = 4 * 60 * 60  # Tbilisi, no DST; day boundaries for the rollups
+
+# Metrics
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = int(os.getenv('METRICS_PORT', 9108))  # 0 disables the /metrics endpoint
+
+# Command Sync
+COMMAND_SYNC_PATH = os.getenv('COMMAND_SYNC_PATH', 'data/command_sync.json')  # Empty syncs the command tree on every start
+COMMAND_SYNC_GUILDS = [int(guild) for guild in os.getenv('COMMAND_SYNC_GUILDS', '').split(',') if guild.strip()]  # Guilds with guild-only commands
+
+# Sharding
+# launcher.py sets these for each cluster process it starts
+SHARDED = os.getenv('SHARDED', '').lower() in ('1', 'true', 'yes') or bool(os.getenv('SHARD_IDS'))
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', 0)) or None  # None uses Discord's recommended count
+SHARD_IDS = [int(shard) for shard in os.getenv('SHARD_IDS', '').split(',') if shard.strip()] or None  # None runs every shard
+CLUSTER_ID = os.getenv('CLUSTER_ID')
+IDENTIFY_CONCURRENCY = int(os.getenv('IDENTIFY_CONCURRENCY', 1))  # Discord's max_concurrency for the bot
+IDENTIFY_INTERVAL = 5  # Seconds between identifies in one concurrency bucket
+IDENTIFY_TIMEOUT = 60 * 60
+CLUSTERS = int(os.getenv('CLUSTERS', 0)) or None  # Processes launcher.py starts, None is one per CPU core
+CLUSTER_RESTART_DELAY = 5  # Seconds before a crashed cluster is started again, doubled per crash in a row
+
+# Shared Cache
+# unix:/path or tcp://127.0.0.1:port (loopback only) served by launcher.py, "memory" for an
+# in-process stand-in; empty keeps every cache per process
+SHARED_CACHE_URL = os.getenv('SHARED_CACHE_URL', '')
+SHARED_CACHE_TOKEN = os.getenv('SHARED_CACHE_TOKEN', '')  # Clients must present it; launcher.py makes one up if empty
+SHARED_CACHE_SOCKET = 'data/shared-cache.sock'  # Where launcher.py serves it unless SHARED_CACHE_URL is set
+SHARED_CACHE_TIMEOUT = 2  # Seconds per request before falling back to a local fetch
+SHARED_FETCH_WAIT = 15  # How long to wait on another process fetching the same key
+SHARED_CATALOG_WAIT = 5 * 60  # Same for catalog refreshes, the journey graph takes a while
+
+# Live Departure Boards
+BOARD_POLL_INTERVAL = 30  # Seconds between polls, each watched stop is fetched once per poll
+BOARD_DEFAULT_MINUTES = 10
+BOARD_MAX_MINUTES = 14  # Followups are edited with the interaction token, valid for 15 minutes; the final edit lands up to a poll late
+BOARD_MAX_ACTIVE = 200
+BOARD_CHANNEL_EDIT_LIMIT = 4  # Edits allowed per channel per window
+BOARD_CHANNEL_EDIT_WINDOW = 5  # Seconds
+
 # OpenRouter Configuration
 OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
 SITE_URL = "https://github.com/xenyc1337/DiscordTTCBOT"
 SITE_NAME = "TTC Discord Bot"
 
+# OpenRouter Scheduler
+LLM_MAX_CONCURRENCY = 4  # Requests in flight across the whole bot
+LLM_MAX_PER_GUILD = 2
+LLM_MAX_ATTEMPTS = 3  # Including retries after a 429
+LLM_RETRY_BACKOFF = 2.0  # Base backoff when a 429 has no Retry-After, doubled per retry with full jitter
+LLM_MAX_RETRY_AFTER = 60
+LLM_QUEUE_NOTIFY_INTERVAL = 2.0  # Seconds between queue position updates to a waiting user
+
 # API Timeouts (in seconds)
 REQUEST_TIMEOUT = 60  # Increased timeout for image processing
 
+# Streaming /ask Replies
+AI_STREAMING = True
+AI_STREAM_EDIT_INTERVAL = 1.0  # Seconds between message edits while tokens arrive
+
+# /ask Images
+IMAGE_MAX_DIMENSION = 1024  # Longest side sent to the model
+IMAGE_QUALITY = 80
+IMAGE_WORKERS = 2  # Threads for decoding and re-encoding
+IMAGE_CACHE_SIZE = 128
+IMAGE_CACHE_TTL = 24 * 60 * 60  # Matches AI_HISTORY_IDLE_TTL so follow-ups can still see the image
+
+# /ask Tools
+AI_TOOLS = True  # Let the model look up stops, arrivals, routes and passenger stats itself
+AI_TOOL_ROUNDS = 3  # Model turns that may call tools before it has to answer
+AI_TOOL_TIMEOUT = 10  # Seconds per tool call
+AI_TOOL_MAX_RESULTS = 10  # Stops or arrivals returned by one call
+
+# AI Conversation History
+AI_HISTORY_MESSAGES = 10  # Per user
+AI_HISTORY_MAX_USERS = 5000  # Held in memory, least recently used beyond this stay on disk only
+AI_HISTORY_MAX_BYTES = 16 * 1024 * 1024
+AI_HISTORY_IDLE_TTL = 24 * 60 * 60  # Conversations idle this long are forgotten
+AI_HISTORY_PATH = os.getenv('AI_HISTORY_PATH', 'data/conversations.sqlite')  # Empty keeps histories in memory only
+AI_HISTORY_FLUSH_INTERVAL = 10  # Seconds between write-behind batches
+
 # Default Model
 DEFAULT_MODEL = "google/gemini-2.0-flash-exp:free"
 
@@ -83,4 +218,20 @@ BASIC_MODELS = {
 THINKING_MODELS = {
     "deepseek/deepseek-r1:free": "Advanced reasoning and analysis",
     "google/gemini-2.0-flash-thinking-exp:free": "Quick analytical responses"
-}
\ No newline at end of file
+}
+
+# Model Routing
+# Candidate models per request class, in order of preference until latency data exists
+MODEL_CLASSES = {
+    "chat": list(BASIC_MODELS),
+    "vision": ["google/gemini-2.0-flash-exp:free", "google/gemini-2.0-pro-exp-02-05:free"],
+    "thinking": list(THINKING_MODELS)
+}
+LLM_ROUTER_WINDOW = 50  # Recent requests per model used for latency and error rates
+LLM_ROUTER_MIN_SAMPLES = 5
+LLM_ROUTER_MAX_ERROR_RATE = 0.5  # Models failing more often than this are only used as a last resort
+LLM_ROUTER_COOLDOWN = 30  # Seconds a model is skipped after a 429 without Retry-After
+LLM_ROUTER_EXPLORE = 0.05  # Share of requests sent to the runner-up to keep its numbers fresh
+LLM_HEDGING = True
+LLM_HEDGE_MIN_DELAY = 2.0  # Backup request after max(this, primary p95), only when a scheduler slot is free
+LLM_HEDGE_DEFAULT_DELAY = 10.0  # Before the primary has enough samples
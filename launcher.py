@@ -0,0 +1,137 @@
+"""Run the bot as several processes ("clusters"), each owning a slice of the shards.
+
+The launcher serves the shared cache every cluster uses for catalogs,
+arrivals and taking turns at identifying, then starts one `bot.py` per
+cluster and restarts any that die.
+
+Usage:
+    python launcher.py                         # one cluster per core, Discord's recommended shard count
+    python launcher.py --clusters 2 --shards 8
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import sys
+
+import aiohttp
+
+import config
+from transit.shared import SharedCacheServer
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - launcher: %(message)s', datefmt='%H:%M:%S')
+logger = logging.getLogger('launcher')
+
+DISCORD_API = "https://discord.com/api/v10"
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot.py")
+
+
+async def recommended_shards(token):
+    """`(shard_count, max_concurrency)` Discord recommends for the bot."""
+    async with aiohttp.ClientSession(headers={"Authorization": f"Bot {token}"}) as session:
+        async with session.get(f"{DISCORD_API}/gateway/bot") as response:
+            response.raise_for_status()
+            data = await response.json()
+    return data["shards"], data.get("session_start_limit", {}).get("max_concurrency", 1)
+
+
+def split_shards(shard_count, clusters):
+    """Contiguous shard id ranges, as even as possible, one per cluster."""
+    clusters = max(1, min(clusters, shard_count))
+    size, extra = divmod(shard_count, clusters)
+    ranges, start = [], 0
+    for cluster in range(clusters):
+        end = start + size + (1 if cluster < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+class Cluster:
+    def __init__(self, cluster_id, shard_ids, env):
+        self.cluster_id = cluster_id
+        self.shard_ids = shard_ids
+        self.env = env
+        self.process = None
+
+    async def run(self, stopping):
+        """Keep the cluster's process running until `stopping` is set."""
+        delay = config.CLUSTER_RESTART_DELAY
+        while not stopping.is_set():
+            logger.info(f"Starting cluster {self.cluster_id} (shards {self.shard_ids[0]}-{self.shard_ids[-1]})")
+            self.process = await asyncio.create_subprocess_exec(sys.executable, BOT_SCRIPT, env=self.env)
+            started = asyncio.get_running_loop().time()
+            code = await self.process.wait()
+            if stopping.is_set():
+                break
+            # Only back off for crash loops, not for a cluster that ran for a while
+            if asyncio.get_running_loop().time() - started > 10 * delay:
+                delay = config.CLUSTER_RESTART_DELAY
+            logger.error(f"Cluster {self.cluster_id} exited with {code}, restarting in {delay}s")
+            try:
+                await asyncio.wait_for(stopping.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            delay = min(delay * 2, 60 * config.CLUSTER_RESTART_DELAY)
+
+    def terminate(self):
+        if self.process is not None and self.process.returncode is None:
+            self.process.terminate()
+
+
+async def main(args):
+    shard_count, concurrency = args.shards or config.SHARD_COUNT, config.IDENTIFY_CONCURRENCY
+    if shard_count is None:
+        shard_count, concurrency = await recommended_shards(config.TOKEN)
+        logger.info(f"Discord recommends {shard_count} shards (identify concurrency {concurrency})")
+
+    url, token = config.SHARED_CACHE_URL, config.SHARED_CACHE_TOKEN
+    server = None
+    if not url:
+        url = f"unix:{os.path.abspath(config.SHARED_CACHE_SOCKET)}"
+        server = await SharedCacheServer(url).start()
+        token = server.token
+
+    clusters = []
+    for cluster_id, shard_ids in enumerate(split_shards(shard_count, args.clusters or config.CLUSTERS or os.cpu_count() or 1)):
+        env = dict(
+            os.environ,
+            SHARD_COUNT=str(shard_count),
+            SHARD_IDS=",".join(map(str, shard_ids)),
+            CLUSTER_ID=str(cluster_id),
+            IDENTIFY_CONCURRENCY=str(concurrency),
+            SHARED_CACHE_URL=url,
+            SHARED_CACHE_TOKEN=token,
+            # One /metrics port per cluster
+            METRICS_PORT=str(config.METRICS_PORT + cluster_id if config.METRICS_PORT else 0)
+        )
+        clusters.append(Cluster(cluster_id, shard_ids, env))
+
+    stopping = asyncio.Event()
+
+    def stop():
+        logger.info("Stopping clusters")
+        stopping.set()
+        for cluster in clusters:
+            cluster.terminate()
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop)
+        except NotImplementedError:
+            pass
+
+    try:
+        await asyncio.gather(*(cluster.run(stopping) for cluster in clusters))
+    finally:
+        if server is not None:
+            await server.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clusters", type=int, help="processes to run (default: CLUSTERS or one per CPU core)")
+    parser.add_argument("--shards", type=int, help="total shard count (default: SHARD_COUNT or Discord's recommendation)")
+    asyncio.run(main(parser.parse_args()))
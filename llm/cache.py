@@ -0,0 +1,37 @@
+import hashlib
+import json
+
+import metrics
+from transit.cache import SingleFlight, TTLCache
+
+
+def cache_key(model, messages):
+    payload = json.dumps({"model": model, "messages": messages}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class CompletionCache:
+    """Completions keyed by a hash of the model and the full prompt.
+
+    Prompts that embed a data snapshot get a new key when the data
+    changes, so entries never need explicit invalidation. Concurrent
+    requests for the same key wait for one generation.
+    """
+
+    def __init__(self, ttl, max_size=256):
+        self.results = TTLCache(ttl, max_size)
+        self.inflight = SingleFlight()
+
+    async def get_or_create(self, model, messages, factory, flight=None):
+        """Cached completion, else the result of `factory()`.
+
+        Only requests with the same `flight` wait on each other's generation,
+        e.g. so a user is never queued behind a background request.
+        """
+        key = cache_key(model, messages)
+        result = self.results.get(key)
+        metrics.record_cache("llm", result is not None)
+        if result is None:
+            result = await self.inflight.do((key, flight), factory)
+            self.results.set(key, result)
+        return result
@@ -0,0 +1,242 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+from collections import OrderedDict
+
+import config
+from transit.shared import SharedCacheError
+
+logger = logging.getLogger(__name__)
+
+
+def pack(message):
+    """Chat message dict -> `(role, text, image_url)` tuple."""
+    content = message["content"]
+    if isinstance(content, str):
+        return (message["role"], content, None)
+    text, image_url = "", None
+    for part in content:
+        if part.get("type") == "text":
+            text = part["text"]
+        elif part.get("type") == "image_url":
+            image_url = part["image_url"]["url"]
+    return (message["role"], text, image_url)
+
+
+def unpack(packed):
+    role, text, image_url = packed
+    if image_url is None:
+        return {"role": role, "content": text}
+    return {
+        "role": role,
+        "content": [
+            {"type": "text", "text": text},
+            {"type": "image_url", "image_url": {"url": image_url}}
+        ]
+    }
+
+
+def packed_size(packed):
+    return sys.getsizeof(packed) + sum(sys.getsizeof(part) for part in packed if part is not None)
+
+
+class Conversation:
+    __slots__ = ('messages', 'size', 'touched')
+
+    def __init__(self, messages=(), touched=None):
+        self.messages = list(messages)
+        self.size = sum(packed_size(message) for message in self.messages)
+        self.touched = touched or time.time()
+
+
+class ConversationStore:
+    """Recent /ask messages per user, bounded in count, age and memory.
+
+    Messages are kept as `(role, text, image_url)` tuples and expanded to
+    chat dicts on read. Conversations idle for longer than `idle_ttl` are
+    forgotten; beyond that the least recently used ones are dropped from
+    memory once `max_users` or `max_bytes` is exceeded.
+
+    With a `path`, changes are written behind to SQLite every
+    `flush_interval` seconds in one batch, and conversations dropped from
+    memory are loaded back from disk on their next use.
+
+    With a `shared` cache, clusters see one history per user: every append
+    is published there and reads adopt it when it is newer than the local
+    copy. Each cluster writes behind what it appended, and a row on disk
+    is only ever replaced by a newer one.
+    """
+
+    def __init__(self, path=None, max_messages=None, max_users=None, max_bytes=None, idle_ttl=None, flush_interval=None,
+                 shared=None):
+        self.path = config.AI_HISTORY_PATH if path is None else path
+        self.max_messages = max_messages or config.AI_HISTORY_MESSAGES
+        self.max_users = max_users or config.AI_HISTORY_MAX_USERS
+        self.max_bytes = max_bytes or config.AI_HISTORY_MAX_BYTES
+        self.idle_ttl = idle_ttl or config.AI_HISTORY_IDLE_TTL
+        self.flush_interval = flush_interval or config.AI_HISTORY_FLUSH_INTERVAL
+        self.shared = shared
+        self.conversations = OrderedDict()
+        self.size = 0
+        # user_id -> (touched, messages) waiting for the next flush
+        self.pending = {}
+        self.task = None
+        if self.path:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self.connect() as db:
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS conversations ("
+                    "user_id TEXT PRIMARY KEY, touched REAL, messages TEXT)"
+                )
+
+    def __len__(self):
+        return len(self.conversations)
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def start(self):
+        if self.path and (self.task is None or self.task.done()):
+            self.task = asyncio.create_task(self.flush_loop())
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        await self.flush()
+
+    async def get(self, user_id):
+        """Messages of a conversation as chat dicts, oldest first."""
+        conversation = self.conversations.get(user_id)
+        if self.shared is not None:
+            conversation = await self.adopt(user_id, conversation)
+        if conversation is None:
+            conversation = await self.restore(user_id)
+            if conversation is None:
+                return []
+        if conversation.touched < time.time() - self.idle_ttl:
+            self.discard(user_id)
+            return []
+        self.conversations.move_to_end(user_id)
+        return [unpack(message) for message in conversation.messages]
+
+    async def adopt(self, user_id, conversation):
+        """`conversation`, or the newer copy another cluster published."""
+        try:
+            hit, saved = await self.shared.peek(f"conversation:{user_id}")
+        except SharedCacheError as e:
+            self.shared.failed(e)
+            return conversation
+        if not hit or (conversation is not None and conversation.touched >= saved[0]):
+            return conversation
+        if conversation is not None:
+            del self.conversations[user_id]
+            self.size -= conversation.size
+        return self.keep(user_id, Conversation(saved[1], saved[0]))
+
+    def keep(self, user_id, conversation):
+        self.conversations[user_id] = conversation
+        self.size += conversation.size
+        self.evict()
+        return self.conversations.get(user_id)
+
+    async def append(self, user_id, *messages):
+        conversation = self.conversations.pop(user_id, None)
+        if conversation is None:
+            conversation = Conversation()
+        else:
+            self.size -= conversation.size
+
+        conversation.messages.extend(pack(message) for message in messages)
+        del conversation.messages[:-self.max_messages]
+        conversation.size = sum(packed_size(message) for message in conversation.messages)
+        conversation.touched = time.time()
+
+        self.conversations[user_id] = conversation
+        self.size += conversation.size
+        if self.path:
+            self.pending[user_id] = (conversation.touched, list(conversation.messages))
+        self.evict()
+        if self.shared is not None:
+            try:
+                await self.shared.set(f"conversation:{user_id}", (conversation.touched, list(conversation.messages)), self.idle_ttl)
+            except SharedCacheError as e:
+                self.shared.failed(e)
+
+    def discard(self, user_id):
+        conversation = self.conversations.pop(user_id, None)
+        if conversation is not None:
+            self.size -= conversation.size
+        if self.path:
+            self.pending[user_id] = None
+
+    def evict(self):
+        """Drop idle conversations, then least recently used ones over the limits."""
+        expired = time.time() - self.idle_ttl
+        while self.conversations:
+            user_id, conversation = next(iter(self.conversations.items()))
+            if conversation.touched < expired:
+                self.discard(user_id)
+            elif len(self.conversations) > self.max_users or self.size > self.max_bytes:
+                # Still on disk (or pending), so only memory is given up
+                self.conversations.popitem(last=False)
+                self.size -= conversation.size
+            else:
+                break
+
+    async def restore(self, user_id):
+        if not self.path:
+            return None
+        if user_id in self.pending:
+            saved = self.pending[user_id]
+        else:
+            saved = await asyncio.to_thread(self.load, user_id)
+        if saved is None:
+            return None
+        return self.keep(user_id, Conversation(saved[1], saved[0]))
+
+    def load(self, user_id):
+        with self.connect() as db:
+            row = db.execute("SELECT touched, messages FROM conversations WHERE user_id = ?", (user_id,)).fetchone()
+        if not row:
+            return None
+        return row[0], [tuple(message) for message in json.loads(row[1])]
+
+    def write(self, changes):
+        with self.connect() as db:
+            # Other clusters write the same rows, never let an older copy win
+            db.executemany(
+                "INSERT INTO conversations (user_id, touched, messages) VALUES (?, ?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET touched = excluded.touched, messages = excluded.messages "
+                "WHERE excluded.touched > conversations.touched",
+                [(user_id, saved[0], json.dumps(saved[1], ensure_ascii=False)) for user_id, saved in changes.items() if saved]
+            )
+            db.executemany(
+                "DELETE FROM conversations WHERE user_id = ?",
+                [(user_id,) for user_id, saved in changes.items() if saved is None]
+            )
+            db.execute("DELETE FROM conversations WHERE touched < ?", (time.time() - self.idle_ttl,))
+
+    async def flush(self):
+        if not self.path or not self.pending:
+            return
+        changes, self.pending = self.pending, {}
+        try:
+            await asyncio.to_thread(self.write, changes)
+        except Exception as e:
+            logger.warning(f"Conversation flush failed: {e}")
+            # Keep them for the next attempt unless they were changed since
+            for user_id, saved in changes.items():
+                self.pending.setdefault(user_id, saved)
+
+    async def flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.evict()
+            await self.flush()
@@ -0,0 +1,106 @@
+import asyncio
+import base64
+import hashlib
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps, features
+
+import config
+from transit.cache import SingleFlight, TTLCache
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_PREFIX = "sha256:"
+
+
+class ProcessedImage:
+    __slots__ = ('digest', 'data_url', 'width', 'height', 'size')
+
+    def __init__(self, digest, data_url, width, height, size):
+        self.digest = digest
+        self.data_url = data_url
+        self.width = width
+        self.height = height
+        self.size = size
+
+    @property
+    def reference(self):
+        """Compact stand-in for the image in conversation history."""
+        return REFERENCE_PREFIX + self.digest
+
+
+def encode(data, max_dimension, quality, image_format):
+    """Downscale and re-encode image bytes. Runs in the worker pool."""
+    with Image.open(io.BytesIO(data)) as source:
+        # Let JPEG decode straight at a reduced scale instead of full size
+        source.draft("RGB", (max_dimension, max_dimension))
+        image = ImageOps.exif_transpose(source)
+        image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+
+        if image_format == "WEBP":
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+        else:
+            image = image.convert("RGB")
+
+        output = io.BytesIO()
+        if image_format == "WEBP":
+            image.save(output, image_format, quality=quality, method=4)
+        else:
+            image.save(output, image_format, quality=quality, optimize=True)
+        width, height = image.size
+
+    encoded = output.getvalue()
+    mime = "image/webp" if image_format == "WEBP" else "image/jpeg"
+    return f"data:{mime};base64,{base64.b64encode(encoded).decode('ascii')}", width, height, len(encoded)
+
+
+class ImagePipeline:
+    """Turns /ask attachments into small inline images for the model.
+
+    Each attachment is downloaded once, downscaled to `max_dimension` and
+    re-encoded as WebP (JPEG if Pillow lacks WebP) on a small thread pool,
+    so the event loop never decodes images. Results are cached by the hash
+    of the original bytes, which is also the reference kept in history.
+    """
+
+    def __init__(self, max_dimension=None, quality=None, workers=None):
+        self.max_dimension = max_dimension or config.IMAGE_MAX_DIMENSION
+        self.quality = quality or config.IMAGE_QUALITY
+        self.format = "WEBP" if features.check("webp") else "JPEG"
+        self.executor = ThreadPoolExecutor(max_workers=workers or config.IMAGE_WORKERS, thread_name_prefix="image")
+        self.cache = TTLCache(config.IMAGE_CACHE_TTL, config.IMAGE_CACHE_SIZE, name="images")
+        self.inflight = SingleFlight()
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+    async def process(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        processed = self.cache.get(digest)
+        if processed is None:
+            processed = await self.inflight.do(digest, lambda: self.encode(digest, data))
+        return processed
+
+    async def encode(self, digest, data):
+        loop = asyncio.get_running_loop()
+        try:
+            data_url, width, height, size = await loop.run_in_executor(
+                self.executor, encode, data, self.max_dimension, self.quality, self.format
+            )
+        except Exception as e:
+            logger.warning(f"Image processing failed: {e}")
+            raise ValueError("სურათის დამუშავება ვერ მოხდა. გთხოვთ სცადოთ სხვა სურათი.")
+        processed = ProcessedImage(digest, data_url, width, height, size)
+        self.cache.set(digest, processed)
+        logger.info(f"Image {digest[:12]} encoded: {len(data)} -> {size} bytes ({width}x{height})")
+        return processed
+
+    def resolve(self, url):
+        """Inline data URL for a history reference, or None if it is gone from the cache."""
+        if not url.startswith(REFERENCE_PREFIX):
+            return url
+        processed = self.cache.get(url[len(REFERENCE_PREFIX):])
+        return processed.data_url if processed else None
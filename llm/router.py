@@ -0,0 +1,224 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+
+import config
+from llm.scheduler import RateLimited
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidRequest(Exception):
+    """The request itself was refused, e.g. as too large; every model would refuse it.
+
+    Raised by a router `call`; it is passed on without trying other models
+    or counting against the model.
+    """
+
+
+class ModelStats:
+    """Rolling latency and outcome window of one model for one request class."""
+
+    __slots__ = ('latencies', 'outcomes', 'cooldown_until')
+
+    def __init__(self, window):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.cooldown_until = 0.0
+
+    def quantile(self, q):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    @property
+    def error_rate(self):
+        if not self.outcomes:
+            return 0.0
+        return 1 - sum(self.outcomes) / len(self.outcomes)
+
+    def healthy(self, now):
+        if self.cooldown_until > now:
+            return False
+        return len(self.outcomes) < config.LLM_ROUTER_MIN_SAMPLES or self.error_rate <= config.LLM_ROUTER_MAX_ERROR_RATE
+
+
+class ModelRouter:
+    """Picks the model for each OpenRouter request from its request class.
+
+    Healthy models are ranked by median latency, models without data after
+    them in their configured order. A model that answered 429 is
+    skipped until its Retry-After has passed. A failed request falls over
+    to the next model; with hedging, a backup request to the runner-up is
+    started once the primary is slower than its p95 and whichever answers
+    first wins.
+    """
+
+    def __init__(self, classes=None, window=None):
+        self.classes = classes or config.MODEL_CLASSES
+        self.window = window or config.LLM_ROUTER_WINDOW
+        self.stats = {}
+
+    def get_stats(self, request_class, model):
+        stats = self.stats.get((request_class, model))
+        if stats is None:
+            stats = self.stats[(request_class, model)] = ModelStats(self.window)
+        return stats
+
+    def rank(self, request_class, prefer=None):
+        models = list(self.classes[request_class])
+        if prefer in models:
+            models.remove(prefer)
+            models.insert(0, prefer)
+        now = time.monotonic()
+
+        def key(item):
+            index, model = item
+            stats = self.get_stats(request_class, model)
+            measured = bool(stats.latencies)
+            return (not stats.healthy(now), not measured, stats.quantile(0.5) if measured else index)
+
+        ranked = [model for _, model in sorted(enumerate(models), key=key)]
+        healthy = [model for model in ranked if self.get_stats(request_class, model).healthy(now)]
+        if len(healthy) > 1 and random.random() < config.LLM_ROUTER_EXPLORE:
+            ranked.remove(healthy[1])
+            ranked.insert(0, healthy[1])
+        return ranked
+
+    def hedge_delay(self, request_class, model):
+        stats = self.get_stats(request_class, model)
+        if len(stats.latencies) < config.LLM_ROUTER_MIN_SAMPLES:
+            return config.LLM_HEDGE_DEFAULT_DELAY
+        return max(config.LLM_HEDGE_MIN_DELAY, stats.quantile(0.95))
+
+    async def timed(self, request_class, model, call):
+        stats = self.get_stats(request_class, model)
+        start = time.perf_counter()
+        try:
+            result = await call(model)
+        except RateLimited as e:
+            stats.outcomes.append(False)
+            stats.cooldown_until = time.monotonic() + (e.retry_after or config.LLM_ROUTER_COOLDOWN)
+            raise
+        except asyncio.CancelledError:
+            # Lost a hedge race (recorded by `run`) or the caller gave up; not a sample either way
+            raise
+        except InvalidRequest:
+            raise
+        except Exception as e:
+            stats.outcomes.append(False)
+            logger.warning(f"{model} failed: {e}")
+            raise
+        stats.latencies.append(time.perf_counter() - start)
+        stats.outcomes.append(True)
+        return result
+
+    async def run(self, request_class, call, prefer=None, try_hedge=None, discard=None):
+        """Return `await call(model)` from the first model that succeeds.
+
+        `try_hedge()` may return a release callable when there is spare
+        capacity for a backup request, or None. `discard(result)` cleans up
+        the result of a hedged request that finished but lost.
+        """
+        candidates = self.rank(request_class, prefer)
+        errors = []
+        while candidates:
+            model = candidates.pop(0)
+            tasks = {asyncio.ensure_future(self.timed(request_class, model, call)): (model, time.perf_counter())}
+            release, delay = None, 0
+            try:
+                if config.LLM_HEDGING and try_hedge and candidates:
+                    delay = self.hedge_delay(request_class, model)
+                    done, _ = await asyncio.wait(set(tasks), timeout=delay)
+                    if not done:
+                        release = try_hedge()
+                        if release:
+                            backup = candidates.pop(0)
+                            logger.info(f"Hedging {model} with {backup}")
+                            tasks[asyncio.ensure_future(self.timed(request_class, backup, call))] = (backup, time.perf_counter())
+
+                pending = set(tasks)
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    winners = [task for task in done if task.exception() is None]
+                    for task in done:
+                        if task.exception() is not None:
+                            if isinstance(task.exception(), InvalidRequest):
+                                raise task.exception()
+                            errors.append(task.exception())
+                    if winners:
+                        self.record_losers(request_class, tasks, pending, winners[0], delay)
+                        for loser in winners[1:]:
+                            if discard:
+                                await discard(loser.result())
+                        return winners[0].result()
+            finally:
+                losers = [task for task in tasks if not task.done()]
+                for task in losers:
+                    task.cancel()
+                if losers:
+                    await asyncio.gather(*losers, return_exceptions=True)
+                if release:
+                    release()
+
+        limited = [e for e in errors if isinstance(e, RateLimited)]
+        if limited and len(limited) == len(errors):
+            # Every model is rate limited; let the scheduler back off
+            raise RateLimited(min((e.retry_after for e in limited if e.retry_after), default=None))
+        raise errors[-1] if errors else RuntimeError(f"No models for {request_class}")
+
+    def record_losers(self, request_class, tasks, losers, winner, delay):
+        """Count hedge losers as at least as slow as the winner plus the hedge delay.
+
+        Their real latency is unknown, only that they were slower; their
+        elapsed time alone would make a slow model look fast.
+        """
+        now = time.perf_counter()
+        floor = now - tasks[winner][1] + delay
+        for task in losers:
+            model, started = tasks[task]
+            self.get_stats(request_class, model).latencies.append(max(now - started, floor))
+
+    async def stream(self, request_class, open_stream, prefer=None, try_hedge=None):
+        """Start the model that produces the first chunk soonest and return its chunks.
+
+        Latency is recorded as time to first chunk. Errors after the first
+        chunk are not retried.
+        """
+        async def first_chunk(model):
+            chunks = open_stream(model)
+            try:
+                first = await chunks.__anext__()
+            except StopAsyncIteration:
+                first = ""
+            except BaseException:
+                await chunks.aclose()
+                raise
+            return first, chunks
+
+        async def close(result):
+            await result[1].aclose()
+
+        first, chunks = await self.run(request_class, first_chunk, prefer, try_hedge, discard=close)
+
+        async def relay():
+            try:
+                if first:
+                    yield first
+                async for chunk in chunks:
+                    yield chunk
+            finally:
+                await chunks.aclose()
+
+        return relay()
+
+    def summary(self):
+        """`(request_class, model, p50, error_rate, samples)` rows for models with data."""
+        rows = []
+        for (request_class, model), stats in sorted(self.stats.items()):
+            if stats.outcomes:
+                rows.append((request_class, model, stats.quantile(0.5), stats.error_rate, len(stats.outcomes)))
+        return rows
@@ -0,0 +1,241 @@
+import asyncio
+import email.utils
+import logging
+import random
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+import config
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Priority classes, lower is served first
+INTERACTIVE = 0
+STANDARD = 1
+BACKGROUND = 2
+
+PRIORITY_NAMES = {INTERACTIVE: "interactive", STANDARD: "standard", BACKGROUND: "background"}
+
+
+class RateLimited(Exception):
+    """OpenRouter answered 429; `retry_after` is in seconds if it said so."""
+
+    def __init__(self, retry_after=None):
+        super().__init__(f"Rate limited (retry after {retry_after}s)" if retry_after else "Rate limited")
+        self.retry_after = retry_after
+
+
+def parse_retry_after(headers):
+    """Seconds from a `Retry-After` header (delta or HTTP date), or None."""
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class Waiter:
+    __slots__ = ('priority', 'guild_id', 'user_id', 'future', 'queued_at', 'on_position', 'notified', 'notified_at')
+
+    def __init__(self, priority, guild_id, user_id, on_position):
+        self.priority = priority
+        self.guild_id = guild_id
+        self.user_id = user_id
+        self.future = asyncio.get_running_loop().create_future()
+        self.queued_at = time.perf_counter()
+        self.on_position = on_position
+        self.notified = None
+        self.notified_at = 0.0
+
+
+class Scheduler:
+    """Admission control for every OpenRouter request the bot makes.
+
+    At most `max_concurrency` requests run at once and one guild can hold
+    at most `max_per_guild` of them. Waiting requests are served by
+    priority class, and within a class round-robin across guilds and then
+    across users of a guild, so one busy guild or user cannot starve the
+    rest. A 429 pauses all dispatching until its Retry-After has passed.
+    """
+
+    def __init__(self, max_concurrency=None, max_per_guild=None):
+        self.max_concurrency = max_concurrency or config.LLM_MAX_CONCURRENCY
+        self.max_per_guild = max_per_guild or config.LLM_MAX_PER_GUILD
+        # priority -> guild_id -> user_id -> deque of waiters
+        self.queues = {priority: OrderedDict() for priority in PRIORITY_NAMES}
+        self.active = 0
+        self.active_by_guild = {}
+        self.paused_until = 0.0
+        self.wakeup = None
+        # Queue position notices being sent, the loop only keeps weak references
+        self.notices = set()
+
+    @property
+    def waiting(self):
+        return sum(len(queue) for guilds in self.queues.values() for users in guilds.values() for queue in users.values())
+
+    @asynccontextmanager
+    async def slot(self, priority=STANDARD, guild_id=None, user_id=None, on_position=None):
+        await self.acquire(priority, guild_id, user_id, on_position)
+        try:
+            yield
+        finally:
+            self.release(guild_id)
+
+    async def run(self, factory, priority=STANDARD, guild_id=None, user_id=None, on_position=None, attempts=None):
+        """Run `factory()` in a slot, retrying on RateLimited after backing off."""
+        attempts = attempts or config.LLM_MAX_ATTEMPTS
+        for attempt in range(attempts):
+            async with self.slot(priority, guild_id, user_id, on_position):
+                try:
+                    return await factory()
+                except RateLimited as e:
+                    self.rate_limited(e.retry_after, attempt)
+                    if attempt == attempts - 1:
+                        raise
+
+    def rate_limited(self, retry_after=None, attempt=0):
+        if retry_after is None:
+            retry_after = random.uniform(0, config.LLM_RETRY_BACKOFF * 2 ** attempt)
+        retry_after = min(retry_after, config.LLM_MAX_RETRY_AFTER)
+        self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+        logger.warning(f"OpenRouter rate limited, pausing for {retry_after:.1f}s")
+
+    async def acquire(self, priority=STANDARD, guild_id=None, user_id=None, on_position=None):
+        waiter = Waiter(priority, guild_id, user_id, on_position)
+        self.queues[priority].setdefault(guild_id, OrderedDict()).setdefault(user_id, deque()).append(waiter)
+        self.dispatch()
+        if not waiter.future.done():
+            self.notify()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted just before we were cancelled
+                self.release(guild_id)
+            else:
+                self.remove(waiter)
+            raise
+        metrics.llm_queue_wait.observe(time.perf_counter() - waiter.queued_at, priority=PRIORITY_NAMES[priority])
+
+    def try_acquire(self, guild_id=None):
+        """Take a slot only if one is free and nobody is waiting.
+
+        Returns a release callable, or None. Used for hedged requests, which
+        should only ever use spare capacity.
+        """
+        if self.active >= self.max_concurrency or self.waiting or self.paused_until > time.monotonic():
+            return None
+        self.active += 1
+        self.active_by_guild[guild_id] = self.active_by_guild.get(guild_id, 0) + 1
+        return lambda: self.release(guild_id)
+
+    def release(self, guild_id=None):
+        self.active -= 1
+        remaining = self.active_by_guild.get(guild_id, 1) - 1
+        if remaining > 0:
+            self.active_by_guild[guild_id] = remaining
+        else:
+            self.active_by_guild.pop(guild_id, None)
+        self.dispatch()
+
+    def remove(self, waiter):
+        guilds = self.queues[waiter.priority]
+        users = guilds.get(waiter.guild_id)
+        queue = users.get(waiter.user_id) if users else None
+        if queue and waiter in queue:
+            queue.remove(waiter)
+            self.cleanup(guilds, waiter.guild_id, waiter.user_id)
+        self.dispatch()
+
+    def cleanup(self, guilds, guild_id, user_id):
+        users = guilds[guild_id]
+        if not users[user_id]:
+            del users[user_id]
+        if not users:
+            del guilds[guild_id]
+
+    def next_waiter(self):
+        for guilds in self.queues.values():
+            for guild_id in list(guilds):
+                if self.active_by_guild.get(guild_id, 0) >= self.max_per_guild:
+                    continue
+                users = guilds[guild_id]
+                user_id = next(iter(users))
+                waiter = users[user_id].popleft()
+                # Rotate both levels so the next pick starts with someone else
+                users.move_to_end(user_id)
+                guilds.move_to_end(guild_id)
+                self.cleanup(guilds, guild_id, user_id)
+                if not waiter.future.done():
+                    return waiter
+        return None
+
+    def dispatch(self):
+        delay = self.paused_until - time.monotonic()
+        if delay > 0:
+            if self.wakeup is None:
+                self.wakeup = asyncio.get_running_loop().call_later(delay, self.resume)
+            return
+
+        granted = False
+        while self.active < self.max_concurrency:
+            waiter = self.next_waiter()
+            if waiter is None:
+                break
+            self.active += 1
+            self.active_by_guild[waiter.guild_id] = self.active_by_guild.get(waiter.guild_id, 0) + 1
+            waiter.future.set_result(None)
+            granted = True
+        if granted:
+            self.notify()
+
+    def resume(self):
+        self.wakeup = None
+        self.dispatch()
+        self.notify()
+
+    def positions(self):
+        """Approximate place in line of every waiting request.
+
+        Everything in a higher class goes first; within a class, round-robin
+        serves up to `n + 1` requests from each other user before the
+        `n`-th queued request of a user.
+        """
+        positions = {}
+        ahead = 0
+        for guilds in self.queues.values():
+            queues = [queue for users in guilds.values() for queue in users.values()]
+            for queue in queues:
+                for index, waiter in enumerate(queue):
+                    others = sum(min(len(other), index + 1) for other in queues if other is not queue)
+                    positions[waiter] = ahead + others + index + 1
+            ahead += sum(len(queue) for queue in queues)
+        return positions
+
+    def notify(self):
+        """Tell waiting users their new place in line, at most every LLM_QUEUE_NOTIFY_INTERVAL."""
+        now = time.monotonic()
+        for waiter, position in self.positions().items():
+            if waiter.on_position is None or waiter.notified == position:
+                continue
+            if waiter.notified is not None and now - waiter.notified_at < config.LLM_QUEUE_NOTIFY_INTERVAL:
+                continue
+            waiter.notified, waiter.notified_at = position, now
+            task = asyncio.create_task(self.send_position(waiter, position))
+            self.notices.add(task)
+            task.add_done_callback(self.notices.discard)
+
+    async def send_position(self, waiter, position):
+        try:
+            await waiter.on_position(position)
+        except Exception as e:
+            logger.debug(f"Queue position update failed: {e}")
@@ -0,0 +1,71 @@
+import json
+
+
+class StreamError(Exception):
+    """Error event sent by OpenRouter in the middle of a stream."""
+
+
+class ToolCalls(list):
+    """Tool calls the model asked for; `iter_deltas` yields them after the text."""
+
+
+async def iter_events(response):
+    """Yield the `data:` payloads of a server-sent events response."""
+    async for raw in response.content:
+        line = raw.strip()
+        # Blank lines separate events, `:` lines are keep-alive comments
+        # such as ": OPENROUTER PROCESSING"
+        if not line or line.startswith(b":"):
+            continue
+        if line.startswith(b"data:"):
+            yield line[5:].strip().decode("utf-8")
+
+
+def merge_tool_call(calls, fragment):
+    """Fold one streamed `tool_calls` fragment into the calls collected so far."""
+    index = fragment.get("index", len(calls))
+    while len(calls) <= index:
+        calls.append({"id": None, "type": "function", "function": {"name": "", "arguments": ""}})
+    call = calls[index]
+    if fragment.get("id"):
+        call["id"] = fragment["id"]
+    function = fragment.get("function") or {}
+    call["function"]["name"] += function.get("name") or ""
+    call["function"]["arguments"] += function.get("arguments") or ""
+
+
+async def iter_deltas(response):
+    """Yield the content pieces of a `stream: true` chat completion.
+
+    If the model called tools, a `ToolCalls` with the complete calls is
+    yielded last. Falls back to the whole message if the upstream answered
+    with a plain JSON completion instead of a stream.
+    """
+    if response.content_type == "application/json":
+        result = await response.json()
+        message = result['choices'][0]['message']
+        if message.get('content'):
+            yield message['content']
+        if message.get('tool_calls'):
+            yield ToolCalls(message['tool_calls'])
+        return
+
+    calls = ToolCalls()
+    async for data in iter_events(response):
+        if data == "[DONE]":
+            break
+        event = json.loads(data)
+        if "error" in event:
+            raise StreamError(event["error"].get("message", "stream error"))
+        choices = event.get("choices") or []
+        if choices:
+            delta = choices[0].get("delta") or {}
+            if delta.get("content"):
+                yield delta["content"]
+            for fragment in delta.get("tool_calls") or []:
+                merge_tool_call(calls, fragment)
+    if calls:
+        for index, call in enumerate(calls):
+            # Some providers leave the id out; tool results still need one to refer to
+            call["id"] = call["id"] or f"call_{index}"
+        yield calls
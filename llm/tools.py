@@ -0,0 +1,265 @@
+import asyncio
+import inspect
+import json
+import logging
+import time
+
+import config
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# OpenAI-style function schemas sent with every /ask request
+SCHEMAS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "find_stops",
+            "description": "Search Tbilisi public transport stops by name or stop code. Returns matching stop codes.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {"type": "string", "description": "Part of a stop name (Georgian or English) or a stop code"}
+                },
+                "required": ["query"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_arrivals",
+            "description": "Live arrival times at one stop, soonest first, optionally only for one route.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "stop": {"type": "string", "description": "Stop code or exact stop name"},
+                    "route": {"type": "string", "description": "Route number to filter by, e.g. \"37\""}
+                },
+                "required": ["stop"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_route_stops",
+            "description": "Stops of a bus route in order, for each direction.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "route": {"type": "string", "description": "Route number, e.g. \"37\""}
+                },
+                "required": ["route"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "plan_journey",
+            "description": "Plan a public transport journey between two stops, with rides, walks and transfers. Times are estimates.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "origin": {"type": "string", "description": "Start stop code or name"},
+                    "destination": {"type": "string", "description": "Destination stop code or name"}
+                },
+                "required": ["origin", "destination"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_passenger_stats",
+            "description": "Today's passenger counts by transport mode, with the same time yesterday for comparison.",
+            "parameters": {"type": "object", "properties": {}}
+        }
+    }
+]
+
+
+class ToolError(Exception):
+    """A tool could not answer; the message is passed back to the model."""
+
+
+class TransitTools:
+    """Functions the /ask model can call, answered from the bot's own caches.
+
+    All calls the model makes in one turn run concurrently, and every
+    result goes back as a compact JSON tool message. Failures become an
+    `error` result instead of failing the answer, so the model can retry
+    with other arguments or explain what is missing.
+    """
+
+    def __init__(self, bot, timeout=None, max_results=None):
+        self.stop_catalog = bot.stop_catalog
+        self.route_catalog = bot.route_catalog
+        self.arrivals = bot.arrivals
+        self.passenger_stats = bot.passenger_stats
+        self.journeys = bot.journeys
+        self.timeout = timeout or config.AI_TOOL_TIMEOUT
+        self.max_results = max_results or config.AI_TOOL_MAX_RESULTS
+        self.handlers = {
+            "find_stops": self.find_stops,
+            "get_arrivals": self.get_arrivals,
+            "get_route_stops": self.get_route_stops,
+            "plan_journey": self.plan_journey,
+            "get_passenger_stats": self.get_passenger_stats
+        }
+
+    @property
+    def schemas(self):
+        return SCHEMAS
+
+    async def run(self, calls):
+        """Tool messages answering `calls`, in the same order."""
+        return await asyncio.gather(*(self.call(call) for call in calls))
+
+    async def call(self, call):
+        function = call.get("function") or {}
+        name = function.get("name", "")
+        start = time.perf_counter()
+        try:
+            handler = self.handlers.get(name)
+            if handler is None:
+                raise ToolError(f"Unknown tool: {name}")
+            try:
+                arguments = json.loads(function.get("arguments") or "{}")
+            except json.JSONDecodeError:
+                raise ToolError("Arguments are not valid JSON")
+            if not isinstance(arguments, dict):
+                raise ToolError("Arguments must be an object")
+            try:
+                inspect.signature(handler).bind(**arguments)
+            except TypeError as e:
+                raise ToolError(f"Bad arguments: {e}")
+            # A TypeError from here on is a bug in the tool, not the model's fault
+            result = await asyncio.wait_for(handler(**arguments), self.timeout)
+            outcome = "ok"
+        except ToolError as e:
+            result, outcome = {"error": str(e)}, "error"
+        except asyncio.TimeoutError:
+            result, outcome = {"error": "Timed out, try again later"}, "error"
+        except Exception as e:
+            logger.warning(f"Tool {name} failed: {e}")
+            result, outcome = {"error": "Transit data is unavailable right now"}, "error"
+        metrics.llm_tool_calls.inc(tool=name if name in self.handlers else "unknown", result=outcome)
+        logger.info(f"Tool {name} {outcome} in {time.perf_counter() - start:.3f}s")
+        return {
+            "role": "tool",
+            "tool_call_id": call.get("id"),
+            "name": name,
+            "content": json.dumps(result, ensure_ascii=False)
+        }
+
+    async def resolve_stop(self, stop):
+        await self.stop_catalog.ensure_loaded()
+        found = self.stop_catalog.find(str(stop).strip())
+        if found is None:
+            matches = self.stop_catalog.search(str(stop), 1)
+            found = matches[0] if matches else None
+        if found is None:
+            raise ToolError(f"No stop matches {stop!r}, use find_stops first")
+        return found
+
+    async def resolve_route(self, route):
+        await self.route_catalog.ensure_loaded()
+        route = str(route).strip()
+        found = self.route_catalog.get(route) or next(
+            (item for item in self.route_catalog.routes if str(item.get('shortName')) == route), None
+        )
+        if found is None:
+            matches = self.route_catalog.search(route, 1)
+            found = matches[0] if matches else None
+        if found is None:
+            raise ToolError(f"No route matches {route!r}")
+        return found
+
+    async def find_stops(self, query):
+        await self.stop_catalog.ensure_loaded()
+        return {
+            "stops": [{"code": stop['code'], "name": stop['name']} for stop in self.stop_catalog.search(str(query), self.max_results)]
+        }
+
+    async def get_arrivals(self, stop, route=None):
+        found = await self.resolve_stop(stop)
+        snapshot = await self.arrivals.get(found['code'])
+        arrivals = snapshot.arrivals or []
+        if route:
+            arrivals = [arrival for arrival in arrivals if str(arrival.get('shortName')) == str(route).strip()]
+        arrivals = sorted(arrivals, key=lambda arrival: arrival.get('realtimeArrivalMinutes', 999))
+        return {
+            "stop": {"code": found['code'], "name": found['name']},
+            "updated_seconds_ago": int(snapshot.age),
+            # The gateway is down; minutes were counted down from the last good answer
+            "stale": snapshot.stale,
+            "arrivals": [
+                {
+                    "route": arrival.get('shortName'),
+                    "headsign": arrival.get('headsign'),
+                    "minutes": arrival.get('realtimeArrivalMinutes', arrival.get('scheduledArrivalMinutes')),
+                    "realtime": 'realtimeArrivalMinutes' in arrival
+                }
+                for arrival in arrivals[:self.max_results]
+            ]
+        }
+
+    async def get_route_stops(self, route):
+        found = await self.resolve_route(route)
+        patterns = await self.route_catalog.get_patterns(found['id'])
+        directions = await asyncio.gather(*(self.route_catalog.get_stops(found['id'], suffix) for suffix in patterns))
+        return {
+            "route": found.get('shortName'),
+            "name": found.get('longName'),
+            "directions": [
+                [f"{stop['code']} {stop['name']}" for stop in stops or []]
+                for stops in directions
+            ]
+        }
+
+    async def plan_journey(self, origin, destination):
+        if not self.journeys.loaded:
+            raise ToolError("The journey planner is still loading, suggest /route in a few minutes")
+        start, end = await self.resolve_stop(origin), await self.resolve_stop(destination)
+        journeys = await self.journeys.plan(start['code'], end['code'])
+        return {
+            "from": {"code": start['code'], "name": start['name']},
+            "to": {"code": end['code'], "name": end['name']},
+            "options": [
+                {
+                    "minutes": round(journey.seconds / 60),
+                    "transfers": journey.transfers,
+                    "legs": [
+                        {
+                            "mode": leg.mode,
+                            "route": leg.route,
+                            "headsign": leg.headsign,
+                            "from": f"{leg.origin[0]} {leg.origin[1]}",
+                            "to": f"{leg.destination[0]} {leg.destination[1]}",
+                            "minutes": round(leg.seconds / 60),
+                            "stops": leg.stops if leg.mode == 'ride' else None,
+                            "meters": leg.meters if leg.mode == 'walk' else None
+                        }
+                        for leg in journey.legs
+                    ]
+                }
+                for journey in reversed(journeys[-config.JOURNEY_MAX_OPTIONS:])
+            ]
+        }
+
+    async def get_passenger_stats(self):
+        stats = await self.passenger_stats.get()
+        result = {
+            "total": sum(stats.values()),
+            "by_mode": stats,
+            "updated_seconds_ago": int(time.time() - self.passenger_stats.updated_at)
+        }
+        history = self.passenger_stats.history
+        latest = history.latest() if history is not None else None
+        if latest:
+            yesterday = history.same_time(latest[0])
+            if yesterday:
+                result["same_time_yesterday"] = {"total": sum(yesterday[1].values()), "by_mode": yesterday[1]}
+        return result
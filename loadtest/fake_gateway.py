@@ -0,0 +1,163 @@
+"""Local stand-in for the TTC gateway, the passengers API and OpenRouter."""
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+
+from aiohttp import web
+
+from benchmarks import fixtures
+
+
+class FakeGateway:
+    def __init__(self, latency=0.05, jitter=0.05, error_rate=0.0, stops=3000, routes=150, arrivals=20, llm_latency=1.0, seed=7,
+                 outage=None, outage_mode="down"):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        # (start, length) in seconds after reset(); "down" answers 503, "slow" hangs past any client timeout
+        self.outage = outage
+        self.outage_mode = outage_mode
+        self.started_at = time.perf_counter()
+        self.llm_latency = llm_latency
+        self.rng = random.Random(seed)
+        self.stops = fixtures.make_stops(stops)
+        self.routes = fixtures.make_routes(routes)
+        self.patterns = fixtures.make_route_patterns(self.stops, self.routes)
+        self.arrival_count = arrivals
+        self.calls = Counter()
+        self.runner = None
+        self.port = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def reset(self):
+        self.calls.clear()
+        self.started_at = time.perf_counter()
+
+    def in_outage(self):
+        if self.outage is None:
+            return False
+        start, length = self.outage
+        return start <= time.perf_counter() - self.started_at < start + length
+
+    async def delay(self, endpoint):
+        self.calls[endpoint] += 1
+        if self.in_outage():
+            self.calls["outage"] += 1
+            if self.outage_mode == "slow":
+                await asyncio.sleep(60)
+            raise web.HTTPServiceUnavailable()
+        await asyncio.sleep(max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter)))
+        if self.rng.random() < self.error_rate:
+            raise web.HTTPServiceUnavailable()
+
+    async def stops_list(self, request):
+        await self.delay("v2/stops")
+        return web.json_response(self.stops)
+
+    async def stop_detail(self, request):
+        await self.delay("v2/stops/{id}")
+        code = request.match_info["stop_id"].split(":")[-1]
+        return web.json_response({"id": f"1:{code}", "code": code, "name": f"Stop {code}"})
+
+    async def arrival_times(self, request):
+        await self.delay("v2/stops/{id}/arrival-times")
+        return web.json_response(fixtures.make_arrivals(self.arrival_count, seed=self.rng.random()))
+
+    async def routes_list(self, request):
+        await self.delay("v3/routes")
+        return web.json_response(self.routes, headers={"ETag": '"routes-v1"'})
+
+    async def route_detail(self, request):
+        await self.delay("v3/routes/{id}")
+        route_id = request.match_info["route_id"]
+        return web.json_response({"id": route_id, "patterns": [{"patternSuffix": "1:01"}, {"patternSuffix": "0:01"}]})
+
+    async def route_stops(self, request):
+        await self.delay("v3/routes/{id}/stops")
+        stops = self.patterns.get(request.match_info["route_id"], [])
+        if request.query.get("patternSuffix", "1:01").startswith("0:"):
+            stops = stops[::-1]
+        return web.json_response(stops)
+
+    async def passengers(self, request):
+        await self.delay("passengers")
+        return web.json_response({"transactionsByTransportTypes": fixtures.make_passenger_stats()})
+
+    async def chat_completions(self, request):
+        self.calls["openrouter"] += 1
+        body = await request.json()
+        if body.get("tool_choice") == "auto" and body["messages"][-1]["role"] == "user":
+            return await self.tool_calls(request, body)
+        if body.get("stream"):
+            return await self.stream_completion(request)
+        await asyncio.sleep(self.llm_latency)
+        return web.json_response({"choices": [{"message": {"role": "assistant", "content": "ტესტური პასუხი"}}]})
+
+    async def stream_completion(self, request, tokens=40):
+        """SSE completion spreading `tokens` pieces over `llm_latency`."""
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await response.write(b": OPENROUTER PROCESSING\n\n")
+        for i in range(tokens):
+            await asyncio.sleep(self.llm_latency / tokens)
+            event = {"choices": [{"index": 0, "delta": {"content": f"ტესტური{i} "}}]}
+            await response.write(f"data: {json.dumps(event)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def tool_calls(self, request, body):
+        """Ask for arrivals at two stops at once, like a model grounding its answer."""
+        await asyncio.sleep(self.llm_latency / 4)
+        calls = [
+            {
+                "index": i,
+                "id": f"call_{i}",
+                "type": "function",
+                "function": {"name": "get_arrivals", "arguments": json.dumps({"stop": self.rng.choice(self.stops[:50])["code"]})}
+            }
+            for i in range(2)
+        ]
+        if not body.get("stream"):
+            return web.json_response({"choices": [{"message": {"role": "assistant", "content": None, "tool_calls": calls}}]})
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for call in calls:
+            # Name first, then the arguments split in two, as real streams do
+            arguments = call["function"]["arguments"]
+            head = dict(call, function={"name": call["function"]["name"], "arguments": arguments[:5]})
+            tail = {"index": call["index"], "function": {"arguments": arguments[5:]}}
+            for fragment in (head, tail):
+                event = {"choices": [{"index": 0, "delta": {"tool_calls": [fragment]}}]}
+                await response.write(f"data: {json.dumps(event)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def start(self, port=0):
+        app = web.Application()
+        app.router.add_get("/pis-gateway/api/v2/stops", self.stops_list)
+        app.router.add_get("/pis-gateway/api/v2/stops/{stop_id}", self.stop_detail)
+        app.router.add_get("/pis-gateway/api/v2/stops/{stop_id}/arrival-times", self.arrival_times)
+        app.router.add_get("/pis-gateway/api/v3/routes", self.routes_list)
+        app.router.add_get("/pis-gateway/api/v3/routes/{route_id}", self.route_detail)
+        app.router.add_get("/pis-gateway/api/v3/routes/{route_id}/stops", self.route_stops)
+        app.router.add_get("/api/passengers", self.passengers)
+        app.router.add_post("/openrouter/chat/completions", self.chat_completions)
+
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
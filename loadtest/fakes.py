@@ -0,0 +1,95 @@
+"""Minimal stand-ins for the discord.py objects the cogs touch."""
+import itertools
+import time
+import types
+
+import discord
+
+_ids = itertools.count(1)
+
+
+class FakeMessage:
+    def __init__(self, content=None, embed=None, view=None):
+        self.id = next(_ids)
+        self.content = content
+        self.embed = embed
+        self.view = view
+
+    async def edit(self, **kwargs):
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+        return self
+
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self.done = False
+
+    def is_done(self):
+        return self.done
+
+    async def defer(self, **kwargs):
+        self.done = True
+
+    async def send_message(self, content=None, **kwargs):
+        self.done = True
+        self.interaction.answer(FakeMessage(content, kwargs.get("embed"), kwargs.get("view")))
+
+    async def edit_message(self, **kwargs):
+        self.done = True
+        self.interaction.answer(FakeMessage(kwargs.get("content"), kwargs.get("embed"), kwargs.get("view")))
+
+    async def send_modal(self, modal):
+        self.done = True
+
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def send(self, content=None, **kwargs):
+        message = FakeMessage(content, kwargs.get("embed"), kwargs.get("view"))
+        self.interaction.answer(message)
+        return message
+
+
+class FakeInteraction:
+    """Records when the user first sees an answer and what it was."""
+
+    def __init__(self, user_id, guild_id=1, channel_id=1):
+        self.id = next(_ids)
+        self.user = types.SimpleNamespace(id=user_id, name=f"user{user_id}", avatar=None, mention=f"<@{user_id}>")
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.created_at = discord.utils.utcnow()
+        self.started = time.perf_counter()
+        self.answered = None
+        self.messages = []
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+        self.command = None
+
+    def answer(self, message=None):
+        if self.answered is None:
+            self.answered = time.perf_counter()
+        if message is not None:
+            self.messages.append(message)
+
+    @property
+    def latency(self):
+        return (self.answered or time.perf_counter()) - self.started
+
+    @property
+    def failed(self):
+        return any(message.content and "შეცდომა" in message.content for message in self.messages)
+
+    async def original_response(self):
+        return self.messages[0] if self.messages else None
+
+    async def edit_original_response(self, **kwargs):
+        if self.messages:
+            return await self.messages[0].edit(**kwargs)
+        message = FakeMessage(kwargs.get("content"), kwargs.get("embed"), kwargs.get("view"))
+        self.answer(message)
+        return message
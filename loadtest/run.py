@@ -0,0 +1,298 @@
+"""Drive the real transit cogs with many concurrent fake users.
+
+Starts a local fake gateway, points the bot's clients at it and runs the
+command handlers directly with fake interactions.
+
+Usage:
+    python -m loadtest.run --users 300 --duration 30
+    python -m loadtest.run --latency 0.5 --error-rate 0.05 --json report.json
+    python -m loadtest.run --scenarios stopinfo=5,autocomplete_stop=10,stats=1
+    python -m loadtest.run --outage 5:15 --outage-mode slow
+    python -m loadtest.run --clusters 4 --shared-cache socket
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import types
+
+import config
+from cogs.ai import AI
+from cogs.bus import Bus
+from cogs.buses import Buses
+from cogs.stats import Stats
+from cogs.stop import Stop
+from cogs.journey import Journey
+from cogs.nearby import Nearby
+from cogs.stops import Stops
+from loadtest.fake_gateway import FakeGateway
+from llm.router import ModelRouter
+from llm.scheduler import Scheduler
+from loadtest.fakes import FakeInteraction
+from transit.arrivals import ArrivalService
+from transit.catalog import RouteCatalog, StopCatalog
+from transit.client import TTCClient
+from transit.journeys import JourneyPlanner
+from transit.passengers import PassengerStats
+from transit.shared import CacheStore, LocalCache, RemoteCache, SharedCacheServer
+
+DEFAULT_SCENARIOS = {
+    "stopinfo": 5,
+    "stops": 2,
+    "bus": 2,
+    "buses": 1,
+    "nearby": 2,
+    "route": 1,
+    "autocomplete_stop": 8,
+    "autocomplete_bus": 3,
+    "stats": 0,
+    "ask": 0
+}
+
+
+async def build_bot(gateway, shared=None):
+    config.API_KEY = config.API_KEY or "loadtest"
+    config.PASSENGERS_URL = f"{gateway.base_url}/api/passengers"
+    config.OPENROUTER_BASE_URL = f"{gateway.base_url}/openrouter"
+    config.AI_HISTORY_PATH = ""
+
+    ttc = TTCClient(base_url=f"{gateway.base_url}/pis-gateway/api")
+    stop_catalog, route_catalog = StopCatalog(ttc, shared=shared), RouteCatalog(ttc, shared=shared)
+    bot = types.SimpleNamespace(
+        ttc=ttc,
+        shared=shared,
+        stop_catalog=stop_catalog,
+        route_catalog=route_catalog,
+        journeys=JourneyPlanner(route_catalog, stop_catalog, shared=shared),
+        arrivals=ArrivalService(ttc, shared=shared),
+        passenger_stats=PassengerStats(ttc, shared=shared),
+        llm_scheduler=Scheduler(),
+        llm_router=ModelRouter(),
+        user=types.SimpleNamespace(avatar=types.SimpleNamespace(url="https://example.invalid/avatar.png")),
+        latency=0.05
+    )
+    cogs = {cog.__class__.__name__: cog for cog in (Stop(bot), Stops(bot), Bus(bot), Buses(bot), Nearby(bot), Journey(bot), Stats(bot), AI(bot))}
+    bot.get_cog = cogs.get
+    for cog in cogs.values():
+        await cog.cog_load()
+    return bot, cogs
+
+
+def pick_stop(gateway, rng):
+    # Most traffic goes to a handful of busy stops
+    stops = gateway.stops[:50] if rng.random() < 0.8 else gateway.stops
+    return rng.choice(stops)
+
+
+async def run_scenario(name, cogs, gateway, interaction, rng):
+    if name == "stopinfo":
+        await cogs["Stop"].stopinfo.callback(cogs["Stop"], interaction, pick_stop(gateway, rng)["code"])
+    elif name == "stops":
+        search = rng.choice([None, pick_stop(gateway, rng)["name"].split()[-1]])
+        await cogs["Stops"].stops.callback(cogs["Stops"], interaction, search)
+    elif name == "bus":
+        await cogs["Bus"].Bus.callback(cogs["Bus"], interaction, rng.choice(gateway.routes)["id"])
+    elif name == "buses":
+        search = rng.choice([None, str(rng.randint(1, 9))])
+        await cogs["Buses"].buses.callback(cogs["Buses"], interaction, search)
+    elif name == "nearby":
+        stop = pick_stop(gateway, rng)
+        location = rng.choice([stop["code"], f"{stop['lat'] + rng.uniform(-0.003, 0.003)}, {stop['lon']}"])
+        await cogs["Nearby"].nearby.callback(cogs["Nearby"], interaction, location)
+    elif name == "route":
+        origin, destination = pick_stop(gateway, rng), pick_stop(gateway, rng)
+        await cogs["Journey"].route.callback(cogs["Journey"], interaction, origin["code"], destination["name"])
+    elif name == "autocomplete_stop":
+        name_typed = pick_stop(gateway, rng)["name"]
+        await cogs["Stop"].stop_no_autocomplete(interaction, name_typed[:rng.randint(1, 5)])
+        interaction.answer()
+    elif name == "autocomplete_bus":
+        await cogs["Bus"].bus_id_autocomplete(interaction, str(rng.randint(1, 99)))
+        interaction.answer()
+    elif name == "stats":
+        await cogs["Stats"].stats.callback(cogs["Stats"], interaction)
+    elif name == "ask":
+        await cogs["AI"].ask.callback(cogs["AI"], interaction, "როგორ მივიდე ვაკეში?")
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def sample_loop_lag(samples, interval=0.05):
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, time.perf_counter() - start - interval))
+
+
+async def virtual_user(user_id, cogs, gateway, scenarios, deadline, think, results, seed):
+    rng = random.Random(seed)
+    names, weights = zip(*scenarios.items())
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        interaction = FakeInteraction(user_id, guild_id=user_id % 20, channel_id=user_id % 50)
+        try:
+            await run_scenario(name, cogs, gateway, interaction, rng)
+            ok = not interaction.failed
+        except Exception:
+            ok = False
+        results.append((name, interaction.latency, ok))
+        await asyncio.sleep(rng.expovariate(1 / think) if think else 0)
+
+
+def parse_scenarios(text):
+    scenarios = dict(DEFAULT_SCENARIOS)
+    if text:
+        scenarios = {name: 0 for name in scenarios}
+        for item in text.split(","):
+            name, _, weight = item.partition("=")
+            if name not in scenarios:
+                raise SystemExit(f"Unknown scenario: {name}")
+            scenarios[name] = float(weight or 1)
+    return {name: weight for name, weight in scenarios.items() if weight > 0}
+
+
+def parse_outage(text):
+    if not text:
+        return None
+    start, _, length = text.partition(":")
+    return float(start), float(length)
+
+
+def summarize(results, lag_samples, gateway, elapsed):
+    report = {"elapsed_s": elapsed, "scenarios": {}, "upstream_calls": dict(gateway.calls)}
+    by_name = {}
+    for name, latency, ok in results:
+        by_name.setdefault(name, []).append((latency, ok))
+    by_name["all"] = [(latency, ok) for _, latency, ok in results]
+
+    for name, rows in by_name.items():
+        latencies = [latency for latency, _ in rows]
+        report["scenarios"][name] = {
+            "count": len(rows),
+            "errors": sum(1 for _, ok in rows if not ok),
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+            "max_ms": max(latencies, default=0) * 1000
+        }
+    report["loop_lag"] = {
+        "p50_ms": percentile(lag_samples, 0.50) * 1000,
+        "p99_ms": percentile(lag_samples, 0.99) * 1000,
+        "max_ms": max(lag_samples, default=0) * 1000
+    }
+    return report
+
+
+def print_report(report):
+    print(f"{'scenario':20} {'count':>7} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, row in report["scenarios"].items():
+        print(f"{name:20} {row['count']:7} {row['errors']:7} {row['p50_ms']:9.1f} {row['p95_ms']:9.1f} {row['p99_ms']:9.1f} {row['max_ms']:9.1f}")
+    lag = report["loop_lag"]
+    print(f"\nevent loop lag: p50 {lag['p50_ms']:.1f} ms, p99 {lag['p99_ms']:.1f} ms, max {lag['max_ms']:.1f} ms")
+    total = report["scenarios"].get("all", {}).get("count", 0)
+    print(f"throughput: {total / report['elapsed_s']:.1f} interactions/s")
+    print("\nupstream calls:")
+    for endpoint, count in sorted(report["upstream_calls"].items()):
+        print(f"  {endpoint:32} {count:7}  ({count / report['elapsed_s']:.1f}/s)")
+
+
+async def main_async(args):
+    config.DEBUG = False
+    gateway = await FakeGateway(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        outage=parse_outage(args.outage),
+        outage_mode=args.outage_mode,
+        stops=args.stops,
+        routes=args.routes,
+        arrivals=args.arrivals,
+        llm_latency=args.llm_latency
+    ).start()
+
+    # Several clusters in one process, each with its own client and caches like separate processes would have
+    server, socket_dir, shared = None, None, [None] * args.clusters
+    if args.shared_cache == "memory":
+        store = CacheStore()
+        shared = [LocalCache(store) for _ in range(args.clusters)]
+    elif args.shared_cache == "socket":
+        socket_dir = tempfile.mkdtemp()
+        server = await SharedCacheServer(f"unix:{os.path.join(socket_dir, 'cache.sock')}").start()
+        shared = [RemoteCache(server.url, server.token) for _ in range(args.clusters)]
+    clusters = [await build_bot(gateway, cache) for cache in shared]
+
+    lag_samples = []
+    lag_task = asyncio.create_task(sample_loop_lag(lag_samples))
+
+    try:
+        if not args.cold:
+            for bot, _ in clusters:
+                await asyncio.gather(bot.stop_catalog.ensure_loaded(), bot.route_catalog.ensure_loaded())
+            await asyncio.gather(*(bot.journeys.ensure_loaded() for bot, _ in clusters))
+            gateway.reset()
+
+        scenarios = parse_scenarios(args.scenarios)
+        results = []
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(*(
+            virtual_user(user_id, clusters[user_id % len(clusters)][1], gateway, scenarios, deadline, args.think, results, args.seed + user_id)
+            for user_id in range(args.users)
+        ))
+        return summarize(results, lag_samples, gateway, time.perf_counter() - start)
+    finally:
+        lag_task.cancel()
+        for bot, cogs in clusters:
+            for cog in cogs.values():
+                await cog.cog_unload()
+            await bot.ttc.close()
+            if bot.shared is not None:
+                await bot.shared.close()
+        if server is not None:
+            await server.stop()
+            os.rmdir(socket_dir)
+        await gateway.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=20, help="seconds to run")
+    parser.add_argument("--think", type=float, default=1.0, help="mean think time between a user's commands")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake upstream latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of upstream calls answered 503")
+    parser.add_argument("--outage", help="START:LENGTH seconds into the run during which the gateway fails")
+    parser.add_argument("--outage-mode", choices=("down", "slow"), default="down", help="answer 503 or hang")
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="fake OpenRouter latency in seconds")
+    parser.add_argument("--stops", type=int, default=3000)
+    parser.add_argument("--routes", type=int, default=150)
+    parser.add_argument("--arrivals", type=int, default=20, help="arrivals per stop")
+    parser.add_argument("--scenarios", help="weights, e.g. stopinfo=5,autocomplete_stop=10")
+    parser.add_argument("--clusters", type=int, default=1, help="bot instances splitting the users, like launcher.py clusters")
+    parser.add_argument("--shared-cache", choices=("none", "memory", "socket"), default="none",
+                        help="cache tier the clusters share: none, in-process, or a local socket server")
+    parser.add_argument("--cold", action="store_true", help="do not warm the catalogs first")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", dest="json_path", help="write the report to this file")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(main_async(args))
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import re
+import time
+from bisect import bisect_left
+
+import aiohttp
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def format_labels(names, values, extra=""):
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{format_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        series = self.series.get(key)
+        if series is None:
+            # Per-bucket counts plus +Inf, then sum
+            series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def count(self, key):
+        return sum(self.series[key][0])
+
+    def quantile(self, key, q):
+        """Estimate a quantile from the buckets, interpolating inside a bucket."""
+        counts = self.series[key][0]
+        total = sum(counts)
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for i, count in enumerate(counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, help_text, labels=()):
+        metric = Counter(name, help_text, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help_text, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+command_latency = REGISTRY.histogram(
+    "bot_command_latency_seconds", "Time from interaction creation until the command handler finished", ("command",)
+)
+command_errors = REGISTRY.counter("bot_command_errors_total", "App command errors", ("command",))
+upstream_latency = REGISTRY.histogram(
+    "bot_upstream_latency_seconds", "Upstream HTTP request latency", ("endpoint", "status")
+)
+cache_requests = REGISTRY.counter("bot_cache_requests_total", "Cache lookups", ("cache", "result"))
+llm_queue_wait = REGISTRY.histogram(
+    "bot_llm_queue_wait_seconds", "Time OpenRouter requests waited for a scheduler slot", ("priority",)
+)
+circuit_transitions = REGISTRY.counter(
+    "bot_upstream_circuit_transitions_total", "Upstream circuit breaker state changes", ("endpoint", "state")
+)
+stale_served = REGISTRY.counter("bot_stale_served_total", "Last good responses served in place of fresh ones", ("cache", "reason"))
+llm_tool_calls = REGISTRY.counter("bot_llm_tool_calls_total", "Tool calls made by the /ask model", ("tool", "result"))
+loop_lag = REGISTRY.histogram(
+    "bot_event_loop_lag_seconds", "Event loop scheduling delay",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+)
+
+UPSTREAMS = {
+    "transit.ttc.com.ge": "ttc_gateway",
+    "ttc.com.ge": "ttc_passengers",
+    "openrouter.ai": "openrouter"
+}
+_ID_SEGMENT = re.compile(r"/(?:\d+|[^/]*:[^/]*)(?=/|$)")
+
+
+def endpoint_name(url):
+    """Label for an upstream URL with ids collapsed, e.g. `ttc_gateway /api/v2/stops/{id}`."""
+    upstream = UPSTREAMS.get(url.host, url.host)
+    return f"{upstream} {_ID_SEGMENT.sub('/{id}', url.path)}"
+
+
+def record_cache(cache, hit):
+    cache_requests.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def trace_config():
+    """aiohttp tracing hooks that record every request of a session."""
+    async def on_request_start(session, context, params):
+        context.start = time.perf_counter()
+
+    async def on_request_end(session, context, params):
+        upstream_latency.observe(
+            time.perf_counter() - context.start, endpoint=endpoint_name(params.url), status=params.response.status
+        )
+
+    async def on_request_exception(session, context, params):
+        upstream_latency.observe(
+            time.perf_counter() - context.start, endpoint=endpoint_name(params.url), status=type(params.exception).__name__
+        )
+
+    config = aiohttp.TraceConfig()
+    config.on_request_start.append(on_request_start)
+    config.on_request_end.append(on_request_end)
+    config.on_request_exception.append(on_request_exception)
+    return config
+
+
+async def monitor_loop_lag(interval=0.5):
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        loop_lag.observe(max(0.0, time.perf_counter() - start - interval))
+
+
+async def start_http_server(host, port):
+    """Serve the registry in Prometheus text format on /metrics."""
+    async def handle(request):
+        return web.Response(text=REGISTRY.render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Metrics listening on http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import time
+
+import config
+import metrics
+from transit.cache import SingleFlight, TTLCache
+from transit.client import TTCError, failure_reason
+
+logger = logging.getLogger(__name__)
+
+MINUTE_FIELDS = ('realtimeArrivalMinutes', 'scheduledArrivalMinutes')
+
+
+class ArrivalSnapshot:
+    __slots__ = ('stop_code', 'stop', 'arrivals', 'fetched_at', 'stale')
+
+    def __init__(self, stop_code, stop, arrivals, fetched_at=None, stale=False):
+        self.stop_code = stop_code
+        self.stop = stop
+        self.arrivals = arrivals
+        self.fetched_at = fetched_at or time.time()
+        # Served from the last good response because the gateway did not answer
+        self.stale = stale
+
+    @property
+    def age(self):
+        return max(0, time.time() - self.fetched_at)
+
+    def extrapolated(self):
+        """A stale copy with every arrival counted down by the minutes since the fetch.
+
+        Buses whose countdown ran out have most likely left and are dropped.
+        """
+        elapsed = int(self.age // 60)
+        arrivals = []
+        for arrival in self.arrivals or []:
+            arrival = dict(arrival)
+            for field in MINUTE_FIELDS:
+                if isinstance(arrival.get(field), (int, float)):
+                    arrival[field] -= elapsed
+            minutes = arrival.get(MINUTE_FIELDS[0], arrival.get(MINUTE_FIELDS[1]))
+            if isinstance(minutes, (int, float)) and minutes < 0:
+                continue
+            arrivals.append(arrival)
+        return ArrivalSnapshot(self.stop_code, self.stop, arrivals, self.fetched_at, stale=True)
+
+
+class ArrivalService:
+    """Arrival times and stop details shared by every command.
+
+    Concurrent requests for the same stop share one upstream call, and the
+    result is kept for ARRIVALS_CACHE_TTL seconds, so a popular stop costs
+    one gateway call per window no matter how many people ask.
+
+    The last good snapshot of a stop is kept for ARRIVALS_STALE_TTL longer.
+    When the gateway fails, or takes more than ARRIVALS_REVALIDATE_WAIT to
+    answer, that snapshot is served instead with its countdowns moved on,
+    while the fetch keeps going in the background for the next caller.
+
+    With a `shared` cache the clusters also share fetches, a stop costs one
+    gateway call per window across all of them.
+    """
+
+    def __init__(self, client, ttl=None, shared=None):
+        self.client = client
+        self.shared = shared
+        self.arrivals = TTLCache(ttl or config.ARRIVALS_CACHE_TTL, name="arrivals", stale_ttl=config.ARRIVALS_STALE_TTL)
+        self.stop_details = TTLCache(config.STOP_DETAIL_TTL, name="stop_details", stale_ttl=config.STOP_DETAIL_STALE_TTL)
+        self.inflight = SingleFlight()
+
+    async def get_stop(self, stop_code):
+        stop = self.stop_details.get(stop_code)
+        if stop is None:
+            try:
+                stop = await self.inflight.do(('stop', stop_code), lambda: self.shared_load(
+                    f"stop:{stop_code}", self.stop_details.ttl, lambda: self.client.get_stop(stop_code)
+                ))
+            except TTCError as e:
+                stop = self.stop_details.get_stale(stop_code)
+                if stop is None:
+                    raise
+                metrics.stale_served.inc(cache="stop_details", reason=failure_reason(e))
+                return stop
+            self.stop_details.set(stop_code, stop)
+        return stop
+
+    async def get(self, stop_code) -> ArrivalSnapshot:
+        snapshot = self.arrivals.get(stop_code)
+        if snapshot is not None:
+            return snapshot
+
+        refresh = self.inflight.do(('arrivals', stop_code), lambda: self.fetch(stop_code))
+        last = self.arrivals.get_stale(stop_code)
+        if last is None:
+            return await refresh
+        try:
+            return await asyncio.wait_for(refresh, config.ARRIVALS_REVALIDATE_WAIT)
+        except (TTCError, asyncio.TimeoutError) as e:
+            logger.debug(f"Serving {int(last.age)}s old arrivals for {stop_code}: {e!r}")
+            metrics.stale_served.inc(cache="arrivals", reason=failure_reason(e))
+            return last.extrapolated()
+
+    async def fetch(self, stop_code):
+        snapshot = await self.shared_load(f"arrivals:{stop_code}", self.arrivals.ttl, lambda: self.fetch_upstream(stop_code))
+        # Fetched by another cluster a moment ago: only cache it for what is left of the window
+        self.arrivals.set(stop_code, snapshot, self.arrivals.ttl - snapshot.age)
+        return snapshot
+
+    async def fetch_upstream(self, stop_code):
+        stop, arrivals = await asyncio.gather(
+            self.get_stop(stop_code),
+            self.client.get_arrivals(stop_code)
+        )
+        return ArrivalSnapshot(stop_code, stop, arrivals)
+
+    async def shared_load(self, key, ttl, factory):
+        if self.shared is None:
+            return await factory()
+        return await self.shared.load(key, ttl, factory)
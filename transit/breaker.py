@@ -0,0 +1,67 @@
+import logging
+import time
+
+import config
+import metrics
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+class CircuitBreaker:
+    """Failure state of one upstream endpoint.
+
+    After TTC_BREAKER_FAILURES failed attempts in a row the breaker opens
+    and callers fail fast instead of queueing on a sick gateway. Nothing
+    user-facing ever tests the water: the client probes an open endpoint
+    in the background, half-open while the probe runs, and closes the
+    breaker on the first healthy answer. Each failed probe doubles the
+    wait before the next one, up to TTC_BREAKER_MAX_COOLDOWN.
+    """
+
+    def __init__(self, name, threshold=None, cooldown=None, max_cooldown=None):
+        self.name = name
+        self.threshold = threshold or config.TTC_BREAKER_FAILURES
+        self.base_cooldown = self.cooldown = cooldown or config.TTC_BREAKER_COOLDOWN
+        self.max_cooldown = max_cooldown or config.TTC_BREAKER_MAX_COOLDOWN
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def closed(self):
+        return self.state == CLOSED
+
+    def success(self):
+        self.failures = 0
+        if self.state != CLOSED:
+            self.cooldown = self.base_cooldown
+            self.opened_at = None
+            self.transition(CLOSED)
+
+    def failure(self):
+        """Count a failed attempt; True when this one opened the breaker."""
+        self.failures += 1
+        if self.state == CLOSED and self.failures >= self.threshold:
+            self.opened_at = time.time()
+            self.transition(OPEN)
+            return True
+        return False
+
+    def half_open(self):
+        self.transition(HALF_OPEN)
+
+    def reopen(self):
+        self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+        self.transition(OPEN)
+
+    def transition(self, state):
+        if state == self.state:
+            return
+        self.state = state
+        metrics.circuit_transitions.inc(endpoint=self.name, state=state)
+        if state == OPEN:
+            logger.warning(f"Circuit for {self.name} open after {self.failures} failures, next probe in {self.cooldown}s")
+        elif state == CLOSED:
+            logger.info(f"Circuit for {self.name} closed")
@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+import metrics
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one in-flight call."""
+
+    def __init__(self):
+        self.calls = {}
+
+    async def do(self, key, factory):
+        future = self.calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(factory())
+            self.calls[key] = future
+            future.add_done_callback(lambda _: self.done(key, future))
+        # Shield so one cancelled waiter does not cancel the call for everyone
+        return await asyncio.shield(future)
+
+    def done(self, key, future):
+        self.calls.pop(key, None)
+        # Every waiter may have given up already; retrieve the error so it is not logged as lost
+        if not future.cancelled():
+            future.exception()
+
+
+class TTLCache:
+    """Small dict cache whose entries expire `ttl` seconds after insertion.
+
+    Expired entries are kept for another `stale_ttl` seconds, invisible to
+    `get` but still there for `get_stale` to fall back on.
+    """
+
+    def __init__(self, ttl, max_size=4096, name=None, stale_ttl=0):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.name = name
+        self.max_size = max_size
+        self.data = {}
+
+    def get(self, key):
+        item = self.lookup(key)
+        if item is not None and item[0] < time.monotonic():
+            item = None
+        if self.name:
+            metrics.record_cache(self.name, item is not None)
+        return item[1] if item is not None else None
+
+    def get_stale(self, key):
+        """The value for `key` even if it expired, as long as it is still kept."""
+        item = self.lookup(key)
+        return item[1] if item is not None else None
+
+    def lookup(self, key):
+        item = self.data.get(key)
+        if item is not None and item[0] + self.stale_ttl < time.monotonic():
+            del self.data[key]
+            item = None
+        return item
+
+    def set(self, key, value, ttl=None):
+        if len(self.data) >= self.max_size:
+            self.prune()
+        self.data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+
+    def prune(self):
+        now = time.monotonic()
+        for key in [key for key, (expires_at, _) in self.data.items() if expires_at + self.stale_ttl < now]:
+            del self.data[key]
+        # Still full of live entries: drop the oldest insertions
+        while len(self.data) >= self.max_size:
+            del self.data[next(iter(self.data))]
@@ -0,0 +1,319 @@
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+
+import config
+import metrics
+from transit.cache import SingleFlight, TTLCache
+from transit.client import TTCError, failure_reason
+from transit.geo import GridIndex
+from transit.search import SearchIndex
+
+logger = logging.getLogger(__name__)
+
+
+class Catalog(ABC):
+    """Base for process-wide copies of slow-changing gateway lists.
+
+    Loaded once at startup and refreshed in the background. A refresh builds
+    the new list and lookup tables first and then swaps them in with a single
+    assignment, so readers never see a half-built catalog. With a `shared`
+    cache, one cluster refreshes and the others adopt its state.
+    """
+
+    snapshot_name = None
+
+    def __init__(self, client, refresh_interval, snapshot=None, shared=None):
+        self.client = client
+        self.refresh_interval = refresh_interval
+        self.snapshot = snapshot
+        self.shared = shared
+        self.updated_at = None
+        self.task = None
+        self.loading = None
+
+    @property
+    def loaded(self):
+        return self.updated_at is not None
+
+    @abstractmethod
+    async def refresh(self):
+        """Fetch and swap in a new copy, setting `updated_at`."""
+
+    @abstractmethod
+    def dump_state(self):
+        """Picklable state for the snapshot and the shared cache."""
+
+    @abstractmethod
+    def load_state(self, state):
+        """Swap in state from `dump_state`."""
+
+    def restore(self):
+        """Serve the last snapshot until the first refresh completes."""
+        if self.snapshot is None or self.loaded:
+            return
+        restored = self.snapshot.load(self.snapshot_name)
+        if restored:
+            state, saved_at = restored
+            self.load_state(state)
+            self.updated_at = saved_at
+            logger.info(f"{type(self).__name__} restored from snapshot ({int(time.time() - saved_at)}s old)")
+
+    async def save(self):
+        if self.snapshot is None:
+            return
+        try:
+            await asyncio.to_thread(self.snapshot.save, self.snapshot_name, self.dump_state())
+        except Exception as e:
+            logger.warning(f"{type(self).__name__} snapshot failed: {e}")
+
+    async def update(self):
+        """Refresh, or adopt a refresh another cluster made within the interval.
+
+        True when this process did the refresh itself.
+        """
+        if self.shared is None:
+            await self.refresh()
+            return True
+
+        refreshed = False
+
+        async def refresh():
+            nonlocal refreshed
+            await self.refresh()
+            refreshed = True
+            return self.dump_state(), self.updated_at
+
+        state, updated_at = await self.shared.load(
+            f"catalog:{self.snapshot_name}", self.refresh_interval, refresh, config.SHARED_CATALOG_WAIT, offload=True
+        )
+        if not refreshed and (self.updated_at is None or updated_at > self.updated_at):
+            self.load_state(state)
+            self.updated_at = updated_at
+        return refreshed
+
+    async def shared_load(self, key, ttl, factory):
+        if self.shared is None:
+            return await factory()
+        return await self.shared.load(key, ttl, factory)
+
+    async def ensure_loaded(self):
+        if self.loaded:
+            return
+        # Concurrent callers share the same initial load
+        if self.loading is None or self.loading.done():
+            self.loading = asyncio.ensure_future(self.update())
+        return await asyncio.shield(self.loading)
+
+    def start(self):
+        self.restore()
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.refresh_loop())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+    async def refresh_loop(self):
+        retry = config.CATALOG_RETRY_INTERVAL
+        while True:
+            try:
+                if self.loaded:
+                    refreshed = await self.update()
+                else:
+                    refreshed = await self.ensure_loaded()
+                # Whoever refreshed has the snapshot to save
+                if refreshed:
+                    await self.save()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"{type(self).__name__} refresh failed, retrying in {retry}s: {e}")
+                # Retry sooner, even with a restored snapshot to serve: it may be days old
+                await asyncio.sleep(retry)
+                retry = min(retry * 2, self.refresh_interval)
+                continue
+            retry = config.CATALOG_RETRY_INTERVAL
+            await asyncio.sleep(self.refresh_interval)
+
+
+class StopCatalog(Catalog):
+    """The `v2/stops` list with O(1) lookup by code and a spatial index."""
+
+    snapshot_name = 'stops'
+
+    def __init__(self, client, refresh_interval=None, snapshot=None, shared=None):
+        super().__init__(client, refresh_interval or config.STOP_CATALOG_REFRESH, snapshot, shared)
+        self.stops = []
+        self.by_code = {}
+        self.by_name = {}
+        self.index = SearchIndex([], ('code', 'name'))
+        self.spatial = GridIndex([])
+
+    def get(self, code):
+        return self.by_code.get(code)
+
+    def find(self, code_or_name):
+        return self.by_code.get(code_or_name) or self.by_name.get(code_or_name)
+
+    def search(self, query, limit=25):
+        return self.index.search(query, limit)
+
+    def nearest(self, lat, lon, k=5, max_distance=None):
+        return self.spatial.nearest(lat, lon, k, max_distance)
+
+    async def refresh(self):
+        data = await self.client.get_stops()
+        stops = [stop for stop in data if stop.get('code') and stop.get('name')]
+        self.apply(stops, SearchIndex(stops, ('code', 'name')))
+        self.updated_at = time.time()
+        logger.info(f"Stop catalog refreshed ({len(stops)} stops)")
+
+    def apply(self, stops, index):
+        by_code = {stop['code']: stop for stop in stops}
+        by_name = {}
+        for stop in stops:
+            by_name.setdefault(stop['name'], stop)
+        spatial = GridIndex(stops)
+        self.stops, self.by_code, self.by_name, self.index, self.spatial = stops, by_code, by_name, index, spatial
+
+    def dump_state(self):
+        return {'stops': self.stops, 'index': self.index}
+
+    def load_state(self, state):
+        self.apply(state['stops'], state['index'])
+
+
+class CacheEntry:
+    __slots__ = ('data', 'fetched_at', 'etag', 'last_modified')
+
+    def __init__(self, data, etag=None, last_modified=None):
+        self.data = data
+        self.fetched_at = time.time()
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @property
+    def age(self):
+        return time.time() - self.fetched_at
+
+
+class RouteCatalog(Catalog):
+    """The `v3/routes` list plus per-pattern route stops.
+
+    Route topology changes about once a day, so everything here is kept for
+    a long time and revalidated with ETag/If-Modified-Since instead of being
+    downloaded again. Directions are fetched lazily the first time someone
+    asks for them.
+    """
+
+    snapshot_name = 'routes'
+
+    def __init__(self, client, refresh_interval=None, stops_ttl=None, snapshot=None, shared=None):
+        super().__init__(client, refresh_interval or config.ROUTE_CATALOG_REFRESH, snapshot, shared)
+        self.stops_ttl = stops_ttl or config.ROUTE_STOPS_TTL
+        self.routes = []
+        self.by_id = {}
+        self.index = SearchIndex([], ('shortName', 'longName'))
+        self.entry = None
+        self.route_details = {}
+        self.route_stops = {}
+        # Routes whose patterns just failed to load, served the default direction meanwhile
+        self.pattern_failures = TTLCache(config.ROUTE_PATTERNS_RETRY)
+        self.inflight = SingleFlight()
+
+    def get(self, route_id):
+        return self.by_id.get(route_id)
+
+    def search(self, query, limit=25):
+        return self.index.search(query, limit)
+
+    async def refresh(self):
+        entry = await self.revalidate(self.entry, "v3/routes", {"modes": "BUS"})
+        if entry is self.entry and self.loaded:
+            self.updated_at = time.time()
+            return
+
+        routes = [route for route in entry.data if route.get('id')]
+        self.apply(entry, routes, SearchIndex(routes, ('shortName', 'longName')))
+        self.updated_at = time.time()
+        logger.info(f"Route catalog refreshed ({len(routes)} routes)")
+
+    def apply(self, entry, routes, index):
+        by_id = {route['id']: route for route in routes}
+        self.entry, self.routes, self.by_id, self.index = entry, routes, by_id, index
+
+    def dump_state(self):
+        return {
+            'entry': self.entry,
+            'routes': self.routes,
+            'index': self.index,
+            'route_details': dict(self.route_details),
+            'route_stops': dict(self.route_stops)
+        }
+
+    def load_state(self, state):
+        self.apply(state['entry'], state['routes'], state['index'])
+        self.route_details.update(state['route_details'])
+        self.route_stops.update(state['route_stops'])
+
+    async def revalidate(self, entry, path, params=None):
+        """Return `entry` if the gateway says it is still current, else a new entry."""
+        if entry is None:
+            data, etag, last_modified = await self.client.get_conditional(path, params)
+            return CacheEntry(data, etag, last_modified)
+
+        data, etag, last_modified = await self.client.get_conditional(path, params, entry.etag, entry.last_modified)
+        if data is None:
+            entry.fetched_at = time.time()
+            return entry
+        return CacheEntry(data, etag, last_modified)
+
+    async def cached(self, cache, key, path, params=None):
+        entry = cache.get(key)
+        fresh = entry is not None and entry.age <= self.stops_ttl
+        metrics.record_cache("route_stops" if cache is self.route_stops else "route_details", fresh)
+        if not fresh:
+            try:
+                entry = await self.inflight.do((path, key), lambda: self.shared_load(
+                    f"route:{path}:{params}", self.stops_ttl, lambda: self.revalidate(entry, path, params)
+                ))
+            except TTCError as e:
+                # Topology rarely changes, an old copy beats an error
+                if entry is None:
+                    raise
+                metrics.stale_served.inc(cache="route_stops" if cache is self.route_stops else "route_details", reason=failure_reason(e))
+                return entry.data
+            cache[key] = entry
+        return entry.data
+
+    async def get_patterns(self, route_id):
+        """Return the pattern suffixes (directions) of a route, the default one if they cannot be loaded."""
+        if self.pattern_failures.get(route_id):
+            return [config.DEFAULT_PATTERN_SUFFIX]
+        try:
+            return await self.load_patterns(route_id)
+        except Exception as e:
+            logger.warning(f"Could not load patterns for route {route_id}, retrying in {config.ROUTE_PATTERNS_RETRY}s: {e}")
+            self.pattern_failures.set(route_id, True)
+            return [config.DEFAULT_PATTERN_SUFFIX]
+
+    async def load_patterns(self, route_id):
+        """Like `get_patterns`, but raises when the route cannot be loaded."""
+        route = await self.cached(self.route_details, route_id, f"v3/routes/{route_id}")
+        patterns = [pattern.get('patternSuffix') or pattern.get('suffix') for pattern in (route or {}).get('patterns', [])]
+        patterns = [suffix for suffix in patterns if suffix]
+        # Keep the direction /bus always showed first
+        patterns.sort(key=lambda suffix: suffix != config.DEFAULT_PATTERN_SUFFIX)
+        return patterns or [config.DEFAULT_PATTERN_SUFFIX]
+
+    async def get_stops(self, route_id, pattern_suffix=None):
+        pattern_suffix = pattern_suffix or config.DEFAULT_PATTERN_SUFFIX
+        return await self.cached(
+            self.route_stops,
+            (route_id, pattern_suffix),
+            f"v3/routes/{route_id}/stops",
+            {"patternSuffix": pattern_suffix}
+        )
@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import random
+
+import aiohttp
+from yarl import URL
+
+import config
+import metrics
+from transit.breaker import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+
+class TTCError(Exception):
+    def __init__(self, status, url):
+        super().__init__(f"TTC API error {status}: {url}")
+        self.status = status
+        self.url = url
+
+
+class CircuitOpenError(TTCError):
+    """The endpoint's circuit is open, the request was never sent."""
+
+    def __init__(self, url):
+        super().__init__("circuit open", url)
+
+
+class InvalidResponseError(TTCError):
+    """The gateway answered 200 with a body that is not JSON."""
+
+    def __init__(self, url):
+        super().__init__("invalid response", url)
+
+
+def failure_reason(error):
+    """Metric label for why a fresh response was not available."""
+    if isinstance(error, asyncio.TimeoutError):
+        return "slow"
+    if isinstance(error, InvalidResponseError):
+        return "invalid"
+    return "circuit_open" if isinstance(error, CircuitOpenError) else "error"
+
+
+class TTCClient:
+    """Shared async client for the TTC pis-gateway API.
+
+    One pooled aiohttp session is used by every cog, so connections and DNS
+    lookups are reused instead of blocking the event loop with `requests`.
+    Every endpoint has its own circuit breaker, so an outage of one part
+    of the gateway fails fast instead of tying up the rest.
+    """
+
+    def __init__(self, api_key=None, base_url=None):
+        self.api_key = api_key or config.API_KEY
+        self.base_url = (base_url or config.TTC_BASE_URL).rstrip("/")
+        self.session = None
+        self.breakers = {}
+        self.probes = {}
+
+    async def start(self):
+        if self.session and not self.session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=config.TTC_MAX_CONNECTIONS,
+            limit_per_host=config.TTC_MAX_CONNECTIONS_PER_HOST,
+            ttl_dns_cache=300,
+            keepalive_timeout=30
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            headers={"X-Api-Key": self.api_key or ""},
+            timeout=aiohttp.ClientTimeout(total=config.TTC_TIMEOUT, connect=config.TTC_CONNECT_TIMEOUT),
+            trace_configs=[metrics.trace_config()]
+        )
+
+    async def close(self):
+        for task in self.probes.values():
+            task.cancel()
+        self.probes.clear()
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    async def request(self, path: str, params: dict = None, headers: dict = None):
+        """Return `(status, data, response headers)` for a 200 or 304 response.
+
+        `path` is relative to the gateway base URL unless it is a full URL.
+        """
+        await self.start()
+        if path.startswith("http"):
+            url = path
+        else:
+            url = f"{self.base_url}/{path.lstrip('/')}"
+            params = {"locale": config.LANG, **(params or {})}
+
+        breaker = self.breaker(url)
+        for attempt in range(config.TTC_RETRIES + 1):
+            # Also checked between retries, other requests may have opened it meanwhile
+            if not breaker.closed:
+                raise CircuitOpenError(url)
+            try:
+                async with self.session.get(url, params=params, headers=headers) as response:
+                    if response.status == 304:
+                        breaker.success()
+                        return response.status, None, response.headers
+                    if response.status == 200:
+                        try:
+                            data = await response.json(content_type=None)
+                        except ValueError:
+                            # An HTML error page or a cut-off body, as bad as a 5xx
+                            error = InvalidResponseError(url)
+                        else:
+                            breaker.success()
+                            return response.status, data, response.headers
+                    else:
+                        error = TTCError(response.status, url)
+                        # Only rate limits and server errors are worth retrying
+                        if not self.retryable(response.status):
+                            breaker.success()
+                            raise error
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+
+            if breaker.failure():
+                self.probes[breaker.name] = asyncio.create_task(self.probe(breaker, url, params))
+            if attempt == config.TTC_RETRIES:
+                break
+            delay = random.uniform(0, config.TTC_RETRY_BACKOFF * 2 ** attempt)
+            logger.warning(f"TTC request failed ({error}), retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+        if isinstance(error, TTCError):
+            raise error
+        raise TTCError(type(error).__name__, url) from error
+
+    def breaker(self, url):
+        name = metrics.endpoint_name(URL(url))
+        breaker = self.breakers.get(name)
+        if breaker is None:
+            breaker = self.breakers[name] = CircuitBreaker(name)
+        return breaker
+
+    def retryable(self, status):
+        return status == 429 or status >= 500
+
+    async def probe(self, breaker, url, params):
+        """Retry the request that opened `breaker` until the endpoint answers."""
+        try:
+            while True:
+                await asyncio.sleep(breaker.cooldown)
+                # A request that was already in flight may have closed it
+                if breaker.closed:
+                    return
+                breaker.half_open()
+                try:
+                    await self.start()
+                    timeout = aiohttp.ClientTimeout(total=config.TTC_PROBE_TIMEOUT)
+                    async with self.session.get(url, params=params, timeout=timeout) as response:
+                        healthy = not self.retryable(response.status)
+                        if response.status == 200:
+                            await response.json(content_type=None)
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                    healthy = False
+                if healthy:
+                    breaker.success()
+                    return
+                breaker.reopen()
+        finally:
+            if self.probes.get(breaker.name) is asyncio.current_task():
+                del self.probes[breaker.name]
+
+    async def get_json(self, path: str, params: dict = None):
+        _, data, _ = await self.request(path, params)
+        return data
+
+    async def get_conditional(self, path: str, params: dict = None, etag: str = None, last_modified: str = None):
+        """Revalidate a cached response.
+
+        Returns `(data, etag, last_modified)`; `data` is None when the gateway
+        answered 304 and the cached copy is still current.
+        """
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        _, data, response_headers = await self.request(path, params, headers)
+        return data, response_headers.get("ETag", etag), response_headers.get("Last-Modified", last_modified)
+
+    async def get_stops(self) -> list:
+        return await self.get_json("v2/stops")
+
+    async def get_stop(self, stop_code: str) -> dict:
+        return await self.get_json(f"v2/stops/1:{stop_code}")
+
+    async def get_arrivals(self, stop_code: str) -> list:
+        return await self.get_json(f"v2/stops/1:{stop_code}/arrival-times")
+
+    async def get_routes(self, modes: str = "BUS") -> list:
+        return await self.get_json("v3/routes", {"modes": modes})
+
+    async def get_route(self, route_id: str) -> dict:
+        return await self.get_json(f"v3/routes/{route_id}")
+
+    async def get_route_stops(self, route_id: str, pattern_suffix: str = "1:01") -> list:
+        return await self.get_json(f"v3/routes/{route_id}/stops", {"patternSuffix": pattern_suffix})
+
+    async def get_passengers(self) -> dict:
+        return await self.get_json(config.PASSENGERS_URL)
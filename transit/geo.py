@@ -0,0 +1,128 @@
+import heapq
+import math
+import re
+
+import config
+
+EARTH_RADIUS = 6371000  # meters
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS / 180
+
+# Two decimal numbers separated by a comma: "41.7151, 44.8271", "?q=41.7,44.8", "@41.7,44.8,15z"
+_COORDINATES = re.compile(r"(-?\d{1,2}\.\d+)\s*,\s*(-?\d{1,3}\.\d+)")
+
+
+def parse_coordinates(text):
+    """`(lat, lon)` from pasted coordinates or a map link, or None."""
+    match = _COORDINATES.search(text or "")
+    if not match:
+        return None
+    lat, lon = float(match.group(1)), float(match.group(2))
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+
+def meters_between(lat1, lon1, lat2, lon2):
+    """Straight-line distance in meters, equirectangular (fine within a city)."""
+    x = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return EARTH_RADIUS * math.hypot(x, y)
+
+
+def walking_minutes(distance):
+    """Rough walking time for a straight-line distance, streets are never straight."""
+    return distance * config.WALKING_DETOUR / config.WALKING_SPEED / 60
+
+
+class GridIndex:
+    """Nearest-neighbour lookups over points with `lat`/`lon` fields.
+
+    Points are projected onto a flat plane around their mean latitude
+    (plenty accurate across one city) and bucketed into square cells of
+    `cell_size` meters. A query scans rings of cells outwards from its own
+    and stops once no unscanned cell can hold anything closer than the
+    k-th best so far, so it touches a few dozen points instead of all.
+    """
+
+    def __init__(self, items, cell_size=None):
+        self.cell_size = cell_size or config.NEARBY_GRID_CELL
+        self.items = [item for item in items if item.get('lat') is not None and item.get('lon') is not None]
+        lat0 = sum(item['lat'] for item in self.items) / len(self.items) if self.items else 0.0
+        self.x_scale = METERS_PER_DEGREE * math.cos(math.radians(lat0))
+        self.y_scale = METERS_PER_DEGREE
+        self.points = [self.project(item['lat'], item['lon']) for item in self.items]
+        self.cells = {}
+        for doc_id, (x, y) in enumerate(self.points):
+            self.cells.setdefault(self.cell(x, y), []).append(doc_id)
+        self.cells = {key: tuple(ids) for key, ids in self.cells.items()}
+        if self.cells:
+            columns = [key[0] for key in self.cells]
+            rows = [key[1] for key in self.cells]
+            self.bounds = (min(columns), max(columns), min(rows), max(rows))
+        else:
+            self.bounds = (0, 0, 0, 0)
+
+    def __len__(self):
+        return len(self.items)
+
+    def project(self, lat, lon):
+        return lon * self.x_scale, lat * self.y_scale
+
+    def cell(self, x, y):
+        return int(math.floor(x / self.cell_size)), int(math.floor(y / self.cell_size))
+
+    def ring(self, cx, cy, radius):
+        if radius == 0:
+            yield cx, cy
+            return
+        for dx in range(-radius, radius + 1):
+            yield cx + dx, cy - radius
+            yield cx + dx, cy + radius
+        for dy in range(-radius + 1, radius):
+            yield cx - radius, cy + dy
+            yield cx + radius, cy + dy
+
+    def nearest(self, lat, lon, k=5, max_distance=None):
+        """Up to `k` `(distance_m, item)` pairs, closest first."""
+        if not self.items or k <= 0:
+            return []
+        max_distance = max_distance or config.NEARBY_MAX_DISTANCE
+        x, y = self.project(lat, lon)
+        cx, cy = self.cell(x, y)
+        # No point in scanning past the edge of the indexed area
+        min_col, max_col, min_row, max_row = self.bounds
+        edge = max(cx - min_col, max_col - cx, cy - min_row, max_row - cy, 0)
+        max_radius = min(edge, int(max_distance / self.cell_size) + 1)
+
+        best = []  # max-heap of (-distance, doc_id)
+        for radius in range(max_radius + 1):
+            # Anything in this ring or beyond is at least this far away
+            if len(best) == k and (radius - 1) * self.cell_size > -best[0][0]:
+                break
+            for key in self.ring(cx, cy, radius):
+                for doc_id in self.cells.get(key, ()):
+                    px, py = self.points[doc_id]
+                    distance = math.hypot(px - x, py - y)
+                    if distance > max_distance:
+                        continue
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, doc_id))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, doc_id))
+        return [(-negative, self.items[doc_id]) for negative, doc_id in sorted(best, reverse=True)]
+
+    def within(self, lat, lon, radius):
+        """All `(distance_m, item)` pairs within `radius` meters, closest first."""
+        x, y = self.project(lat, lon)
+        cx, cy = self.cell(x, y)
+        reach = int(radius / self.cell_size) + 1
+        found = []
+        for dx in range(-reach, reach + 1):
+            for dy in range(-reach, reach + 1):
+                for doc_id in self.cells.get((cx + dx, cy + dy), ()):
+                    px, py = self.points[doc_id]
+                    meters = math.hypot(px - x, py - y)
+                    if meters <= radius:
+                        found.append((meters, doc_id))
+        found.sort()
+        return [(meters, self.items[doc_id]) for meters, doc_id in found]
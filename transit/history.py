@@ -0,0 +1,173 @@
+import json
+import logging
+import os
+import sqlite3
+from array import array
+from bisect import bisect_left, bisect_right
+
+import config
+
+logger = logging.getLogger(__name__)
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+
+class Series:
+    """Sorted timestamps plus one int64 array per transport mode.
+
+    Columns stay aligned with `times`; a mode that first shows up later is
+    back-filled with zeros.
+    """
+
+    def __init__(self):
+        self.times = array('q')
+        self.columns = {}
+
+    def __len__(self):
+        return len(self.times)
+
+    def put(self, ts, counts, replace_last=False):
+        """Append a row, or overwrite the last one if it has the same timestamp."""
+        replace = replace_last and self.times and self.times[-1] == ts
+        if not replace:
+            self.times.append(ts)
+        for mode in counts:
+            if mode not in self.columns:
+                self.columns[mode] = array('q', [0]) * (len(self.times) - (0 if replace else 1))
+        for mode, column in self.columns.items():
+            value = int(counts.get(mode, 0))
+            if replace:
+                column[-1] = value
+            else:
+                column.append(value)
+
+    def row(self, index):
+        return {mode: column[index] for mode, column in self.columns.items()}
+
+    def at(self, ts):
+        """Index of the last row at or before `ts`, or -1."""
+        return bisect_right(self.times, ts) - 1
+
+    def since(self, ts):
+        """Index of the first row at or after `ts`."""
+        return bisect_left(self.times, ts)
+
+    def trim(self, before):
+        index = self.since(before)
+        if index:
+            del self.times[:index]
+            for column in self.columns.values():
+                del column[:index]
+
+
+class PassengerHistory:
+    """Time series of `transactionsByTransportTypes` samples.
+
+    The passengers API reports running totals for the current day, so the
+    hourly and daily rollups keep the last sample seen in each bucket; a
+    daily row is that day's total. Raw samples and hourly rollups are
+    pruned after their retention, daily rollups are kept.
+
+    Rows are mirrored to an SQLite table with INSERT OR REPLACE, which makes
+    each sample an append plus two upserts of the open rollup buckets.
+    """
+
+    RESOLUTIONS = {'raw': None, 'hour': HOUR, 'day': DAY}
+
+    def __init__(self, path=None, utc_offset=None):
+        self.path = config.PASSENGER_HISTORY_PATH if path is None else path
+        self.utc_offset = config.STATS_UTC_OFFSET if utc_offset is None else utc_offset
+        self.retention = {'raw': config.PASSENGER_RAW_RETENTION, 'hour': config.PASSENGER_HOURLY_RETENTION}
+        self.series = {name: Series() for name in self.RESOLUTIONS}
+        if self.path:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self.connect() as db:
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS passenger_history ("
+                    "resolution TEXT, ts INTEGER, counts TEXT, PRIMARY KEY (resolution, ts)) WITHOUT ROWID"
+                )
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    @property
+    def raw(self):
+        return self.series['raw']
+
+    @property
+    def daily(self):
+        return self.series['day']
+
+    @property
+    def modes(self):
+        return list(self.raw.columns or self.daily.columns)
+
+    def bucket(self, ts, size):
+        """Start of the local-time bucket containing `ts`, as a UTC timestamp."""
+        local = ts + self.utc_offset
+        return local - local % size - self.utc_offset
+
+    def record(self, ts, counts):
+        """Add a sample and return the rows to persist."""
+        ts = int(ts)
+        rows = []
+        for name, size in self.RESOLUTIONS.items():
+            bucket = ts if size is None else self.bucket(ts, size)
+            self.series[name].put(bucket, counts, replace_last=size is not None)
+            rows.append((name, bucket, json.dumps(counts)))
+        for name, retention in self.retention.items():
+            self.series[name].trim(ts - retention)
+        return rows
+
+    def load(self):
+        if not self.path:
+            return
+        try:
+            with self.connect() as db:
+                rows = db.execute("SELECT resolution, ts, counts FROM passenger_history ORDER BY ts").fetchall()
+        except Exception as e:
+            logger.warning(f"Could not load passenger history: {e}")
+            return
+        for name, ts, counts in rows:
+            if name in self.series:
+                self.series[name].put(ts, json.loads(counts), replace_last=True)
+        logger.info(f"Passenger history loaded ({len(self.raw)} samples, {len(self.daily)} days)")
+
+    def write(self, rows):
+        if not self.path:
+            return
+        now = rows[0][1] if rows else 0
+        with self.connect() as db:
+            db.executemany("INSERT OR REPLACE INTO passenger_history (resolution, ts, counts) VALUES (?, ?, ?)", rows)
+            for name, retention in self.retention.items():
+                db.execute("DELETE FROM passenger_history WHERE resolution = ? AND ts < ?", (name, now - retention))
+
+    def latest(self):
+        """`(ts, counts)` of the newest sample, or None."""
+        if not self.raw:
+            return None
+        return self.raw.times[-1], self.raw.row(-1)
+
+    def same_time(self, ts, days_back=1):
+        """The sample closest before the same local time `days_back` days ago.
+
+        Only counts if it falls on that day; falls back to the hourly rollup
+        once raw samples have been pruned.
+        """
+        target = ts - days_back * DAY
+        day_start = self.bucket(target, DAY)
+        for name in ('raw', 'hour'):
+            series = self.series[name]
+            index = series.at(target)
+            if index >= 0 and series.times[index] >= day_start:
+                return series.times[index], series.row(index)
+        return None
+
+    def days(self, count, before=None):
+        """Daily totals `(day_start, counts)` for up to `count` days ending before `before`."""
+        daily = self.daily
+        end = len(daily) if before is None else daily.since(before)
+        return [(daily.times[i], daily.row(i)) for i in range(max(0, end - count), end)]
@@ -0,0 +1,311 @@
+import asyncio
+import heapq
+import logging
+import time
+
+import config
+from transit.catalog import Catalog
+from transit.geo import GridIndex, meters_between, walking_minutes
+
+logger = logging.getLogger(__name__)
+
+INF = float('inf')
+
+
+class Leg:
+    __slots__ = ('mode', 'route', 'headsign', 'origin', 'destination', 'stops', 'seconds', 'meters')
+
+    def __init__(self, mode, origin, destination, seconds, route=None, headsign=None, stops=0, meters=0):
+        self.mode = mode
+        self.route = route
+        self.headsign = headsign
+        self.origin = origin
+        self.destination = destination
+        self.stops = stops
+        self.seconds = seconds
+        self.meters = meters
+
+
+class Journey:
+    __slots__ = ('seconds', 'legs')
+
+    def __init__(self, seconds, legs):
+        self.seconds = seconds
+        self.legs = legs
+
+    @property
+    def rides(self):
+        return sum(1 for leg in self.legs if leg.mode == 'ride')
+
+    @property
+    def transfers(self):
+        return max(0, self.rides - 1)
+
+
+class JourneyGraph:
+    """Stops, route patterns and walking links, laid out for RAPTOR.
+
+    The gateway publishes no timetables, so the search is frequency based:
+    riding between stops takes their distance at JOURNEY_BUS_SPEED plus a
+    dwell per stop, and every boarding costs an average wait. Round `k` of
+    the search finds the best arrival at every stop with `k` rides, so the
+    answer comes with one option per transfer count that is faster than
+    the options with fewer transfers.
+    """
+
+    def __init__(self, codes, names, patterns, pattern_stops, pattern_times, stop_patterns, transfers):
+        self.codes = codes
+        self.names = names
+        self.index = {code: stop for stop, code in enumerate(codes)}
+        # (route short name, headsign) per pattern
+        self.patterns = patterns
+        self.pattern_stops = pattern_stops
+        # Seconds from the first stop of the pattern, per stop
+        self.pattern_times = pattern_times
+        # (pattern, position) pairs per stop
+        self.stop_patterns = stop_patterns
+        # (stop, seconds, meters) walking links per stop
+        self.transfers = transfers
+
+    @classmethod
+    def build(cls, patterns, catalog_stops=None):
+        """Graph from `(route, pattern_suffix, stops)` tuples; blocking, run it in a thread."""
+        catalog_stops = catalog_stops or {}
+        codes, names, coordinates, index = [], [], [], {}
+
+        def stop_id(stop):
+            code = str(stop.get('code') or stop.get('id'))
+            if code not in index:
+                known = catalog_stops.get(code) or {}
+                lat = stop.get('lat', known.get('lat'))
+                lon = stop.get('lon', known.get('lon'))
+                index[code] = len(codes)
+                codes.append(code)
+                names.append(stop.get('name') or known.get('name') or code)
+                coordinates.append((lat, lon) if lat is not None and lon is not None else None)
+            return index[code]
+
+        pattern_info, pattern_stops, pattern_times = [], [], []
+        for route, _, stops in patterns:
+            sequence = [stop_id(stop) for stop in stops if stop.get('code') or stop.get('id')]
+            if len(sequence) < 2:
+                continue
+            times = [0]
+            for previous, current in zip(sequence, sequence[1:]):
+                a, b = coordinates[previous], coordinates[current]
+                if a and b:
+                    hop = meters_between(a[0], a[1], b[0], b[1]) / config.JOURNEY_BUS_SPEED + config.JOURNEY_DWELL
+                else:
+                    hop = config.JOURNEY_DEFAULT_HOP
+                times.append(times[-1] + int(hop))
+            pattern_info.append((str(route.get('shortName') or route.get('id')), names[sequence[-1]]))
+            pattern_stops.append(tuple(sequence))
+            pattern_times.append(tuple(times))
+
+        stop_patterns = [[] for _ in codes]
+        for pattern, sequence in enumerate(pattern_stops):
+            for position, stop in enumerate(sequence):
+                stop_patterns[stop].append((pattern, position))
+
+        located = [{'stop': stop, 'lat': point[0], 'lon': point[1]} for stop, point in enumerate(coordinates) if point]
+        grid = GridIndex(located)
+        transfers = [()] * len(codes)
+        for item in located:
+            transfers[item['stop']] = tuple(
+                (other['stop'], int(walking_minutes(meters) * 60), int(meters))
+                for meters, other in grid.within(item['lat'], item['lon'], config.JOURNEY_WALK_RADIUS)
+                if other['stop'] != item['stop']
+            )
+
+        return cls(codes, names, pattern_info, pattern_stops, pattern_times,
+                   [tuple(entries) for entries in stop_patterns], transfers)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def plan(self, origin, target, max_transfers=None):
+        """Journeys from stop code `origin` to `target`, fewest rides first.
+
+        Each journey is faster than every journey before it.
+        """
+        source, goal = self.index.get(origin), self.index.get(target)
+        if source is None or goal is None or source == goal:
+            return []
+        max_rides = (config.JOURNEY_MAX_TRANSFERS if max_transfers is None else max_transfers) + 1
+
+        # labels[k][stop] = (seconds, parent) with k rides
+        labels = [{source: (0, None)}]
+        best = {source: 0}
+        self.walk(labels[0], [source], best, goal)
+
+        journeys = []
+        if goal in labels[0]:
+            journeys.append(self.journey(labels, 0, goal))
+
+        marked = set(labels[0])
+        for rides in range(1, max_rides + 1):
+            previous, current = labels[-1], {}
+            penalty = config.JOURNEY_WAIT + (config.JOURNEY_TRANSFER_PENALTY if rides > 1 else 0)
+
+            # Scan each pattern once, from the earliest marked stop on it
+            queue = {}
+            for stop in marked:
+                for pattern, position in self.stop_patterns[stop]:
+                    if position < queue.get(pattern, INF):
+                        queue[pattern] = position
+
+            reached = []
+            for pattern, start in queue.items():
+                stops, times = self.pattern_stops[pattern], self.pattern_times[pattern]
+                boarded, board_at = INF, None
+                for position in range(start, len(stops)):
+                    stop = stops[position]
+                    if board_at is not None:
+                        arrival = boarded + times[position] - times[board_at]
+                        if arrival < best.get(stop, INF) and arrival < best.get(goal, INF):
+                            if stop not in current:
+                                reached.append(stop)
+                            current[stop] = (arrival, ('ride', pattern, board_at, position))
+                            best[stop] = arrival
+                    label = previous.get(stop)
+                    if label is not None:
+                        departure = label[0] + penalty
+                        if board_at is None or departure < boarded + times[position] - times[board_at]:
+                            boarded, board_at = departure, position
+
+            self.walk(current, reached, best, goal)
+            labels.append(current)
+            if goal in current:
+                journeys.append(self.journey(labels, rides, goal))
+            marked = set(current)
+            if not marked:
+                break
+        return journeys
+
+    def walk(self, current, frontier, best, goal):
+        """Relax walking links out of `frontier`, chaining walks shortest first.
+
+        Links only reach JOURNEY_WALK_RADIUS, so longer walks are chains of
+        them; RAPTOR needs that closure to stay exact.
+        """
+        heap = [(current[stop][0], stop) for stop in frontier]
+        heapq.heapify(heap)
+        while heap:
+            base, stop = heapq.heappop(heap)
+            if base > current[stop][0]:
+                continue
+            for other, seconds, meters in self.transfers[stop]:
+                arrival = base + seconds
+                if arrival < best.get(other, INF) and arrival < best.get(goal, INF):
+                    current[other] = (arrival, ('walk', stop, meters))
+                    best[other] = arrival
+                    heapq.heappush(heap, (arrival, other))
+
+    def journey(self, labels, rides, goal):
+        legs = []
+        stop = goal
+        seconds = labels[rides][goal][0]
+        while True:
+            arrival, parent = labels[rides][stop]
+            if parent is None:
+                break
+            if parent[0] == 'walk':
+                origin = parent[1]
+                legs.append(Leg('walk', self.stop(origin), self.stop(stop), arrival - labels[rides][origin][0], meters=parent[2]))
+                stop = origin
+            else:
+                _, pattern, board_at, alight_at = parent
+                origin = self.pattern_stops[pattern][board_at]
+                route, headsign = self.patterns[pattern]
+                legs.append(Leg(
+                    'ride', self.stop(origin), self.stop(stop), arrival - labels[rides - 1][origin][0],
+                    route=route, headsign=headsign, stops=alight_at - board_at
+                ))
+                stop = origin
+                rides -= 1
+        legs.reverse()
+        # A chain of walking links is one walk to the rider
+        merged = []
+        for leg in legs:
+            if merged and leg.mode == 'walk' and merged[-1].mode == 'walk':
+                merged[-1].destination = leg.destination
+                merged[-1].seconds += leg.seconds
+                merged[-1].meters += leg.meters
+            else:
+                merged.append(leg)
+        return Journey(seconds, merged)
+
+    def stop(self, stop):
+        return self.codes[stop], self.names[stop]
+
+
+class JourneyPlanner(Catalog):
+    """The journey graph, rebuilt from the route catalog in the background.
+
+    Building touches every pattern of every route, so it runs on the
+    catalog refresh loop and is persisted with the other snapshots; a
+    restarted bot plans from the saved graph straight away.
+    """
+
+    snapshot_name = 'journeys'
+
+    def __init__(self, route_catalog, stop_catalog, refresh_interval=None, snapshot=None, shared=None):
+        super().__init__(route_catalog.client, refresh_interval or config.JOURNEY_GRAPH_REFRESH, snapshot, shared)
+        self.route_catalog = route_catalog
+        self.stop_catalog = stop_catalog
+        self.graph = JourneyGraph.build([])
+
+    async def plan(self, origin, target, max_transfers=None):
+        # A search across town takes tens of milliseconds; keep it off the event loop
+        return await asyncio.to_thread(self.graph.plan, origin, target, max_transfers)
+
+    async def refresh(self):
+        await asyncio.gather(self.route_catalog.ensure_loaded(), self.stop_catalog.ensure_loaded())
+        semaphore = asyncio.Semaphore(config.JOURNEY_BUILD_CONCURRENCY)
+        failed_routes = failed_patterns = 0
+
+        async def load(route):
+            nonlocal failed_routes, failed_patterns
+            async with semaphore:
+                loaded = []
+                try:
+                    suffixes = await self.route_catalog.load_patterns(route['id'])
+                except Exception as e:
+                    logger.warning(f"Skipping route {route['id']}: {e}")
+                    failed_routes += 1
+                    return loaded
+                for suffix in suffixes:
+                    try:
+                        loaded.append((route, suffix, await self.route_catalog.get_stops(route['id'], suffix) or []))
+                    except Exception as e:
+                        logger.warning(f"Skipping pattern {route['id']}/{suffix}: {e}")
+                        failed_patterns += 1
+                return loaded
+
+        routes = self.route_catalog.routes
+        groups = await asyncio.gather(*(load(route) for route in routes))
+        patterns = [pattern for group in groups for pattern in group]
+        if not patterns:
+            raise ValueError("No route patterns to build the journey graph from")
+        # A graph missing part of the network would be served for a whole day; keep the old one and retry
+        attempted = len(patterns) + failed_patterns
+        if failed_routes > config.JOURNEY_MAX_FAILED * len(routes) or failed_patterns > config.JOURNEY_MAX_FAILED * attempted:
+            raise ValueError(
+                f"Journey graph build incomplete: {failed_routes}/{len(routes)} routes "
+                f"and {failed_patterns}/{attempted} patterns failed"
+            )
+
+        start = time.perf_counter()
+        graph = await asyncio.to_thread(JourneyGraph.build, patterns, self.stop_catalog.by_code)
+        self.graph = graph
+        self.updated_at = time.time()
+        logger.info(
+            f"Journey graph built ({len(graph)} stops, {len(graph.pattern_stops)} patterns) "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
+
+    def dump_state(self):
+        return {'graph': self.graph}
+
+    def load_state(self, state):
+        self.graph = state['graph']
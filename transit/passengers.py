@@ -0,0 +1,87 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+
+import config
+from transit.catalog import Catalog
+
+logger = logging.getLogger(__name__)
+
+
+class PassengerStats(Catalog):
+    """Latest `transactionsByTransportTypes` snapshot from the passengers API.
+
+    Refreshed in the background like the transit catalogs. Listeners are
+    called with the new snapshot whenever its contents change, which is
+    what lets the stats cog precompute its AI text; only the cluster that
+    fetched the snapshot calls them. Every sample is also appended to
+    `history` when one is given, by the cluster that fetched it.
+    """
+
+    snapshot_name = 'passengers'
+
+    def __init__(self, client, refresh_interval=None, history=None, shared=None):
+        super().__init__(client, refresh_interval or config.PASSENGER_STATS_REFRESH, shared=shared)
+        self.stats = {}
+        self.digest = None
+        self.listeners = []
+        self.history = history
+        # Running listener tasks, the loop only keeps weak references
+        self.tasks = set()
+
+    def restore(self):
+        if self.history is not None and not self.history.raw:
+            self.history.load()
+
+    async def refresh(self):
+        data = await self.client.get_passengers()
+        stats = (data or {}).get('transactionsByTransportTypes')
+        if not stats:
+            raise ValueError("Passengers API returned no transactionsByTransportTypes")
+
+        digest = hashlib.sha256(json.dumps(stats, sort_keys=True).encode()).hexdigest()
+        self.updated_at = time.time()
+
+        if self.history is not None:
+            rows = self.history.record(self.updated_at, stats)
+            try:
+                await asyncio.to_thread(self.history.write, rows)
+            except Exception as e:
+                logger.warning(f"Passenger history write failed: {e}")
+
+        self.apply(stats, digest)
+
+    def apply(self, stats, digest, notify=True):
+        changed = digest != self.digest
+        self.stats, self.digest = stats, digest
+        if changed and notify:
+            logger.info(f"Passenger stats changed ({sum(stats.values())} passengers)")
+            for listener in self.listeners:
+                task = asyncio.create_task(listener(stats))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+
+    def dump_state(self):
+        return {'stats': self.stats, 'digest': self.digest, 'fetched_at': self.updated_at}
+
+    def load_state(self, state):
+        # Another cluster fetched and stored this sample, keep the in-memory series in step.
+        # Its listeners already ran, running ours too would repeat the precompute per cluster
+        if self.history is not None:
+            self.history.record(state['fetched_at'], state['stats'])
+        self.apply(state['stats'], state['digest'], notify=False)
+
+    async def get(self):
+        await self.ensure_loaded()
+        if time.time() - self.updated_at > 2 * self.refresh_interval:
+            # Background loop is behind (or not running), refresh on demand
+            # and fall back to the snapshot we have if that fails
+            try:
+                if self.loading is None or self.loading.done():
+                    self.loading = asyncio.ensure_future(self.refresh())
+                await asyncio.shield(self.loading)
+            except Exception as e:
+                logger.warning(f"Passenger stats refresh failed: {e}")
+        return self.stats
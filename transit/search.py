@@ -0,0 +1,120 @@
+import heapq
+import re
+
+GEORGIAN_TO_LATIN = {
+    "ა": "a", "ბ": "b", "გ": "g", "დ": "d", "ე": "e", "ვ": "v", "ზ": "z",
+    "თ": "t", "ი": "i", "კ": "k", "ლ": "l", "მ": "m", "ნ": "n", "ო": "o",
+    "პ": "p", "ჟ": "zh", "რ": "r", "ს": "s", "ტ": "t", "უ": "u", "ფ": "p",
+    "ქ": "k", "ღ": "gh", "ყ": "q", "შ": "sh", "ჩ": "ch", "ც": "ts", "ძ": "dz",
+    "წ": "ts", "ჭ": "ch", "ხ": "kh", "ჯ": "j", "ჰ": "h"
+}
+
+# Informal spellings people type for the same Georgian letters
+LATIN_FOLDS = {"f": "p", "w": "v", "x": "kh", "c": "ts", "y": "i"}
+
+_TRANSLATE = str.maketrans({**GEORGIAN_TO_LATIN, **LATIN_FOLDS})
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(text):
+    """Case-fold and transliterate text to the Latin search alphabet."""
+    text = (text or "").casefold().translate(_TRANSLATE)
+    return _NON_WORD.sub(" ", text).strip()
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    """Ranked search over a fixed list of records.
+
+    Every record field is normalized once at build time. Prefix matches on
+    words are answered from a trie and everything else from trigram
+    postings, so a query only scores records that can actually match.
+
+    The trie is stored flattened, as a dict from every word prefix to the
+    ids under that node. Lookups stay O(len(prefix)) and the whole index
+    unpickles an order of magnitude faster than nested dicts.
+    """
+
+    def __init__(self, items, fields):
+        self.items = list(items)
+        self.fields = fields
+        self.keys = []
+        self.exact = {}
+        self.prefixes = {}
+        self.postings = {}
+
+        for doc_id, item in enumerate(self.items):
+            values = [normalize(str(item.get(field) or "")) for field in fields]
+            key = " ".join(value for value in values if value)
+            self.keys.append(key)
+            for value in values:
+                if value:
+                    self.exact.setdefault(value, []).append(doc_id)
+                    self._insert(value.replace(" ", ""), doc_id)
+            for word in set(key.split()):
+                self._insert(word, doc_id)
+            for gram in trigrams(key):
+                self.postings.setdefault(gram, []).append(doc_id)
+
+        self.prefixes = {prefix: tuple(ids) for prefix, ids in self.prefixes.items()}
+        self.postings = {gram: tuple(ids) for gram, ids in self.postings.items()}
+
+    def _insert(self, word, doc_id):
+        for end in range(1, len(word) + 1):
+            ids = self.prefixes.setdefault(word[:end], [])
+            if not ids or ids[-1] != doc_id:
+                ids.append(doc_id)
+
+    def _prefix(self, word):
+        return set(self.prefixes.get(word, ()))
+
+    def score(self, doc_id, query, words):
+        key = self.keys[doc_id]
+        if doc_id in self.exact.get(query, ()):
+            return 100
+        if key.startswith(query):
+            return 80
+        tokens = key.split()
+        if all(any(token.startswith(word) for token in tokens) for word in words):
+            return 60 + (5 if tokens and tokens[0].startswith(words[0]) else 0)
+        if query in key:
+            return 40
+        query_grams = trigrams(query)
+        shared = len(query_grams & trigrams(key))
+        return 30 * shared / len(query_grams)
+
+    def search(self, query, limit=25):
+        return [self.items[doc_id] for doc_id in self.search_ids(query, limit)]
+
+    def search_ids(self, query, limit=25):
+        """Positions in `items` of the best matches, best first."""
+        query = normalize(query)
+        if not query:
+            return range(min(limit, len(self.items)))
+
+        words = query.split()
+        candidates = None
+        for word in words:
+            ids = self._prefix(word)
+            candidates = ids if candidates is None else candidates & ids
+        candidates = candidates or set()
+
+        # Fall back to trigram postings for infix matches and typos
+        if len(candidates) < limit:
+            counts = {}
+            grams = trigrams(query)
+            for gram in grams:
+                for doc_id in self.postings.get(gram, ()):
+                    counts[doc_id] = counts.get(doc_id, 0) + 1
+            threshold = max(1, len(grams) // 2)
+            candidates |= {doc_id for doc_id, count in counts.items() if count >= threshold}
+
+        ranked = heapq.nsmallest(
+            limit,
+            ((-self.score(doc_id, query, words), len(self.keys[doc_id]), doc_id) for doc_id in candidates)
+        )
+        return [doc_id for score, _, doc_id in ranked if score < -15]
@@ -0,0 +1,482 @@
+import asyncio
+import hmac
+import ipaddress
+import itertools
+import json
+import logging
+import os
+import pickle
+import secrets
+import struct
+import time
+from abc import ABC, abstractmethod
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Header and blob sizes of a frame
+_FRAME = struct.Struct("!II")
+_MAX_HEADER = 64 * 1024
+_MISSING = object()
+
+
+class SharedCacheError(Exception):
+    pass
+
+
+class CacheStore:
+    """The shared cache itself: expiring values, fetch claims and identify slots.
+
+    A claim marks a key as being fetched by one process. Everyone else
+    asking for the key meanwhile waits for that fetch instead of starting
+    their own, and takes over if it has not landed within the claim's
+    lifetime. Lives in the launcher, or in-process behind `LocalCache`.
+    """
+
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self.values = {}
+        self.claims = {}
+        self.identified = {}
+        self.identify_locks = {}
+
+    def get(self, key):
+        item = self.values.get(key)
+        if item is None:
+            return _MISSING
+        if item[0] < time.monotonic():
+            del self.values[key]
+            return _MISSING
+        return item[1]
+
+    async def get_or_claim(self, key, claim_ttl, wait):
+        """`(True, value)` on a hit, `(False, None)` when the caller should fetch and `set` the key."""
+        deadline = time.monotonic() + wait
+        while True:
+            value = self.get(key)
+            if value is not _MISSING:
+                return True, value
+            now = time.monotonic()
+            claim = self.claims.get(key)
+            if claim is None or claim[0] <= now or deadline <= now:
+                self.claims[key] = (now + claim_ttl, asyncio.Event())
+                return False, None
+            try:
+                await asyncio.wait_for(claim[1].wait(), min(deadline, claim[0]) - now)
+            except asyncio.TimeoutError:
+                pass
+
+    async def peek(self, key):
+        """`(True, value)` if `key` is cached, else `(False, None)`; never claims."""
+        value = self.get(key)
+        if value is _MISSING:
+            return False, None
+        return True, value
+
+    async def claim(self, key, ttl):
+        """Hold `key` for up to `ttl` seconds unless someone else does; True if this call got it.
+
+        A lock across processes, given back with `release`.
+        """
+        now = time.monotonic()
+        claim = self.claims.get(key)
+        if claim is not None and claim[0] > now:
+            return False
+        self.claims[key] = (now + ttl, asyncio.Event())
+        return True
+
+    async def set(self, key, value, ttl):
+        if len(self.values) >= self.max_size:
+            self.prune()
+        self.values[key] = (time.monotonic() + ttl, value)
+        await self.release(key)
+
+    async def release(self, key):
+        claim = self.claims.pop(key, None)
+        if claim is not None:
+            claim[1].set()
+
+    async def identify(self, bucket, interval):
+        """Wait for this bucket's turn to identify with Discord."""
+        lock = self.identify_locks.setdefault(bucket, asyncio.Lock())
+        async with lock:
+            delay = self.identified.get(bucket, float('-inf')) + interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.identified[bucket] = time.monotonic()
+
+    def prune(self):
+        now = time.monotonic()
+        for key in [key for key, (expires_at, _) in self.values.items() if expires_at < now]:
+            del self.values[key]
+        while len(self.values) >= self.max_size:
+            del self.values[next(iter(self.values))]
+
+
+class SharedCache(ABC):
+    """Client side of the cache tier, shared by every cluster of the bot.
+
+    The operations mirror `CacheStore` and raise SharedCacheError when the
+    tier cannot be reached.
+    """
+
+    def __init__(self):
+        self.failing = False
+
+    @abstractmethod
+    async def get_or_claim(self, key, claim_ttl, wait, offload=False):
+        pass
+
+    @abstractmethod
+    async def peek(self, key):
+        pass
+
+    @abstractmethod
+    async def claim(self, key, ttl):
+        pass
+
+    @abstractmethod
+    async def set(self, key, value, ttl, offload=False):
+        pass
+
+    @abstractmethod
+    async def release(self, key):
+        pass
+
+    @abstractmethod
+    async def identify(self, bucket, interval):
+        pass
+
+    async def close(self):
+        pass
+
+    async def load(self, key, ttl, factory, wait=None, offload=False):
+        """Value of `key`, from `factory()` if no process has it cached yet.
+
+        Only one process runs the factory for a key at a time; the others
+        wait up to `wait` seconds for its result. If the cache tier is
+        unreachable every process simply fetches for itself. Pass
+        `offload` for large values, they are (un)pickled off the event loop.
+        """
+        wait = wait or config.SHARED_FETCH_WAIT
+        try:
+            hit, value = await self.get_or_claim(key, wait, wait, offload)
+            self.recovered()
+        except SharedCacheError as e:
+            self.failed(e)
+            return await factory()
+        if hit:
+            return value
+
+        try:
+            value = await factory()
+        except BaseException:
+            try:
+                await self.release(key)
+            except SharedCacheError as e:
+                self.failed(e)
+            raise
+        try:
+            await self.set(key, value, ttl, offload)
+        except SharedCacheError as e:
+            self.failed(e)
+        return value
+
+    def failed(self, error):
+        if not self.failing:
+            logger.warning(f"Shared cache unavailable, fetching locally: {error}")
+        self.failing = True
+
+    def recovered(self):
+        if self.failing:
+            logger.info("Shared cache reachable again")
+        self.failing = False
+
+
+class LocalCache(SharedCache):
+    """In-process stand-in for the cache tier, for one process or tests."""
+
+    def __init__(self, store=None):
+        super().__init__()
+        self.store = store or CacheStore()
+
+    async def get_or_claim(self, key, claim_ttl, wait, offload=False):
+        return await self.store.get_or_claim(key, claim_ttl, wait)
+
+    async def peek(self, key):
+        return await self.store.peek(key)
+
+    async def claim(self, key, ttl):
+        return await self.store.claim(key, ttl)
+
+    async def set(self, key, value, ttl, offload=False):
+        await self.store.set(key, value, ttl)
+
+    async def release(self, key):
+        await self.store.release(key)
+
+    async def identify(self, bucket, interval):
+        await self.store.identify(bucket, interval)
+
+
+class RemoteCache(SharedCache):
+    """Cache tier served by `SharedCacheServer` in another process.
+
+    Requests are multiplexed over one connection and matched to answers
+    by id, so slow claims never hold up other lookups. The connection
+    starts by presenting the server's token. Values are pickled here and
+    stay opaque bytes to the server, which only ever parses JSON.
+    """
+
+    def __init__(self, url, token=None, timeout=None):
+        super().__init__()
+        self.url = url
+        self.token = token or config.SHARED_CACHE_TOKEN
+        self.timeout = timeout or config.SHARED_CACHE_TIMEOUT
+        self.writer = None
+        self.reader_task = None
+        self.connecting = None
+        self.pending = {}
+        self.ids = itertools.count()
+
+    async def connect(self):
+        if self.writer is None or self.writer.is_closing():
+            if self.connecting is None or self.connecting.done():
+                self.connecting = asyncio.ensure_future(self.open())
+            try:
+                await asyncio.shield(self.connecting)
+            except OSError as e:
+                raise SharedCacheError(f"cannot connect to {self.url}: {e}") from e
+        if self.writer is None:
+            raise SharedCacheError("connection lost")
+        return self.writer
+
+    async def open(self):
+        reader, writer = await open_connection(self.url)
+        write_frame(writer, {"op": "auth", "token": self.token})
+        await writer.drain()
+        self.writer = writer
+        self.reader_task = asyncio.create_task(self.read_responses(reader, writer))
+
+    async def read_responses(self, reader, writer):
+        try:
+            while True:
+                header, blob = await read_frame(reader)
+                future = self.pending.pop(header.get("id"), None)
+                if future is not None and not future.done():
+                    if header.get("ok"):
+                        future.set_result((header.get("result"), blob))
+                    else:
+                        future.set_exception(SharedCacheError(header.get("result")))
+        except (asyncio.IncompleteReadError, ConnectionError, OSError, ValueError):
+            pass
+        finally:
+            if self.writer is writer:
+                self.writer = None
+            writer.close()
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(SharedCacheError("connection lost"))
+            self.pending.clear()
+
+    async def call(self, op, *args, blob=b"", timeout=None):
+        """`(result, blob)` of one request."""
+        writer = await self.connect()
+        request_id = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        try:
+            write_frame(writer, {"id": request_id, "op": op, "args": list(args)}, blob)
+            await writer.drain()
+            return await asyncio.wait_for(future, timeout or self.timeout)
+        except (ConnectionError, OSError) as e:
+            raise SharedCacheError(f"{op} failed: {e!r}") from e
+        except asyncio.TimeoutError as e:
+            raise SharedCacheError(f"{op} timed out") from e
+        finally:
+            self.pending.pop(request_id, None)
+
+    async def get_or_claim(self, key, claim_ttl, wait, offload=False):
+        hit, payload = await self.call("get_or_claim", key, claim_ttl, wait, timeout=wait + self.timeout)
+        if not hit:
+            return False, None
+        value = await asyncio.to_thread(pickle.loads, payload) if offload else pickle.loads(payload)
+        return True, value
+
+    async def peek(self, key):
+        hit, payload = await self.call("peek", key)
+        return (True, pickle.loads(payload)) if hit else (False, None)
+
+    async def claim(self, key, ttl):
+        claimed, _ = await self.call("claim", key, ttl)
+        return claimed
+
+    async def set(self, key, value, ttl, offload=False):
+        if offload:
+            payload = await asyncio.to_thread(pickle.dumps, value, pickle.HIGHEST_PROTOCOL)
+        else:
+            payload = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        await self.call("set", key, ttl, blob=payload)
+
+    async def release(self, key):
+        await self.call("release", key)
+
+    async def identify(self, bucket, interval):
+        # Every other shard may be queued ahead of this one
+        await self.call("identify", bucket, interval, timeout=config.IDENTIFY_TIMEOUT)
+
+    async def close(self):
+        if self.reader_task is not None:
+            self.reader_task.cancel()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+class SharedCacheServer:
+    """Serves a `CacheStore` to the clusters over a unix or loopback TCP socket.
+
+    Clients must open with the server's token, which launcher.py hands to
+    the clusters it starts. Requests are JSON and cached values are kept
+    as the bytes the clients sent, so nothing a client sends is ever
+    unpickled here.
+    """
+
+    OPS = ("get_or_claim", "peek", "claim", "set", "release", "identify")
+
+    def __init__(self, url, token=None, store=None):
+        self.url = url
+        self.token = token or config.SHARED_CACHE_TOKEN or secrets.token_urlsafe(32)
+        self.store = store or CacheStore()
+        self.server = None
+        # writer -> handler task
+        self.connections = {}
+
+    async def start(self):
+        kind, address = parse_url(self.url)
+        if kind == "unix":
+            directory = os.path.dirname(address)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # A socket file left behind by a crashed launcher blocks the bind
+            if os.path.exists(address):
+                os.unlink(address)
+            self.server = await asyncio.start_unix_server(self.handle, address)
+            os.chmod(address, 0o600)
+        else:
+            self.server = await asyncio.start_server(self.handle, *address)
+        logger.info(f"Shared cache listening on {self.url}")
+        return self
+
+    async def stop(self):
+        if self.server is None:
+            return
+        self.server.close()
+        for writer in list(self.connections):
+            writer.close()
+        # Let the handlers see their connections end rather than be cancelled with the loop
+        if self.connections:
+            await asyncio.wait(list(self.connections.values()), timeout=1)
+        await self.server.wait_closed()
+        self.server = None
+        kind, address = parse_url(self.url)
+        if kind == "unix" and os.path.exists(address):
+            os.unlink(address)
+
+    async def handle(self, reader, writer):
+        lock = asyncio.Lock()
+        tasks = set()
+        self.connections[writer] = asyncio.current_task()
+        try:
+            header, _ = await asyncio.wait_for(read_frame(reader), config.SHARED_CACHE_TIMEOUT)
+            if header.get("op") != "auth" or not hmac.compare_digest(str(header.get("token", "")).encode(), self.token.encode()):
+                logger.warning("Shared cache client rejected: bad token")
+                return
+            while True:
+                header, blob = await read_frame(reader)
+                task = asyncio.create_task(self.respond(writer, lock, header, blob))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError, OSError, ValueError):
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.connections.pop(writer, None)
+            writer.close()
+
+    async def respond(self, writer, lock, header, blob):
+        response, payload = {"id": header.get("id"), "ok": True}, b""
+        try:
+            op, args = header.get("op"), header.get("args", [])
+            if op not in self.OPS:
+                raise ValueError(f"unknown op {op!r}")
+            if op == "set":
+                key, ttl = args
+                response["result"] = await self.store.set(key, blob, ttl)
+            elif op in ("get_or_claim", "peek"):
+                hit, value = await getattr(self.store, op)(*args)
+                response["result"], payload = hit, value or b""
+            else:
+                response["result"] = await getattr(self.store, op)(*args)
+        except Exception as e:
+            response.update(ok=False, result=repr(e))
+        async with lock:
+            write_frame(writer, response, payload)
+            await writer.drain()
+
+
+def parse_url(url):
+    """`('unix', path)` or `('tcp', (host, port))` for a shared cache URL.
+
+    TCP is only accepted on loopback addresses; the cache hands out
+    pickled values, it must not be reachable from other machines.
+    """
+    if url.startswith("unix:"):
+        return "unix", url[len("unix:"):]
+    if url.startswith("tcp://"):
+        host, _, port = url[len("tcp://"):].rpartition(":")
+        host = host.strip("[]") or "127.0.0.1"
+        if host != "localhost":
+            try:
+                loopback = ipaddress.ip_address(host).is_loopback
+            except ValueError:
+                loopback = False
+            if not loopback:
+                raise ValueError(f"Shared cache must listen on a loopback address, not {host}")
+        return "tcp", (host, int(port))
+    raise ValueError(f"Unsupported shared cache URL: {url}")
+
+
+async def open_connection(url):
+    kind, address = parse_url(url)
+    if kind == "unix":
+        return await asyncio.open_unix_connection(address)
+    return await asyncio.open_connection(*address)
+
+
+def connect(url=None):
+    """Shared cache client for `url` (SHARED_CACHE_URL), or None when caches stay per process."""
+    url = config.SHARED_CACHE_URL if url is None else url
+    if not url:
+        return None
+    if url == "memory":
+        return LocalCache()
+    return RemoteCache(url)
+
+
+async def read_frame(reader):
+    """`(header, blob)`: a JSON header and the opaque bytes that came with it."""
+    header_size, blob_size = _FRAME.unpack(await reader.readexactly(_FRAME.size))
+    if header_size > _MAX_HEADER:
+        raise ValueError(f"Frame header too large ({header_size} bytes)")
+    header = json.loads(await reader.readexactly(header_size))
+    if not isinstance(header, dict):
+        raise ValueError("Frame header is not an object")
+    return header, await reader.readexactly(blob_size) if blob_size else b""
+
+
+def write_frame(writer, header, blob=b""):
+    encoded = json.dumps(header, separators=(",", ":")).encode()
+    writer.write(_FRAME.pack(len(encoded), len(blob)) + encoded + blob)
@@ -0,0 +1,63 @@
+import gc
+import logging
+import os
+import pickle
+import sqlite3
+import time
+import zlib
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Bump when the pickled catalog state changes shape
+SNAPSHOT_VERSION = 1
+
+
+class SnapshotStore:
+    """SQLite file holding the last good state of each catalog.
+
+    Lets a freshly started process answer from disk in milliseconds while
+    the catalogs revalidate against the gateway in the background.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or config.SNAPSHOT_PATH
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self.connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS snapshots ("
+                "name TEXT PRIMARY KEY, version INTEGER, saved_at REAL, payload BLOB)"
+            )
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def load(self, name):
+        """Return `(state, saved_at)` or None if there is no usable snapshot."""
+        try:
+            with self.connect() as db:
+                row = db.execute(
+                    "SELECT version, saved_at, payload FROM snapshots WHERE name = ?", (name,)
+                ).fetchone()
+            if not row or row[0] != SNAPSHOT_VERSION:
+                return None
+            # The index is many small containers; skip GC passes while unpickling
+            gc.disable()
+            try:
+                return pickle.loads(zlib.decompress(row[2])), row[1]
+            finally:
+                gc.enable()
+        except Exception as e:
+            logger.warning(f"Could not load {name} snapshot: {e}")
+            return None
+
+    def save(self, name, state):
+        payload = zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL))
+        with self.connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO snapshots (name, version, saved_at, payload) VALUES (?, ?, ?, ?)",
+                (name, SNAPSHOT_VERSION, time.time(), payload)
+            )
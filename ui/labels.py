@@ -0,0 +1,16 @@
+def age_text(seconds):
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds} წამის"
+    return f"{seconds // 60} წუთის"
+
+
+def updated_label(snapshots):
+    """Footer for arrival snapshots: the oldest one's age, and a warning if any is stale."""
+    age = max(snapshot.age for snapshot in snapshots)
+    if any(snapshot.stale for snapshot in snapshots):
+        return f"⚠️ TTC დროებით მიუწვდომელია · მონაცემები {age_text(age)} წინანდელია, დრო გადათვლილია"
+    return f"🕒 განახლდა {age_text(age)} წინ"
+
+
+UNAVAILABLE = "⚠️ TTC-ის სერვისი დროებით მიუწვდომელია, სცადეთ ცოტა ხანში."
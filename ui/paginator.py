@@ -0,0 +1,174 @@
+import logging
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+
+class ResultSet:
+    """An immutable selection of records from a cached list, paged on demand.
+
+    Holds a reference to the list itself, never a copy, plus the positions
+    of the selected records: a `range` for the whole list, a tuple for
+    search results. Catalog refreshes swap in new lists instead of changing
+    old ones, so the positions stay valid for the life of a view.
+    """
+
+    __slots__ = ('items', 'ids', 'per_page')
+
+    def __init__(self, items, ids=None, per_page=20):
+        self.items = items
+        self.ids = range(len(items)) if ids is None else ids
+        self.per_page = per_page
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def pages(self):
+        return max(1, -(-len(self.ids) // self.per_page))
+
+    def page(self, number):
+        """Records on the 1-based page `number`."""
+        start = (number - 1) * self.per_page
+        return [self.items[doc_id] for doc_id in self.ids[start:start + self.per_page]]
+
+
+class Paginator(discord.ui.View):
+    """Paged list view shared by /stops, /buses and /bus.
+
+    Only the current page is ever formatted, by `build_embed(records, page,
+    total_pages)`. With a search `index` built over the same list, the
+    search button ranks matches with it instead of rescanning text, and the
+    reset button returns to the full list. With `option`, a select menu
+    offers the records of the current page and passes the chosen value to
+    `on_select(interaction, value)`.
+    """
+
+    def __init__(self, results, build_embed, index=None, option=None, on_select=None, timeout=60,
+                 search_placeholder="ძებნა", not_found="ვერაფერი მოიძებნა 🔍", reset_label="ყველა",
+                 select_placeholder="აირჩიეთ"):
+        super().__init__(timeout=timeout)
+        self.base = self.results = results
+        self.build_embed = build_embed
+        self.index = index
+        self.option = option
+        self.on_select = on_select
+        self.search_placeholder = search_placeholder
+        self.not_found = not_found
+        self.current_page = 1
+        self.message = None
+
+        self.reset.label = reset_label
+        self.select.placeholder = select_placeholder
+        if index is None:
+            self.remove_item(self.search)
+            self.remove_item(self.reset)
+        if option is None:
+            self.remove_item(self.select)
+        self.update_items()
+
+    def embed(self):
+        return self.build_embed(self.results.page(self.current_page), self.current_page, self.results.pages)
+
+    def update_items(self):
+        self.previous.disabled = self.current_page <= 1
+        self.next.disabled = self.current_page >= self.results.pages
+        self.jump.disabled = self.results.pages < 2
+        self.reset.disabled = self.results is self.base
+        if self.option is not None:
+            self.select.options = [self.option(record) for record in self.results.page(self.current_page)]
+
+    def search_results(self, query):
+        """Matches of `query` in the full list as a new result set, or None."""
+        ids = self.index.search_ids(query, len(self.index.items))
+        if not ids:
+            return None
+        return ResultSet(self.base.items, tuple(ids), self.base.per_page)
+
+    def apply_search(self, query):
+        """Narrow the view to matches of `query`; False if there are none."""
+        results = self.search_results(query)
+        if results is None:
+            return False
+        self.results, self.current_page = results, 1
+        self.update_items()
+        return True
+
+    async def show(self, interaction: discord.Interaction, results=None, page=None):
+        try:
+            if results is not None:
+                self.results = results
+            if page is not None:
+                self.current_page = min(max(page, 1), self.results.pages)
+            self.update_items()
+            await interaction.response.edit_message(embed=self.embed(), view=self)
+        except Exception as e:
+            logger.warning(f"Paginator update failed: {e}")
+            await interaction.response.send_message("შეცდომა მოხდა", ephemeral=True)
+
+    @discord.ui.button(label="წინა", style=discord.ButtonStyle.primary, row=0)
+    async def previous(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, page=self.current_page - 1)
+
+    @discord.ui.button(label="გვერდი", emoji="🔢", style=discord.ButtonStyle.secondary, row=0)
+    async def jump(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.send_modal(JumpModal(self))
+
+    @discord.ui.button(label="შემდეგი", style=discord.ButtonStyle.primary, row=0)
+    async def next(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, page=self.current_page + 1)
+
+    @discord.ui.button(label="ძიება", emoji="🔍", style=discord.ButtonStyle.secondary, row=1)
+    async def search(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.send_modal(SearchModal(self))
+
+    @discord.ui.button(label="ყველა", style=discord.ButtonStyle.secondary, row=1)
+    async def reset(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, results=self.base, page=1)
+
+    @discord.ui.select(placeholder="აირჩიეთ", min_values=1, max_values=1, options=[], row=2)
+    async def select(self, interaction: discord.Interaction, select: discord.ui.Select):
+        await self.on_select(interaction, select.values[0])
+
+    async def on_timeout(self):
+        for child in self.children:
+            child.disabled = True
+        if self.message:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass
+
+
+class SearchModal(discord.ui.Modal, title="ძიება"):
+    query = discord.ui.TextInput(label="ძებნა")
+
+    def __init__(self, paginator):
+        super().__init__()
+        self.paginator = paginator
+        self.query.placeholder = paginator.search_placeholder
+
+    async def on_submit(self, interaction: discord.Interaction):
+        results = self.paginator.search_results(self.query.value)
+        if results is None:
+            await interaction.response.send_message(self.paginator.not_found, ephemeral=True)
+            return
+        await self.paginator.show(interaction, results=results, page=1)
+
+
+class JumpModal(discord.ui.Modal, title="გვერდზე გადასვლა"):
+    page = discord.ui.TextInput(label="გვერდის ნომერი", max_length=6)
+
+    def __init__(self, paginator):
+        super().__init__()
+        self.paginator = paginator
+        self.page.placeholder = f"1 - {paginator.results.pages}"
+
+    async def on_submit(self, interaction: discord.Interaction):
+        try:
+            page = int(self.page.value.strip())
+        except ValueError:
+            await interaction.response.send_message("არასწორი გვერდის ნომერი", ephemeral=True)
+            return
+        await self.paginator.show(interaction, page=page)
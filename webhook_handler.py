@@ -1,15 +1,147 @@
+import copy
 import logging
+import queue
+import threading
+import time
 import requests
 
+# Discord message content limit, minus room for the code fence
+MAX_CONTENT = 2000 - len("``````")
+
+
 class DiscordWebhookHandler(logging.Handler):
-    def __init__(self, webhook_url):
+    """Log handler that posts records to a Discord webhook.
+
+    `emit` only puts a copy of the record on a queue. A background thread
+    batches queued records into as few webhook messages as possible,
+    collapses repeated messages, and waits out webhook rate limits.
+    The queue is drained when the handler is closed at shutdown.
+    """
+
+    def __init__(self, webhook_url, flush_interval=2.0, max_batch=50, max_queue=1000):
         super().__init__()
         self.webhook_url = webhook_url
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.dropped_lock = threading.Lock()
+        self.thread = None
+        self.thread_lock = threading.Lock()
+        self.session = requests.Session()
 
     def emit(self, record):
+        if not self.webhook_url:
+            return
         try:
-            message = self.format(record)
-            payload = {"content": f"```{message}```"}
-            requests.post(self.webhook_url, json=payload)
+            self.start()
+            self.queue.put_nowait(self.prepare(record))
+        except queue.Full:
+            with self.dropped_lock:
+                self.dropped += 1
         except Exception:
-            self.handleError(record)
\ No newline at end of file
+            self.handleError(record)
+
+    def prepare(self, record):
+        """Copy of `record` with its message and traceback rendered, safe to format later."""
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Caches the traceback in exc_text
+            self.format(record)
+            record.exc_info = None
+        return record
+
+    def start(self):
+        if self.thread is not None:
+            return
+        with self.thread_lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.worker, name="discord-webhook-log", daemon=True)
+                self.thread.start()
+
+    def worker(self):
+        while True:
+            record = self.queue.get()
+            if record is None:
+                return
+
+            batch = [record]
+            deadline = time.monotonic() + self.flush_interval
+            stopping = False
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    record = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if record is None:
+                    stopping = True
+                    break
+                batch.append(record)
+
+            self.send(batch)
+            if stopping:
+                return
+
+    def collapse(self, batch):
+        """Merge records with the same level, logger and message, e.g. `... (x12)`.
+
+        Each group is formatted once, from its first record, in first-seen order.
+        """
+        groups = {}
+        for record in batch:
+            key = (record.levelname, record.name, record.msg)
+            if key in groups:
+                groups[key][1] += 1
+            else:
+                groups[key] = [record, 1]
+        lines = [self.format(record) if count == 1 else f"{self.format(record)} (x{count})" for record, count in groups.values()]
+        with self.dropped_lock:
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            lines.append(f"{dropped} log records dropped (queue full)")
+        return lines
+
+    def send(self, batch):
+        chunk = ""
+        for line in self.collapse(batch):
+            line = line[:MAX_CONTENT]
+            if chunk and len(chunk) + len(line) + 1 > MAX_CONTENT:
+                self.post(chunk)
+                chunk = ""
+            chunk = f"{chunk}\n{line}" if chunk else line
+        if chunk:
+            self.post(chunk)
+
+    def post(self, content, attempts=3):
+        for _ in range(attempts):
+            try:
+                response = self.session.post(self.webhook_url, json={"content": f"```{content}```"}, timeout=10)
+            except requests.RequestException:
+                time.sleep(1)
+                continue
+
+            if response.status_code == 429:
+                try:
+                    retry_after = float(response.json().get("retry_after", 1))
+                except ValueError:
+                    retry_after = 1
+                time.sleep(retry_after)
+                continue
+
+            # Wait out the bucket before the next message instead of hitting 429
+            if response.headers.get("X-RateLimit-Remaining") == "0":
+                time.sleep(float(response.headers.get("X-RateLimit-Reset-After", 1)))
+            return
+
+    def close(self):
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(timeout=10)
+        self.thread = None
+        self.session.close()
+        super().close()